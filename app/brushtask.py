@@ -9,14 +9,14 @@ from apscheduler.schedulers.background import BackgroundScheduler
 import log
 from app.downloader.client import Qbittorrent, Transmission
 from app.filter import Filter
-from app.helper import DbHelper
+from app.helper import DbHelper, RssHelper
 from app.message import Message
 from app.rss import Rss
 from app.sites import Sites
 from app.utils import StringUtils, Torrent, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import BrushDeleteType
-from config import BRUSH_REMOVE_TORRENTS_INTERVAL, Config
+from config import BRUSH_REMOVE_TORRENTS_INTERVAL, RSS_UNMATCHED_TTL, Config
 
 
 @singleton
@@ -25,9 +25,9 @@ class BrushTask(object):
     sites = None
     filter = None
     dbhelper = None
+    rsshelper = None
     _scheduler = None
     _brush_tasks = []
-    _torrents_cache = []
     _downloader_infos = []
     _qb_client = "qbittorrent"
     _tr_client = "transmission"
@@ -38,6 +38,7 @@ class BrushTask(object):
 
     def init_config(self):
         self.dbhelper = DbHelper()
+        self.rsshelper = RssHelper()
         self.message = Message()
         self.sites = Sites()
         self.filter = Filter()
@@ -195,8 +196,13 @@ class BrushTask(object):
         if len(rss_result) == 0:
             log.warn("【Brush】%s RSS未下载到数据" % site_name)
             return
-        else:
-            log.info("【Brush】%s RSS获取数据：%s" % (site_name, len(rss_result)))
+        # 剔除已处理过的种子，选种规则变化后重新处理
+        rss_feed = "brush:%s" % taskid
+        fingerprint = RssHelper.get_fingerprint(rss_url, rss_rule, rss_free)
+        new_result = self.rsshelper.filter_new_articles(feed=rss_feed,
+                                                        articles=rss_result,
+                                                        fingerprint=fingerprint)
+        log.info("【Brush】%s RSS获取数据：%s，未处理：%s" % (site_name, len(rss_result), len(new_result)))
 
         max_dlcount = rss_rule.get("dlcount")
         success_count = 0
@@ -204,7 +210,11 @@ class BrushTask(object):
             downloading_count = self.__get_downloading_count(downloader_cfg) or 0
             new_torrent_count = int(max_dlcount) - int(downloading_count)
 
-        for res in rss_result:
+        # 本次下载的种子
+        seen_result = []
+        # 不符合选种规则的种子，促销及发布时间等条件会变化，一段时间后重新检查
+        unmatched_result = []
+        for res in new_result:
             try:
                 # 种子名
                 torrent_name = res.get('title')
@@ -217,12 +227,6 @@ class BrushTask(object):
                 # 发布时间
                 pubdate = res.get('pubdate')
 
-                if enclosure not in self._torrents_cache:
-                    self._torrents_cache.append(enclosure)
-                else:
-                    log.debug("【Brush】%s 已处理过" % torrent_name)
-                    continue
-
                 # 检查种子是否符合选种规则
                 if not self.__check_rss_rule(rss_rule=rss_rule,
                                              title=torrent_name,
@@ -232,6 +236,7 @@ class BrushTask(object):
                                              cookie=cookie,
                                              ua=ua,
                                              proxy=site_proxy):
+                    unmatched_result.append(res)
                     continue
                 # 开始下载
                 log.debug("【Brush】%s 符合条件，开始下载..." % torrent_name)
@@ -247,6 +252,7 @@ class BrushTask(object):
                                            downspeed=rss_rule.get("downspeed"),
                                            taskname=task_name,
                                            site_info=site_info):
+                    seen_result.append(res)
                     # 计数
                     success_count += 1
                     # 添加种子后不能超过最大下载数量
@@ -263,6 +269,13 @@ class BrushTask(object):
             except Exception as err:
                 ExceptionUtils.exception_traceback(err)
                 continue
+        self.rsshelper.mark_articles_seen(feed=rss_feed,
+                                          articles=seen_result,
+                                          fingerprint=fingerprint)
+        self.rsshelper.mark_articles_seen(feed=rss_feed,
+                                          articles=unmatched_result,
+                                          fingerprint=fingerprint,
+                                          ttl=RSS_UNMATCHED_TTL)
         log.info("【Brush】任务 %s 本次添加了 %s 个下载" % (task_name, success_count))
 
     def remove_tasks_torrents(self):
@@ -1,10 +1,10 @@
 import os
 import threading
 import time
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
-from app.db.models import BaseMedia, MEDIASYNCITEMS, MEDIASYNCSTATISTIC
+from app.db.models import BaseMedia, MEDIASYNCITEMS, MEDIASYNCSTATISTIC, MEDIASYNCWATERMARK
 from app.utils import ExceptionUtils
 from config import Config
 
@@ -23,6 +23,27 @@ _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autocommit=False))
 
 
+# 同步媒体库时的暂存表，全部写入后一次性替换正式表
+_STAGING_TABLE = "MEDIASYNC_ITEMS_STAGING"
+_SYNC_COLUMNS = ("SERVER", "LIBRARY", "ITEM_ID", "ITEM_TYPE", "TITLE", "ORGIN_TITLE", "YEAR", "TMDBID", "IMDBID", "PATH")
+
+
+def _item_row(server_type, item):
+    """
+    媒体服务器项目转换为登记薄的一行，顺序与_SYNC_COLUMNS一致
+    """
+    return (server_type,
+            item.get("library"),
+            item.get("id"),
+            item.get("type"),
+            item.get("title"),
+            item.get("originalTitle"),
+            item.get("year"),
+            item.get("tmdbid"),
+            item.get("imdbid"),
+            item.get("path"))
+
+
 class MediaDb:
 
     @property
@@ -74,6 +95,186 @@ class MediaDb:
             self.session.rollback()
         return False
 
+    @staticmethod
+    def begin_sync():
+        """
+        开始全量同步，创建空的暂存表，同步期间正式表保持可用
+        """
+        try:
+            with _Engine.begin() as conn:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS "%s"' % _STAGING_TABLE)
+                conn.exec_driver_sql('CREATE TABLE "%s" AS SELECT %s FROM "%s" WHERE 0' % (
+                    _STAGING_TABLE, ", ".join(_SYNC_COLUMNS), MEDIASYNCITEMS.__tablename__))
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return False
+
+    @staticmethod
+    def insert_staging(server_type, items):
+        """
+        批量写入暂存表，一批数据一个事务
+        :return: 写入的数量，写入失败时返回None
+        """
+        if not server_type or not items:
+            return 0
+        rows = [_item_row(server_type, item) for item in items if item]
+        try:
+            with _Engine.begin() as conn:
+                conn.exec_driver_sql('INSERT INTO "%s" (%s) VALUES (%s)' % (
+                    _STAGING_TABLE, ", ".join(_SYNC_COLUMNS), ", ".join(["?"] * len(_SYNC_COLUMNS))), rows)
+            return len(rows)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return None
+
+    @staticmethod
+    def finish_sync():
+        """
+        结束全量同步，在一个事务中用暂存表替换正式表的数据，同一项目重复时保留最后一条
+        """
+        columns = ", ".join(_SYNC_COLUMNS)
+        try:
+            with _Engine.begin() as conn:
+                conn.exec_driver_sql('DELETE FROM "%s"' % MEDIASYNCITEMS.__tablename__)
+                conn.exec_driver_sql('INSERT INTO "%s" (%s) SELECT %s FROM "%s" '
+                                     'WHERE rowid IN (SELECT MAX(rowid) FROM "%s" GROUP BY SERVER, ITEM_ID) '
+                                     'ORDER BY rowid' % (MEDIASYNCITEMS.__tablename__, columns, columns,
+                                                         _STAGING_TABLE, _STAGING_TABLE))
+                conn.exec_driver_sql('DROP TABLE "%s"' % _STAGING_TABLE)
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return False
+
+    @staticmethod
+    def abort_sync():
+        """
+        放弃全量同步，删除暂存表，正式表不变
+        """
+        try:
+            with _Engine.begin() as conn:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS "%s"' % _STAGING_TABLE)
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return False
+
+    @staticmethod
+    def upsert_items(server_type, items, replace=True):
+        """
+        增量更新登记薄，一批数据一个事务
+        :param server_type: 媒体服务器类型
+        :param items: 媒体服务器项目列表
+        :param replace: 已存在时是否替换，为False时只登记不存在的项目
+        :return: 处理的数量，写入失败时返回None
+        """
+        if not server_type or not items:
+            return 0
+        rows = [_item_row(server_type, item) for item in items if item and item.get("id")]
+        if not rows:
+            return 0
+        table = MEDIASYNCITEMS.__tablename__
+        columns = ", ".join(_SYNC_COLUMNS)
+        placeholders = ", ".join(["?"] * len(_SYNC_COLUMNS))
+        try:
+            with _Engine.begin() as conn:
+                if replace:
+                    conn.exec_driver_sql('DELETE FROM "%s" WHERE SERVER = ? AND ITEM_ID = ?' % table,
+                                         [(server_type, row[2]) for row in rows])
+                    conn.exec_driver_sql('INSERT INTO "%s" (%s) VALUES (%s)' % (table, columns, placeholders), rows)
+                else:
+                    conn.exec_driver_sql('INSERT INTO "%s" (%s) SELECT %s WHERE NOT EXISTS '
+                                         '(SELECT 1 FROM "%s" WHERE SERVER = ? AND ITEM_ID = ?)' % (
+                                             table, columns, placeholders, table),
+                                         [row + (server_type, row[2]) for row in rows])
+            return len(rows)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return None
+
+    @staticmethod
+    def delete_items(server_type, item_ids):
+        """
+        从登记薄中删除项目
+        """
+        if not server_type or not item_ids:
+            return False
+        try:
+            with _Engine.begin() as conn:
+                conn.exec_driver_sql('DELETE FROM "%s" WHERE SERVER = ? AND ITEM_ID = ?' % MEDIASYNCITEMS.__tablename__,
+                                     [(server_type, str(item_id)) for item_id in item_ids])
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return False
+
+    def has_item(self, server_type, item_id):
+        """
+        登记薄中是否有该项目
+        """
+        if not server_type or not item_id:
+            return False
+        return self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                         MEDIASYNCITEMS.ITEM_ID == str(item_id)).count() > 0
+
+    def get_item_counts(self, server_type):
+        """
+        按类型统计登记薄中的项目数量
+        :return: 总数，电影数，电视剧数
+        """
+        if not server_type:
+            return 0, 0, 0
+        total_count = movie_count = tv_count = 0
+        for item_type, count in self.session.query(MEDIASYNCITEMS.ITEM_TYPE,
+                                                   func.count(MEDIASYNCITEMS.ID)).filter(
+                MEDIASYNCITEMS.SERVER == server_type).group_by(MEDIASYNCITEMS.ITEM_TYPE):
+            total_count += count
+            if item_type in ['Movie', 'movie']:
+                movie_count += count
+            elif item_type in ['Series', 'show']:
+                tv_count += count
+        return total_count, movie_count, tv_count
+
+    def get_watermarks(self, server_type):
+        """
+        查询各媒体库上次同步的时间
+        :return: {媒体库ID: 时间戳}
+        """
+        if not server_type:
+            return {}
+        return {watermark.LIBRARY: watermark.SYNC_TIME
+                for watermark in self.session.query(MEDIASYNCWATERMARK).filter(
+                    MEDIASYNCWATERMARK.SERVER == server_type)}
+
+    def update_watermarks(self, server_type, watermarks, clear=False):
+        """
+        记录各媒体库的同步时间
+        :param server_type: 媒体服务器类型
+        :param watermarks: {媒体库ID: 时间戳}
+        :param clear: 是否清除其它媒体库的记录，全量同步时使用
+        """
+        if not server_type:
+            return False
+        try:
+            query = self.session.query(MEDIASYNCWATERMARK).filter(MEDIASYNCWATERMARK.SERVER == server_type)
+            if not clear:
+                query = query.filter(MEDIASYNCWATERMARK.LIBRARY.in_(list(watermarks.keys())))
+            query.delete(synchronize_session=False)
+            self.session.flush()
+            for library, sync_time in watermarks.items():
+                self.session.add(MEDIASYNCWATERMARK(
+                    SERVER=server_type,
+                    LIBRARY=library,
+                    SYNC_TIME=sync_time
+                ))
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
     def statistics(self, server_type, total_count, movie_count, tv_count):
         if not server_type:
             return False
@@ -99,7 +300,8 @@ class MediaDb:
         if not server_type or not title:
             return False
         if tmdbid:
-            count = self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.TMDBID == str(tmdbid)).count()
+            count = self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                              MEDIASYNCITEMS.TMDBID == str(tmdbid)).count()
             if count:
                 return True
         if year:
@@ -120,6 +322,17 @@ class MediaDb:
         else:
             return False
 
+    def get_index_items(self, server_type):
+        """
+        查询登记薄中用于建立存在性索引的字段
+        :return: [(标题, 年份, TMDBID)]
+        """
+        if not server_type:
+            return []
+        return self.session.query(MEDIASYNCITEMS.TITLE,
+                                  MEDIASYNCITEMS.YEAR,
+                                  MEDIASYNCITEMS.TMDBID).filter(MEDIASYNCITEMS.SERVER == server_type).all()
+
     def get_statistics(self, server_type):
         if not server_type:
             return None
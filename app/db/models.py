@@ -252,6 +252,19 @@ class RSSMOVIES(Base):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
+class RSSSEEN(Base):
+    __tablename__ = 'RSS_SEEN'
+    __table_args__ = (
+        Index('INDX_RSS_SEEN_FEED', 'FEED', 'FINGERPRINT'),
+    )
+
+    ID = Column(Integer, Sequence('ID'), primary_key=True)
+    FEED = Column(Text)
+    GUID = Column(Text)
+    FINGERPRINT = Column(Text)
+    DATE = Column(Text, index=True)
+
+
 class RSSTORRENTS(Base):
     __tablename__ = 'RSS_TORRENTS'
     __table_args__ = (
@@ -569,6 +582,18 @@ class MEDIASYNCITEMS(BaseMedia):
     JSON = Column(Text)
 
 
+class MEDIASYNCWATERMARK(BaseMedia):
+    __tablename__ = 'MEDIASYNC_WATERMARKS'
+    __table_args__ = (
+        Index('INDX_MEDIASYNC_WATERMARKS_SL', 'SERVER', 'LIBRARY'),
+    )
+
+    ID = Column(Integer, Sequence('ID'), primary_key=True)
+    SERVER = Column(Text)
+    LIBRARY = Column(Text)
+    SYNC_TIME = Column(Float)
+
+
 class MEDIASYNCSTATISTIC(BaseMedia):
     __tablename__ = 'MEDIASYNC_STATISTICS'
 
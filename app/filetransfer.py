@@ -5,24 +5,40 @@ import re
 import shutil
 import traceback
 from enum import Enum
-from threading import Lock, Timer
+from functools import partial
+from threading import Timer
 from time import sleep
 
 import log
 from app.conf import ModuleConf
 from app.helper import DbHelper, ProgressHelper
-from app.helper import ThreadHelper
+from app.helper import ThreadHelper, TransferHelper, TransferBatch, LibraryHelper
 from app.media import Media, Category, Scraper
 from app.media.meta import MetaInfo
 from app.mediaserver import MediaServer
 from app.message import Message
 from app.subtitle import Subtitle
-from app.utils import EpisodeFormat, PathUtils, StringUtils, SystemUtils, ExceptionUtils
+from app.utils import EpisodeFormat, PathUtils, PathTrie, StringUtils, SystemUtils, ExceptionUtils
 from app.utils.types import MediaType, SyncType, RmtMode
 from config import RMT_SUBEXT, RMT_MEDIAEXT, RMT_FAVTYPE, RMT_MIN_FILESIZE, DEFAULT_MOVIE_FORMAT, \
     DEFAULT_TV_FORMAT, Config
 
-lock = Lock()
+# 字幕正则式
+_ZHCN_SUB_RE = re.compile(r"([.\[(](((zh[-_])?(cn|ch[si]|sg|sc))|zho?"
+                          r"|chinese|(cn|ch[si]|sg|zho?|eng)[-_&](cn|ch[si]|sg|zho?|eng)"
+                          r"|简[体中]?)[.\])])"
+                          r"|([\u4e00-\u9fa5]{0,3}[中双][\u4e00-\u9fa5]{0,2}[字文语][\u4e00-\u9fa5]{0,3})"
+                          r"|简体|简中", re.I)
+_ZHTW_SUB_RE = re.compile(r"([.\[(](((zh[-_])?(hk|tw|cht|tc))"
+                          r"|繁[体中]?)[.\])])"
+                          r"|繁体中[文字]|中[文字]繁体|繁体", re.I)
+_ENG_SUB_RE = re.compile(r"[.\[(]eng[.\])]", re.I)
+# 字幕重名时附加的语言标识
+_NEW_SUB_TAG_DICT = {
+    ".eng": ".英文",
+    ".chi.zh-cn": ".简体中文",
+    ".zh-tw": ".繁体中文"
+}
 
 
 class FileTransfer:
@@ -34,6 +50,7 @@ class FileTransfer:
     threadhelper = None
     dbhelper = None
     progress = None
+    library = None
 
     _default_rmt_mode = None
     _movie_path = None
@@ -56,10 +73,12 @@ class FileTransfer:
     _refresh_mediaserver = False
     _ignored_paths = []
     _ignored_files = ''
+    _target_trie = None
 
     def __init__(self):
         self.media = Media()
         self.message = Message()
+        self.library = LibraryHelper()
         self.category = Category()
         self.mediaserver = MediaServer()
         self.scraper = Scraper()
@@ -151,151 +170,167 @@ class FileTransfer:
                     self._tv_file_rmt_format = tv_formats[-1]
         self._default_rmt_mode = ModuleConf.RMT_MODES.get(Config().get_config('pt').get('rmt_mode', 'copy'),
                                                           RmtMode.COPY)
+        # 媒体库目录变化后重建索引
+        self.library.refresh()
+        # 媒体库目录前缀树
+        self._target_trie = PathTrie((self._movie_path or [])
+                                     + (self._tv_path or [])
+                                     + (self._anime_path or [])
+                                     + (self._unknown_path or []))
 
     @staticmethod
-    def __transfer_command(file_item, target_file, rmt_mode):
+    def __transfer_command(file_item, target_file, rmt_mode, batch=None):
         """
-        使用系统命令处理单个文件
+        使用系统命令处理单个文件，耗时的转移按目的地排队，不同目的地之间并行
         :param file_item: 文件路径
         :param target_file: 目标文件路径
         :param rmt_mode: RmtMode转移方式
+        :param batch: 批量转移队列，非空时只加入队列，统一执行
         """
-        with lock:
-            if rmt_mode == RmtMode.LINK:
-                # 更链接
-                retcode, retmsg = SystemUtils.link(file_item, target_file)
-            elif rmt_mode == RmtMode.SOFTLINK:
-                # 软链接
-                retcode, retmsg = SystemUtils.softlink(file_item, target_file)
-            elif rmt_mode == RmtMode.MOVE:
-                # 移动
-                retcode, retmsg = SystemUtils.move(file_item, target_file)
-            elif rmt_mode == RmtMode.RCLONE:
-                # Rclone移动
-                retcode, retmsg = SystemUtils.rclone_move(file_item, target_file)
-            elif rmt_mode == RmtMode.RCLONECOPY:
-                # Rclone复制
-                retcode, retmsg = SystemUtils.rclone_copy(file_item, target_file)
-            elif rmt_mode == RmtMode.MINIO:
-                # Minio移动
-                retcode, retmsg = SystemUtils.minio_move(file_item, target_file)
-            elif rmt_mode == RmtMode.MINIOCOPY:
-                # Minio复制
-                retcode, retmsg = SystemUtils.minio_copy(file_item, target_file)
-            else:
-                # 复制
-                retcode, retmsg = SystemUtils.copy(file_item, target_file)
+        if batch is not None:
+            batch.add(file_item, target_file)
+            return 0
+        retcode, retmsg = TransferHelper().transfer(src=file_item,
+                                                    dest=target_file,
+                                                    rmt_mode=rmt_mode)
         if retcode != 0:
             log.error("【Rmt】%s" % retmsg)
         return retcode
 
-    def __transfer_subtitles(self, org_name, new_name, rmt_mode):
+    @staticmethod
+    def __get_subtitle_index(dir_name, sub_index=None):
+        """
+        建立目录下字幕文件的索引，每个字幕只识别一次，同一次转移中按目录复用
+        :param dir_name: 目录
+        :param sub_index: 本次转移的字幕索引缓存，目录 -> 索引
+        :return: {"subs": 字幕信息列表, "stems": {去掉语言标识的文件名: [序号]},
+                  "cn_names": {中文名: [序号]}, "en_names": {英文名: [序号]}}
+        """
+        if sub_index is not None and dir_name in sub_index:
+            return sub_index[dir_name]
+        index = {"subs": [], "stems": {}, "cn_names": {}, "en_names": {}}
+        file_list = PathUtils.get_dir_level1_files(dir_name, RMT_SUBEXT)
+        if len(file_list) == 0:
+            log.debug("【Rmt】%s 目录下没有找到字幕文件..." % dir_name)
+        else:
+            log.debug("【Rmt】字幕文件清单：" + str(file_list))
+        for file_item in file_list:
+            sub_file_name = _ZHTW_SUB_RE.sub(".", _ZHCN_SUB_RE.sub(".", os.path.basename(file_item)))
+            sub_file_name = _ENG_SUB_RE.sub(".", sub_file_name)
+            sub_metainfo = MetaInfo(title=os.path.basename(file_item))
+            new_file_type = ""
+            # 兼容jellyfin字幕识别(多重识别), emby则会识别最后一个后缀
+            if _ZHCN_SUB_RE.search(file_item):
+                new_file_type = ".chi.zh-cn"
+            elif _ZHTW_SUB_RE.search(file_item):
+                new_file_type = ".zh-tw"
+            elif _ENG_SUB_RE.search(file_item):
+                new_file_type = ".eng"
+            sub_no = len(index["subs"])
+            index["subs"].append({"file": file_item,
+                                  "season": sub_metainfo.get_season_string(),
+                                  "episode": sub_metainfo.get_episode_string(),
+                                  "type": new_file_type})
+            index["stems"].setdefault(os.path.splitext(sub_file_name)[0], []).append(sub_no)
+            if sub_metainfo.cn_name:
+                index["cn_names"].setdefault(sub_metainfo.cn_name, []).append(sub_no)
+            if sub_metainfo.en_name:
+                index["en_names"].setdefault(sub_metainfo.en_name, []).append(sub_no)
+        if sub_index is not None:
+            sub_index[dir_name] = index
+        return index
+
+    def __transfer_subtitles(self, org_name, new_name, rmt_mode, batch=None, sub_index=None):
         """
         根据文件名转移对应字幕文件
         :param org_name: 原文件名
         :param new_name: 新文件名
         :param rmt_mode: RmtMode转移方式
+        :param batch: 批量转移队列
+        :param sub_index: 本次转移的字幕索引缓存
         """
-        # 字幕正则式
-        _zhcn_sub_re = r"([.\[(](((zh[-_])?(cn|ch[si]|sg|sc))|zho?" \
-                       r"|chinese|(cn|ch[si]|sg|zho?|eng)[-_&](cn|ch[si]|sg|zho?|eng)" \
-                       r"|简[体中]?)[.\])])" \
-                       r"|([\u4e00-\u9fa5]{0,3}[中双][\u4e00-\u9fa5]{0,2}[字文语][\u4e00-\u9fa5]{0,3})" \
-                       r"|简体|简中"
-        _zhtw_sub_re = r"([.\[(](((zh[-_])?(hk|tw|cht|tc))" \
-                       r"|繁[体中]?)[.\])])" \
-                       r"|繁体中[文字]|中[文字]繁体|繁体"
-        _eng_sub_re = r"[.\[(]eng[.\])]"
-
         # 比对文件名并转移字幕
         dir_name = os.path.dirname(org_name)
         file_name = os.path.basename(org_name)
-        file_list = PathUtils.get_dir_level1_files(dir_name, RMT_SUBEXT)
-        if len(file_list) == 0:
-            log.debug("【Rmt】%s 目录下没有找到字幕文件..." % dir_name)
-        else:
-            log.debug("【Rmt】字幕文件清单：" + str(file_list))
+        index = self.__get_subtitle_index(dir_name, sub_index)
+        if index.get("subs"):
             metainfo = MetaInfo(title=file_name)
-            for file_item in file_list:
-                sub_file_name = re.sub(_zhtw_sub_re,
-                                       ".",
-                                       re.sub(_zhcn_sub_re,
-                                              ".",
-                                              os.path.basename(file_item),
-                                              flags=re.I),
-                                       flags=re.I)
-                sub_file_name = re.sub(_eng_sub_re, ".", sub_file_name, flags=re.I)
-                sub_metainfo = MetaInfo(title=os.path.basename(file_item))
-                if (os.path.splitext(file_name)[0] == os.path.splitext(sub_file_name)[0]) or \
-                        (sub_metainfo.cn_name and sub_metainfo.cn_name == metainfo.cn_name) \
-                        or (sub_metainfo.en_name and sub_metainfo.en_name == metainfo.en_name):
-                    if metainfo.get_season_string() \
-                            and metainfo.get_season_string() != sub_metainfo.get_season_string():
-                        continue
-                    if metainfo.get_episode_string() \
-                            and metainfo.get_episode_string() != sub_metainfo.get_episode_string():
-                        continue
-                    new_file_type = ""
-                    # 兼容jellyfin字幕识别(多重识别), emby则会识别最后一个后缀
-                    if re.search(_zhcn_sub_re, file_item, re.I):
-                        new_file_type = ".chi.zh-cn"
-                    elif re.search(_zhtw_sub_re, file_item,
-                                   re.I):
-                        new_file_type = ".zh-tw"
-                    elif re.search(_eng_sub_re, file_item, re.I):
-                        new_file_type = ".eng"
-                    # 通过对比字幕文件大小  尽量转移所有存在的字幕
-                    file_ext = os.path.splitext(file_item)[-1]
-                    new_sub_tag_dict = {
-                        ".eng": ".英文",
-                        ".chi.zh-cn": ".简体中文",
-                        ".zh-tw": ".繁体中文"
-                    }
-                    new_sub_tag_list = [
-                        new_file_type if t == 0 else "%s%s(%s)" % (new_file_type,
-                                                                   new_sub_tag_dict.get(
-                                                                       new_file_type, ""
-                                                                   ),
-                                                                   t) for t in range(6)
-                    ]
-                    for new_sub_tag in new_sub_tag_list:
-                        new_file = os.path.splitext(new_name)[0] + new_sub_tag + file_ext
-                        # 如果字幕文件不存在, 直接转移字幕, 并跳出循环
-                        try:
-                            if not os.path.exists(new_file):
-                                log.debug("【Rmt】正在处理字幕：%s" % os.path.basename(file_item))
-                                retcode = self.__transfer_command(file_item=file_item,
-                                                                  target_file=new_file,
-                                                                  rmt_mode=rmt_mode)
-                                if retcode == 0:
+            season_string = metainfo.get_season_string()
+            episode_string = metainfo.get_episode_string()
+            # 文件名相同或中英文名相同的字幕，保持目录中的顺序
+            sub_nos = set(index["stems"].get(os.path.splitext(file_name)[0], []))
+            if metainfo.cn_name:
+                sub_nos.update(index["cn_names"].get(metainfo.cn_name, []))
+            if metainfo.en_name:
+                sub_nos.update(index["en_names"].get(metainfo.en_name, []))
+            for sub_no in sorted(sub_nos):
+                sub_info = index["subs"][sub_no]
+                # 已被前面的文件移走
+                if sub_info.get("moved"):
+                    continue
+                file_item = sub_info.get("file")
+                if season_string \
+                        and season_string != sub_info.get("season"):
+                    continue
+                if episode_string \
+                        and episode_string != sub_info.get("episode"):
+                    continue
+                new_file_type = sub_info.get("type")
+                # 通过对比字幕文件大小  尽量转移所有存在的字幕
+                file_ext = os.path.splitext(file_item)[-1]
+                new_sub_tag_list = [
+                    new_file_type if t == 0 else "%s%s(%s)" % (new_file_type,
+                                                               _NEW_SUB_TAG_DICT.get(
+                                                                   new_file_type, ""
+                                                               ),
+                                                               t) for t in range(6)
+                ]
+                for new_sub_tag in new_sub_tag_list:
+                    new_file = os.path.splitext(new_name)[0] + new_sub_tag + file_ext
+                    # 如果字幕文件不存在, 直接转移字幕, 并跳出循环
+                    try:
+                        if not os.path.exists(new_file):
+                            log.debug("【Rmt】正在处理字幕：%s" % os.path.basename(file_item))
+                            retcode = self.__transfer_command(file_item=file_item,
+                                                              target_file=new_file,
+                                                              rmt_mode=rmt_mode,
+                                                              batch=batch)
+                            if retcode == 0:
+                                if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+                                    sub_info["moved"] = True
+                                if batch is None:
                                     log.info("【Rmt】字幕 %s %s完成" % (os.path.basename(file_item), rmt_mode.value))
-                                    break
-                                else:
-                                    log.error(
-                                        "【Rmt】字幕 %s %s失败，错误码 %s" % (file_name, rmt_mode.value, str(retcode)))
-                                    return retcode
-                            # 如果字幕文件的大小与已存在文件相同, 说明已经转移过了, 则跳出循环
-                            elif os.path.getsize(new_file) == os.path.getsize(file_item):
-                                log.info("【Rmt】字幕 %s 已存在" % new_file)
                                 break
-                            # 否则 循环继续 > 通过new_sub_tag_list 获取新的tag附加到字幕文件名, 继续检查是否能转移
-                        except OSError as reason:
-                            log.info("【Rmt】字幕 %s 出错了,原因: %s" % (new_file, str(reason)))
+                            else:
+                                log.error(
+                                    "【Rmt】字幕 %s %s失败，错误码 %s" % (file_name, rmt_mode.value, str(retcode)))
+                                return retcode
+                        # 如果字幕文件的大小与已存在文件相同, 说明已经转移过了, 则跳出循环
+                        elif os.path.getsize(new_file) == os.path.getsize(file_item):
+                            log.info("【Rmt】字幕 %s 已存在" % new_file)
+                            break
+                        # 否则 循环继续 > 通过new_sub_tag_list 获取新的tag附加到字幕文件名, 继续检查是否能转移
+                    except OSError as reason:
+                        log.info("【Rmt】字幕 %s 出错了,原因: %s" % (new_file, str(reason)))
         return 0
 
-    def __transfer_bluray_dir(self, file_path, new_path, rmt_mode):
+    def __transfer_bluray_dir(self, file_path, new_path, rmt_mode, batch=None):
         """
         转移蓝光文件夹
         :param file_path: 原路径
         :param new_path: 新路径
         :param rmt_mode: RmtMode转移方式
+        :param batch: 批量转移队列
         """
         log.info("【Rmt】正在%s目录：%s 到 %s" % (rmt_mode.value, file_path, new_path))
         # 复制
         retcode = self.__transfer_dir_files(src_dir=file_path,
                                             target_dir=new_path,
                                             rmt_mode=rmt_mode,
-                                            bludir=True)
+                                            bludir=True,
+                                            batch=batch)
+        if batch is not None:
+            return retcode
         if retcode == 0:
             log.info("【Rmt】文件 %s %s完成" % (file_path, rmt_mode.value))
         else:
@@ -310,30 +345,20 @@ class FileTransfer:
         """
         if not path:
             return False
-        for tv_path in self._tv_path:
-            if PathUtils.is_path_in_path(tv_path, path):
-                return True
-        for movie_path in self._movie_path:
-            if PathUtils.is_path_in_path(movie_path, path):
-                return True
-        for anime_path in self._anime_path:
-            if PathUtils.is_path_in_path(anime_path, path):
-                return True
-        for unknown_path in self._unknown_path:
-            if PathUtils.is_path_in_path(unknown_path, path):
-                return True
-        return False
+        return self._target_trie.contains(path)
 
-    def __transfer_dir_files(self, src_dir, target_dir, rmt_mode, bludir=False):
+    def __transfer_dir_files(self, src_dir, target_dir, rmt_mode, bludir=False, batch=None):
         """
         按目录结构转移所有文件
         :param src_dir: 原路径
         :param target_dir: 新路径
         :param rmt_mode: RmtMode转移方式
         :param bludir: 是否蓝光目录
+        :param batch: 批量转移队列，非空时转移成功后才登记
         """
         file_list = PathUtils.get_dir_files(src_dir)
         retcode = 0
+        start = len(batch) if batch is not None else 0
         for file in file_list:
             new_file = file.replace(src_dir, target_dir)
             if os.path.exists(new_file):
@@ -342,24 +367,34 @@ class FileTransfer:
             new_dir = os.path.dirname(new_file)
             if not os.path.exists(new_dir) and rmt_mode not in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
                 os.makedirs(new_dir)
+                self.library.add(new_dir, is_dir=True)
             retcode = self.__transfer_command(file_item=file,
                                               target_file=new_file,
-                                              rmt_mode=rmt_mode)
+                                              rmt_mode=rmt_mode,
+                                              batch=batch)
             if retcode != 0:
                 break
+            elif batch is not None:
+                if not bludir:
+                    batch.on_success(len(batch) - 1, len(batch),
+                                     partial(self.dbhelper.insert_transfer_blacklist, file))
             else:
                 if not bludir:
                     self.dbhelper.insert_transfer_blacklist(file)
-        if retcode == 0 and bludir:
+        if batch is not None:
+            if bludir:
+                batch.on_success(start, len(batch), partial(self.dbhelper.insert_transfer_blacklist, src_dir))
+        elif retcode == 0 and bludir:
             self.dbhelper.insert_transfer_blacklist(src_dir)
         return retcode
 
-    def __transfer_origin_file(self, file_item, target_dir, rmt_mode):
+    def __transfer_origin_file(self, file_item, target_dir, rmt_mode, batch=None):
         """
         按原文件名link文件到目的目录
         :param file_item: 原文件路径
         :param target_dir: 目的目录
         :param rmt_mode: RmtMode转移方式
+        :param batch: 批量转移队列
         """
         if not file_item or not target_dir:
             return -1
@@ -372,12 +407,14 @@ class FileTransfer:
         if not os.path.exists(target_dir) and rmt_mode not in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
             log.debug("【Rmt】正在创建目录：%s" % target_dir)
             os.makedirs(target_dir)
+            self.library.add(target_dir, is_dir=True)
         # 目录
         if os.path.isdir(file_item):
             log.info("【Rmt】正在%s目录：%s 到 %s" % (rmt_mode.value, file_item, target_dir))
             retcode = self.__transfer_dir_files(src_dir=file_item,
                                                 target_dir=target_dir,
-                                                rmt_mode=rmt_mode)
+                                                rmt_mode=rmt_mode,
+                                                batch=batch)
         # 文件
         else:
             target_file = os.path.join(target_dir, os.path.basename(file_item))
@@ -386,22 +423,31 @@ class FileTransfer:
                 return 0
             retcode = self.__transfer_command(file_item=file_item,
                                               target_file=target_file,
-                                              rmt_mode=rmt_mode)
-            if retcode == 0:
+                                              rmt_mode=rmt_mode,
+                                              batch=batch)
+            if batch is not None:
+                batch.on_success(len(batch) - 1, len(batch),
+                                 partial(self.dbhelper.insert_transfer_blacklist, file_item))
+            elif retcode == 0:
                 self.dbhelper.insert_transfer_blacklist(file_item)
-        if retcode == 0:
+        if batch is not None:
+            log.info("【Rmt】%s 已加入批量%s到unknown队列" % (file_item, rmt_mode.value))
+        elif retcode == 0:
             log.info("【Rmt】%s %s到unknown完成" % (file_item, rmt_mode.value))
         else:
             log.error("【Rmt】%s %s到unknown失败，错误码 %s" % (file_item, rmt_mode.value, retcode))
         return retcode
 
-    def __transfer_file(self, file_item, new_file, rmt_mode, over_flag=False, old_file=None):
+    def __transfer_file(self, file_item, new_file, rmt_mode, over_flag=False, old_file=None, batch=None,
+                        sub_index=None):
         """
         转移一个文件，同时处理字幕
         :param file_item: 原文件路径
         :param new_file: 新文件路径
         :param rmt_mode: RmtMode转移方式
         :param over_flag: 是否覆盖，为True时会先删除再转移
+        :param batch: 批量转移队列，非空时文件及字幕只加入队列，转移成功后才登记
+        :param sub_index: 本次转移的字幕索引缓存
         """
         file_name = os.path.basename(file_item)
         if not over_flag and os.path.exists(new_file):
@@ -410,11 +456,16 @@ class FileTransfer:
         if over_flag and old_file and os.path.isfile(old_file):
             log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
             os.remove(old_file)
+            self.library.remove(old_file)
         log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
         retcode = self.__transfer_command(file_item=file_item,
                                           target_file=new_file,
-                                          rmt_mode=rmt_mode)
-        if retcode == 0:
+                                          rmt_mode=rmt_mode,
+                                          batch=batch)
+        if batch is not None:
+            batch.on_success(len(batch) - 1, len(batch),
+                             partial(self.dbhelper.insert_transfer_blacklist, file_item))
+        elif retcode == 0:
             log.info("【Rmt】文件 %s %s完成" % (file_name, rmt_mode.value))
             self.dbhelper.insert_transfer_blacklist(file_item)
         else:
@@ -423,7 +474,9 @@ class FileTransfer:
         # 处理字幕
         return self.__transfer_subtitles(org_name=file_item,
                                          new_name=new_file,
-                                         rmt_mode=rmt_mode)
+                                         rmt_mode=rmt_mode,
+                                         batch=batch,
+                                         sub_index=sub_index)
 
     def transfer_media(self,
                        in_from: Enum,
@@ -457,7 +510,13 @@ class FileTransfer:
         :return: 处理状态，错误信息
         """
 
+        # 远程转移方式的批量转移队列，及转移成功后才登记的媒体
+        batch = None
+        batch_medias = []
+
         def __finish_transfer(status, message):
+            if batch is not None:
+                __flush_batch()
             if status:
                 self.progress.update(ptype="filetransfer",
                                      value=100,
@@ -488,9 +547,6 @@ class FileTransfer:
         if not files:
             # 如果传入的是个目录
             if os.path.isdir(in_path):
-                if not os.path.exists(in_path):
-                    log.error("【Rmt】文件转移失败，目录不存在 %s" % in_path)
-                    return __finish_transfer(False, "目录不存在")
                 # 回收站及隐藏的文件不处理
                 if PathUtils.is_invalid_path(in_path):
                     return __finish_transfer(False, "回收站或者隐藏文件夹")
@@ -569,11 +625,113 @@ class FileTransfer:
         refresh_library_items = []
         # 需要下载字段的清单
         download_subtitle_items = []
+        # 字幕索引，同一目录的字幕只识别一次
+        sub_index = {}
+
+        def __transfer_success(file_item, media, reg_path, new_file, dist_path, ret_dir_path, ret_file_path,
+                               file_ext, exist_filenum):
+            """
+            转移成功后登记刷新、字幕、历史记录，发送消息及刮削
+            """
+            # 媒体库刷新条目：类型-类别-标题-年份
+            refresh_item = {"type": media.type, "category": media.category, "title": media.title,
+                            "year": media.year, "target_path": dist_path}
+            # 登记媒体库刷新
+            if refresh_item not in refresh_library_items:
+                refresh_library_items.append(refresh_item)
+            # 查询TMDB详情，需要全部数据
+            media.set_tmdb_info(self.media.get_tmdb_info(mtype=media.type,
+                                                         tmdbid=media.tmdb_id,
+                                                         append_to_response="all"))
+            # 下载字幕条目
+            subtitle_item = {"type": media.type,
+                             "file": ret_file_path,
+                             "file_ext": os.path.splitext(file_item)[-1],
+                             "name": media.en_name if media.en_name else media.cn_name,
+                             "title": media.title,
+                             "year": media.year,
+                             "season": media.begin_season,
+                             "episode": media.begin_episode,
+                             "bluray": True if bluray_disk_dir else False,
+                             "imdbid": media.imdb_id}
+            # 登记字幕下载
+            if subtitle_item not in download_subtitle_items:
+                download_subtitle_items.append(subtitle_item)
+            # 转移历史记录
+            self.dbhelper.insert_transfer_history(
+                in_from=in_from,
+                rmt_mode=rmt_mode,
+                in_path=reg_path,
+                out_path=new_file if not bluray_disk_dir else None,
+                dest=dist_path,
+                media_info=media)
+            # 未识别手动识别或历史记录重新识别的批处理模式
+            if isinstance(episode[1], bool) and episode[1]:
+                # 未识别手动识别，更改未识别记录为已处理
+                self.dbhelper.update_transfer_unknown_state(file_item)
+            # 电影立即发送消息
+            if media.type == MediaType.MOVIE:
+                self.message.send_transfer_movie_message(in_from,
+                                                         media,
+                                                         exist_filenum,
+                                                         self._movie_category_flag)
+            # 否则登记汇总发消息
+            else:
+                # 按季汇总
+                message_key = "%s-%s" % (media.get_title_string(), media.get_season_string())
+                if not message_medias.get(message_key):
+                    message_medias[message_key] = media
+                # 汇总集数、大小
+                if not message_medias[message_key].is_in_episode(media.get_episode_list()):
+                    message_medias[message_key].total_episodes += media.total_episodes
+                    message_medias[message_key].size += media.size
+            # 生成nfo及poster
+            if self._scraper_flag:
+                # 生成刮削文件
+                self.scraper.gen_scraper_files(media=media,
+                                               scraper_nfo=self._scraper_nfo,
+                                               scraper_pic=self._scraper_pic,
+                                               dir_path=ret_dir_path,
+                                               file_name=os.path.basename(ret_file_path),
+                                               file_ext=file_ext)
+
+        def __flush_batch():
+            """
+            执行批量转移队列，按每个文件的结果登记成功或失败
+            """
+            nonlocal success_flag, error_message, failed_count, alert_count
+            if batch is None:
+                return
+            batch.flush()
+            for start, end, success_args in batch_medias:
+                retcode = batch.get_retcode(start, end)
+                if retcode == 0:
+                    try:
+                        __transfer_success(**success_args)
+                    except Exception as e:
+                        ExceptionUtils.exception_traceback(e)
+                        log.error("【Rmt】文件转移时发生错误：%s - %s" % (str(e), traceback.format_exc()))
+                else:
+                    success_flag = False
+                    error_message = "文件转移失败，错误码 %s" % retcode
+                    failed_count += 1
+                    alert_count += 1
+                    if error_message not in alert_messages:
+                        alert_messages.append(error_message)
+            batch_medias.clear()
+
+        # 远程转移方式按目的根目录合并为一次命令
+        if TransferHelper.is_batch_mode(rmt_mode):
+            batch = TransferBatch(rmt_mode=rmt_mode,
+                                  roots=[target_dir, unknown_dir] + self._movie_path + self._tv_path
+                                        + self._anime_path + self._unknown_path)
         # 处理识别后的每一个文件或单个文件夹
         for file_item, media in Medias.items():
             try:
                 # 总数量
                 total_count = total_count + 1
+                # 本文件在批量转移队列中的开始序号
+                batch_start = len(batch) if batch is not None else 0
 
                 if not udf_flag:
                     if re.search(r'[./\s\[]+Sample[/.\s\]]+', file_item, re.IGNORECASE):
@@ -611,13 +769,15 @@ class FileTransfer:
                     # 原样转移过去
                     if unknown_dir:
                         log.warn("【Rmt】%s 按原文件名转移到未识别目录：%s" % (file_name, unknown_dir))
-                        self.__transfer_origin_file(file_item=file_item, target_dir=unknown_dir, rmt_mode=rmt_mode)
+                        self.__transfer_origin_file(file_item=file_item, target_dir=unknown_dir, rmt_mode=rmt_mode,
+                                                    batch=batch)
                     elif self._unknown_path:
                         unknown_path = self.__get_best_unknown_path(in_path)
                         if not unknown_path:
                             continue
                         log.warn("【Rmt】%s 按原文件名转移到未识别目录：%s" % (file_name, unknown_path))
-                        self.__transfer_origin_file(file_item=file_item, target_dir=unknown_path, rmt_mode=rmt_mode)
+                        self.__transfer_origin_file(file_item=file_item, target_dir=unknown_path, rmt_mode=rmt_mode,
+                                                    batch=batch)
                     else:
                         log.error("【Rmt】%s 无法识别媒体信息！" % file_name)
                     continue
@@ -669,7 +829,9 @@ class FileTransfer:
                                 ret = self.__transfer_file(file_item=file_item,
                                                            new_file=new_file,
                                                            rmt_mode=rmt_mode,
-                                                           over_flag=True, old_file=old_file)
+                                                           over_flag=True, old_file=old_file,
+                                                           batch=batch,
+                                                           sub_index=sub_index)
                                 if ret != 0:
                                     success_flag = False
                                     error_message = "文件转移失败，错误码 %s" % ret
@@ -712,9 +874,10 @@ class FileTransfer:
                         # 创建目录
                         log.debug("【Rmt】正在创建目录：%s" % ret_dir_path)
                         os.makedirs(ret_dir_path)
+                        self.library.add(ret_dir_path, is_dir=True)
                 # 转移蓝光原盘
                 if bluray_disk_dir:
-                    ret = self.__transfer_bluray_dir(file_item, ret_dir_path, rmt_mode)
+                    ret = self.__transfer_bluray_dir(file_item, ret_dir_path, rmt_mode, batch=batch)
                     if ret != 0:
                         success_flag = False
                         error_message = "蓝光目录转移失败，错误码：%s" % ret
@@ -749,7 +912,9 @@ class FileTransfer:
                         ret = self.__transfer_file(file_item=file_item,
                                                    new_file=new_file,
                                                    rmt_mode=rmt_mode,
-                                                   over_flag=False)
+                                                   over_flag=False,
+                                                   batch=batch,
+                                                   sub_index=sub_index)
                         if ret != 0:
                             success_flag = False
                             error_message = "文件转移失败，错误码 %s" % ret
@@ -761,67 +926,20 @@ class FileTransfer:
                             if error_message not in alert_messages:
                                 alert_messages.append(error_message)
                             continue
-                # 媒体库刷新条目：类型-类别-标题-年份
-                refresh_item = {"type": media.type, "category": media.category, "title": media.title,
-                                "year": media.year, "target_path": dist_path}
-                # 登记媒体库刷新
-                if refresh_item not in refresh_library_items:
-                    refresh_library_items.append(refresh_item)
-                # 查询TMDB详情，需要全部数据
-                media.set_tmdb_info(self.media.get_tmdb_info(mtype=media.type,
-                                                             tmdbid=media.tmdb_id,
-                                                             append_to_response="all"))
-                # 下载字幕条目
-                subtitle_item = {"type": media.type,
-                                 "file": ret_file_path,
-                                 "file_ext": os.path.splitext(file_item)[-1],
-                                 "name": media.en_name if media.en_name else media.cn_name,
-                                 "title": media.title,
-                                 "year": media.year,
-                                 "season": media.begin_season,
-                                 "episode": media.begin_episode,
-                                 "bluray": True if bluray_disk_dir else False,
-                                 "imdbid": media.imdb_id}
-                # 登记字幕下载
-                if subtitle_item not in download_subtitle_items:
-                    download_subtitle_items.append(subtitle_item)
-                # 转移历史记录
-                self.dbhelper.insert_transfer_history(
-                    in_from=in_from,
-                    rmt_mode=rmt_mode,
-                    in_path=reg_path,
-                    out_path=new_file if not bluray_disk_dir else None,
-                    dest=dist_path,
-                    media_info=media)
-                # 未识别手动识别或历史记录重新识别的批处理模式
-                if isinstance(episode[1], bool) and episode[1]:
-                    # 未识别手动识别，更改未识别记录为已处理
-                    self.dbhelper.update_transfer_unknown_state(file_item)
-                # 电影立即发送消息
-                if media.type == MediaType.MOVIE:
-                    self.message.send_transfer_movie_message(in_from,
-                                                             media,
-                                                             exist_filenum,
-                                                             self._movie_category_flag)
-                # 否则登记汇总发消息
+                success_args = {"file_item": file_item,
+                                "media": media,
+                                "reg_path": reg_path,
+                                "new_file": new_file,
+                                "dist_path": dist_path,
+                                "ret_dir_path": ret_dir_path,
+                                "ret_file_path": ret_file_path,
+                                "file_ext": file_ext,
+                                "exist_filenum": exist_filenum}
+                if batch is not None:
+                    # 转移结果确定后再登记
+                    batch_medias.append((batch_start, len(batch), success_args))
                 else:
-                    # 按季汇总
-                    message_key = "%s-%s" % (media.get_title_string(), media.get_season_string())
-                    if not message_medias.get(message_key):
-                        message_medias[message_key] = media
-                    # 汇总集数、大小
-                    if not message_medias[message_key].is_in_episode(media.get_episode_list()):
-                        message_medias[message_key].total_episodes += media.total_episodes
-                        message_medias[message_key].size += media.size
-                # 生成nfo及poster
-                if self._scraper_flag:
-                    # 生成刮削文件
-                    self.scraper.gen_scraper_files(media=media,
-                                                   scraper_nfo=self._scraper_nfo,
-                                                   scraper_pic=self._scraper_pic,
-                                                   dir_path=ret_dir_path,
-                                                   file_name=os.path.basename(ret_file_path),
-                                                   file_ext=file_ext)
+                    __transfer_success(**success_args)
                 # 更新进度
                 self.progress.update(ptype="filetransfer",
                                      value=round(total_count / len(Medias) * 100),
@@ -834,6 +952,8 @@ class FileTransfer:
                 ExceptionUtils.exception_traceback(err)
                 log.error("【Rmt】文件转移时发生错误：%s - %s" % (str(err), traceback.format_exc()))
         # 循环结束
+        # 执行批量转移
+        __flush_batch()
         # 统计完成情况，发送通知
         if message_medias:
             self.message.send_transfer_tv_message(message_medias, in_from)
@@ -856,6 +976,7 @@ class FileTransfer:
                     and not PathUtils.get_dir_files(in_path=in_path, exts=(RMT_MEDIAEXT + ['.!qb', '.part'])):
                 # log.info("【Rmt】目录下已无媒体文件及正在下载的文件，移动模式下删除目录：%s" % in_path)
                 shutil.rmtree(in_path)
+                self.library.remove(in_path)
         return __finish_transfer(success_flag, error_message)
 
     def transfer_manually(self, s_path, t_path, mode):
@@ -911,6 +1032,7 @@ class FileTransfer:
                     min_filesize = int(Config().get_config('media').get('min_filesize')) or 100
                     if os.path.isdir(source_path) and not PathUtils.get_dir_files(in_path=source_path, filesize=min_filesize, exts=(RMT_MEDIAEXT + ['.!qb', '.part'])):
                         shutil.rmtree(source_path)
+                        self.library.remove(source_path)
             if can_update:
                 Timer(300, MediaServer().update_section_by_items, args=(pathItems.values())).start()
         else:
@@ -942,25 +1064,23 @@ class FileTransfer:
                 for m_type in [RMT_FAVTYPE, media.category]:
                     type_path = os.path.join(media_dest, m_type, dir_name)
                     # 目录是否存在
-                    if os.path.exists(type_path):
+                    if self.__dir_exists(type_path):
                         file_path = type_path
                         break
             # 返回路径
             ret_dir_path = file_path
             # 路径存在标志
-            if os.path.exists(file_path):
+            if self.__dir_exists(file_path):
                 dir_exist_flag = True
             # 文件路径
             file_dest = os.path.join(file_path, file_name)
             # 返回文件路径
             ret_file_path = file_dest
             # 文件是否存在
-            for ext in RMT_MEDIAEXT:
-                ext_dest = "%s%s" % (file_dest, ext)
-                if os.path.exists(ext_dest):
-                    file_exist_flag = True
-                    ret_file_path = ext_dest
-                    break
+            ext_dest = self.__find_media_file(file_dest)
+            if ext_dest:
+                file_exist_flag = True
+                ret_file_path = ext_dest
         # 电视剧或者动漫
         else:
             # 目录名称
@@ -978,7 +1098,7 @@ class FileTransfer:
                 # 返回目录路径
                 ret_dir_path = season_dir
                 # 目录是否存在
-                if os.path.exists(season_dir):
+                if self.__dir_exists(season_dir):
                     dir_exist_flag = True
                 # 处理集
                 episodes = media.get_episode_list()
@@ -988,14 +1108,35 @@ class FileTransfer:
                     # 返回文件路径
                     ret_file_path = file_path
                     # 文件存在标志
-                    for ext in RMT_MEDIAEXT:
-                        ext_dest = "%s%s" % (file_path, ext)
-                        if os.path.exists(ext_dest):
-                            file_exist_flag = True
-                            ret_file_path = ext_dest
-                            break
+                    ext_dest = self.__find_media_file(file_path)
+                    if ext_dest:
+                        file_exist_flag = True
+                        ret_file_path = ext_dest
         return dir_exist_flag, ret_dir_path, file_exist_flag, ret_file_path
 
+    def __dir_exists(self, dir_path):
+        """
+        从媒体库索引中判断目录是否存在，存在时再确认目录确实存在，已在外部删除时更新索引
+        """
+        if not self.library.exists(dir_path):
+            return False
+        if not os.path.exists(dir_path):
+            self.library.remove(dir_path)
+            return False
+        return True
+
+    def __find_media_file(self, file_path):
+        """
+        从媒体库索引中查找已存在的媒体文件，找到后再确认文件确实存在，索引已过时则刷新该目录
+        :param file_path: 不带后缀的文件路径
+        :return: 存在的文件路径，不存在时返回None
+        """
+        ext_dest = self.library.find_file(file_path, RMT_MEDIAEXT)
+        if ext_dest and not os.path.exists(ext_dest):
+            self.library.refresh(os.path.dirname(ext_dest))
+            return None
+        return ext_dest
+
     def transfer_embyfav(self, item_path):
         """
         Emby/Jellyfin点红星后转移电影文件到精选分类
@@ -1068,13 +1209,13 @@ class FileTransfer:
             for dest_path in self._movie_path:
                 # 判断精选
                 fav_path = os.path.join(dest_path, RMT_FAVTYPE, dir_name)
-                fav_files = PathUtils.get_dir_files(fav_path, RMT_MEDIAEXT)
+                fav_files = self.library.get_files(fav_path, RMT_MEDIAEXT)
                 # 其它分类
                 if self._movie_category_flag:
                     dest_path = os.path.join(dest_path, meta_info.category, dir_name)
                 else:
                     dest_path = os.path.join(dest_path, dir_name)
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
+                files = self.library.get_files(dest_path, RMT_MEDIAEXT)
                 if len(files) > 0 or len(fav_files) > 0:
                     return [{'title': meta_info.title, 'year': meta_info.year}]
             return []
@@ -1099,9 +1240,9 @@ class FileTransfer:
                 else:
                     dest_path = os.path.join(dest_path, dir_name, season_name)
                 # 目录不存在
-                if not os.path.exists(dest_path):
+                if not self.library.exists(dest_path):
                     continue
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
+                files = self.library.get_files(dest_path, RMT_MEDIAEXT)
                 for file in files:
                     file_meta_info = MetaInfo(os.path.basename(file))
                     if not file_meta_info.get_season_list() or not file_meta_info.get_episode_list():
@@ -1198,6 +1339,7 @@ class FileTransfer:
                 if os.path.isdir(path) and not PathUtils.get_dir_files(in_path=path):
                     # log.info("【Rmt】移动模式下删除同步目录下的空文件夹")
                     shutil.rmtree(path)
+                    self.library.remove(path)
         return ret, ""
 
     def get_format_dict(self, media):
@@ -1295,33 +1437,62 @@ class FileTransfer:
         :param: mediaid TMDBID/DB:豆瓣ID/BG:Bangumi的ID
         :return: 1-已订阅/2-已下载/0-不存在未订阅, RSSID
         """
-        if str(mediaid).isdigit():
-            tmdbid = mediaid
-        else:
-            tmdbid = None
-        if mtype in ["MOV", "电影", MediaType.MOVIE]:
-            rssid = self.dbhelper.get_rss_movie_id(title=title, year=year, tmdbid=tmdbid)
-        else:
-            if not tmdbid:
-                meta_info = MetaInfo(title=title)
-                title = meta_info.get_name()
-                season = meta_info.get_season_string()
-                if season:
-                    year = None
-            else:
-                season = None
-            rssid = self.dbhelper.get_rss_tv_id(title=title, year=year, season=season, tmdbid=tmdbid)
-        if rssid:
-            # 已订阅
-            fav = "1"
-        elif MediaServer().check_item_exists(title=title, year=year, tmdbid=tmdbid):
-            # 已下载
-            fav = "2"
-        else:
-            # 未订阅、未下载
-            fav = "0"
-        return fav, rssid
+        return self.get_media_exists_flags([(mtype, title, year, mediaid)])[0]
 
+    def get_media_exists_flags(self, medias):
+        """
+        批量获取媒体存在标记，订阅电影、订阅电视剧各查询一次，媒体库存在性一次查询内存索引
+        :param medias: [(媒体类型, 媒体标题, 媒体年份, TMDBID/DB:豆瓣ID/BG:Bangumi的ID)]
+        :return: 与medias一一对应的 (1-已订阅/2-已下载/0-不存在未订阅, RSSID)
+        """
+        # 序号 -> (标题, 年份, TMDBID)
+        movies = {}
+        # 序号 -> (标题, 年份, 季, TMDBID)
+        tvs = {}
+        # 无TMDBID的电视剧按标题识别名称及季，同一页中相同标题只识别一次
+        meta_infos = {}
+        for index, (mtype, title, year, mediaid) in enumerate(medias):
+            if str(mediaid).isdigit():
+                tmdbid = mediaid
+            else:
+                tmdbid = None
+            if mtype in ["MOV", "电影", MediaType.MOVIE]:
+                movies[index] = (title, year, tmdbid)
+            else:
+                if not tmdbid:
+                    if title not in meta_infos:
+                        meta_info = MetaInfo(title=title)
+                        meta_infos[title] = (meta_info.get_name(), meta_info.get_season_string())
+                    title, season = meta_infos[title]
+                    if season:
+                        year = None
+                else:
+                    season = None
+                tvs[index] = (title, year, season, tmdbid)
+        rssids = {}
+        if movies:
+            rssids.update(zip(movies.keys(), self.dbhelper.get_rss_movie_ids(list(movies.values()))))
+        if tvs:
+            rssids.update(zip(tvs.keys(), self.dbhelper.get_rss_tv_ids(list(tvs.values()))))
+        # 未订阅的查询是否已下载
+        no_rss_indexes = [index for index in range(len(medias)) if not rssids.get(index)]
+        exists = dict(zip(no_rss_indexes, MediaServer().check_items_exists(
+            [(movies[index][0], movies[index][1], movies[index][2]) if index in movies
+             else (tvs[index][0], tvs[index][1], tvs[index][3]) for index in no_rss_indexes])))
+        results = []
+        for index in range(len(medias)):
+            rssid = rssids.get(index)
+            if rssid:
+                # 已订阅
+                fav = "1"
+            elif exists.get(index):
+                # 已下载
+                fav = "2"
+            else:
+                # 未订阅、未下载
+                fav = "0"
+            results.append((fav, rssid))
+        return results
 
 if __name__ == "__main__":
     """
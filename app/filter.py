@@ -1,5 +1,6 @@
 import re
 
+import log
 from app.conf import ModuleConf
 from app.helper import DbHelper
 from app.media.meta import ReleaseGroupsMatcher
@@ -8,12 +9,175 @@ from app.utils.commons import singleton
 from app.utils.types import MediaType
 
 
+class RuleMatcher:
+    """
+    预编译的过滤规则，规则变化时重新生成
+    """
+
+    def __init__(self, rule):
+        self.id = rule.ID
+        self.order_seq = 100 - int(rule.PRIORITY or 0)
+        self.includes = self.__compile(rule.INCLUDE)
+        self.excludes = self.__compile(rule.EXCLUDE)
+        self.sizes = self.__parse_sizes(rule.SIZE_LIMIT)
+        self.free = self.__parse_free(rule.NOTE)
+        self.info = {
+            "id": rule.ID,
+            "group": rule.GROUP_ID,
+            "name": rule.ROLE_NAME,
+            "pri": rule.PRIORITY or 0,
+            "include": rule.INCLUDE.split("\n") if rule.INCLUDE else [],
+            "exclude": rule.EXCLUDE.split("\n") if rule.EXCLUDE else [],
+            "size": rule.SIZE_LIMIT,
+            "free": rule.NOTE,
+            "free_text": {
+                "1.0 1.0": "普通",
+                "1.0 0.0": "免费",
+                "2.0 0.0": "2X免费"
+            }.get(rule.NOTE, "全部") if rule.NOTE else ""
+        }
+
+    @staticmethod
+    def __compile(text):
+        """
+        编译包含/排除规则，忽略空行
+        """
+        patterns = []
+        for item in text.split("\n") if text else []:
+            if not item:
+                continue
+            try:
+                patterns.append(re.compile(r'%s' % item.strip(), re.IGNORECASE))
+            except re.error as err:
+                log.error(f"【Filter】过滤规则 {item} 不是合法的正则表达式：{str(err)}，按普通文本匹配")
+                patterns.append(re.compile(re.escape(item.strip()), re.IGNORECASE))
+        return tuple(patterns)
+
+    @staticmethod
+    def __parse_sizes(sizes):
+        """
+        解析大小范围，返回以字节为单位的上下限
+        """
+        if not sizes:
+            return None
+        if sizes.find(',') != -1:
+            sizes = sizes.split(',')
+            if sizes[0].isdigit():
+                begin_size = int(sizes[0].strip())
+            else:
+                begin_size = 0
+            if sizes[1].isdigit():
+                end_size = int(sizes[1].strip())
+            else:
+                end_size = 0
+        else:
+            begin_size = 0
+            if sizes.isdigit():
+                end_size = int(sizes.strip())
+            else:
+                end_size = 0
+        return begin_size * 1024 ** 3, end_size * 1024 ** 3
+
+    @staticmethod
+    def __parse_free(free):
+        """
+        解析促销规则，返回上传因子、下载因子
+        """
+        if not free:
+            return None
+        try:
+            ul_factor, dl_factor = free.split()
+            return float(ul_factor), float(dl_factor)
+        except ValueError:
+            log.error(f"【Filter】促销规则 {free} 格式不正确")
+            return None
+
+    def match(self, title, meta_info):
+        """
+        检查种子是否命中规则
+        :param title: 种子名称及副标题
+        :param meta_info: 识别的信息，大小会被转换为数字
+        """
+        # 必须包括的项
+        for include in self.includes:
+            if not include.search(title):
+                return False
+        # 不能包含的项，全部命中时不匹配
+        if self.excludes:
+            for exclude in self.excludes:
+                if not exclude.search(title):
+                    break
+            else:
+                return False
+        # 大小
+        if self.sizes and meta_info.size:
+            meta_info.size = StringUtils.num_filesize(meta_info.size)
+            begin_size, end_size = self.sizes
+            if meta_info.type == MediaType.MOVIE:
+                if not begin_size <= int(meta_info.size) <= end_size:
+                    return False
+            else:
+                if meta_info.total_episodes \
+                        and not begin_size <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size:
+                    return False
+        # 促销
+        if self.free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
+            ul_factor, dl_factor = self.free
+            if ul_factor > meta_info.upload_volume_factor \
+                    or dl_factor < meta_info.download_volume_factor:
+                return False
+        return True
+
+
+class RuleGroupMatcher:
+    """
+    预编译的过滤规则组，规则变化时重新生成
+    """
+
+    def __init__(self, group, rules):
+        self.id = group.ID
+        self.name = group.GROUP_NAME
+        self.default = group.IS_DEFAULT
+        self.note = group.NOTE
+        self.rules = tuple(RuleMatcher(rule) for rule in rules)
+        self.rule_ids = {rule.id: rule for rule in self.rules}
+        self.first_order = 100 - min([int(rule.info.get("pri")) for rule in self.rules] or [0])
+        self.free = any(rule.free for rule in self.rules)
+
+    @property
+    def info(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "default": self.default,
+            "note": self.note
+        }
+
+    def match(self, meta_info):
+        """
+        检查种子是否匹配规则组，按优先级依次匹配
+        :param meta_info: 识别的信息
+        :return: 是否匹配，匹配的优先值
+        """
+        if not self.rules:
+            return True, 0
+        if meta_info.subtitle:
+            title = "%s %s" % (meta_info.org_string, meta_info.subtitle)
+        else:
+            title = meta_info.org_string
+        for rule in self.rules:
+            if rule.match(title, meta_info):
+                return True, rule.order_seq
+        return False, 0
+
+
 @singleton
 class Filter:
     rg_matcher = None
     dbhelper = None
     _groups = []
-    _rules = []
+    _group_matchers = {}
+    _default_group = None
 
     def __init__(self):
         self.init_config()
@@ -21,28 +185,43 @@ class Filter:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.rg_matcher = ReleaseGroupsMatcher()
-        self._groups = self.dbhelper.get_config_filter_group()
-        self._rules = self.dbhelper.get_config_filter_rule()
+        groups = self.dbhelper.get_config_filter_group()
+        rules = self.dbhelper.get_config_filter_rule()
+        # 按规则组编译过滤规则，规则变化时重新调用
+        group_rules = {}
+        for rule in rules:
+            group_rules.setdefault(str(rule.GROUP_ID), []).append(rule)
+        group_matchers = {}
+        default_group = None
+        for group in groups:
+            matcher = RuleGroupMatcher(group, group_rules.get(str(group.ID)) or [])
+            group_matchers[str(group.ID)] = matcher
+            if not default_group and group.IS_DEFAULT == "Y":
+                default_group = matcher
+        self._groups = list(group_matchers.values())
+        self._group_matchers = group_matchers
+        self._default_group = default_group
+
+    def __get_group_matcher(self, groupid=None, default=False):
+        """
+        获取编译后的规则组
+        """
+        if groupid:
+            matcher = self._group_matchers.get(str(groupid))
+            if matcher:
+                return matcher
+        if default:
+            return self._default_group
+        return None
 
     def get_rule_groups(self, groupid=None, default=False):
         """
         获取所有规则组
         """
-        ret_groups = []
-        for group in self._groups:
-            group_info = {
-                "id": group.ID,
-                "name": group.GROUP_NAME,
-                "default": group.IS_DEFAULT,
-                "note": group.NOTE
-            }
-            if (groupid and str(groupid) == str(group.ID)) \
-                    or (default and group.IS_DEFAULT == "Y"):
-                return group_info
-            ret_groups.append(group_info)
         if groupid or default:
-            return {}
-        return ret_groups
+            matcher = self.__get_group_matcher(groupid=groupid, default=default)
+            return matcher.info if matcher else {}
+        return [matcher.info for matcher in self._groups]
 
     def get_rule_infos(self):
         """
@@ -59,38 +238,23 @@ class Filter:
         """
         if not groupid:
             return []
-        ret_rules = []
-        for rule in self._rules:
-            rule_info = {
-                "id": rule.ID,
-                "group": rule.GROUP_ID,
-                "name": rule.ROLE_NAME,
-                "pri": rule.PRIORITY or 0,
-                "include": rule.INCLUDE.split("\n") if rule.INCLUDE else [],
-                "exclude": rule.EXCLUDE.split("\n") if rule.EXCLUDE else [],
-                "size": rule.SIZE_LIMIT,
-                "free": rule.NOTE,
-                "free_text": {
-                    "1.0 1.0": "普通",
-                    "1.0 0.0": "免费",
-                    "2.0 0.0": "2X免费"
-                }.get(rule.NOTE, "全部") if rule.NOTE else ""
-            }
-            if str(rule.GROUP_ID) == str(groupid) \
-                    and (not ruleid or int(ruleid) == rule.ID):
-                ret_rules.append(rule_info)
+        matcher = self._group_matchers.get(str(groupid))
         if ruleid:
-            return ret_rules[0] if ret_rules else {}
-        return ret_rules
+            rule = matcher.rule_ids.get(int(ruleid)) if matcher else None
+            return dict(rule.info) if rule else {}
+        if not matcher:
+            return []
+        return [dict(rule.info) for rule in matcher.rules]
 
     def get_rule_first_order(self, rulegroup):
         """
         获取规则的最高优先级
         """
         if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
-        first_order = min([int(rule_info.get("pri")) for rule_info in self.get_rules(groupid=rulegroup)] or [0])
-        return 100 - first_order
+            matcher = self.__get_group_matcher(default=True)
+        else:
+            matcher = self.__get_group_matcher(groupid=rulegroup)
+        return matcher.first_order if matcher else 100
 
     def check_rules(self, meta_info, rulegroup=None):
         """
@@ -104,111 +268,28 @@ class Filter:
         # 为-1时不使用过滤规则
         if rulegroup and int(rulegroup) == -1:
             return True, 0, "不过滤"
-        if meta_info.subtitle:
-            title = "%s %s" % (meta_info.org_string, meta_info.subtitle)
-        else:
-            title = meta_info.org_string
         if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
-            if not rulegroup:
+            matcher = self.__get_group_matcher(default=True)
+            if not matcher:
                 return True, 0, "未配置过滤规则"
         else:
-            rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
-        # 命中优先级
-        order_seq = 0
-        # 当前规则组是否命中
-        group_match = True
-        for filter_info in filters:
-            # 当前规则是否命中
-            rule_match = True
-            # 命中规则的序号
-            order_seq = 100 - int(filter_info.get('pri'))
-            # 必须包括的项
-            includes = filter_info.get('include')
-            if includes and rule_match:
-                include_flag = True
-                for include in includes:
-                    if not include:
-                        continue
-                    if not re.search(r'%s' % include.strip(), title, re.IGNORECASE):
-                        include_flag = False
-                        break
-                if not include_flag:
-                    rule_match = False
-
-            # 不能包含的项
-            excludes = filter_info.get('exclude')
-            if excludes and rule_match:
-                exclude_flag = False
-                exclude_count = 0
-                for exclude in excludes:
-                    if not exclude:
-                        continue
-                    exclude_count += 1
-                    if not re.search(r'%s' % exclude.strip(), title, re.IGNORECASE):
-                        exclude_flag = True
-                if exclude_count > 0 and not exclude_flag:
-                    rule_match = False
-            # 大小
-            sizes = filter_info.get('size')
-            if sizes and rule_match and meta_info.size:
-                meta_info.size = StringUtils.num_filesize(meta_info.size)
-                if sizes.find(',') != -1:
-                    sizes = sizes.split(',')
-                    if sizes[0].isdigit():
-                        begin_size = int(sizes[0].strip())
-                    else:
-                        begin_size = 0
-                    if sizes[1].isdigit():
-                        end_size = int(sizes[1].strip())
-                    else:
-                        end_size = 0
-                else:
-                    begin_size = 0
-                    if sizes.isdigit():
-                        end_size = int(sizes.strip())
-                    else:
-                        end_size = 0
-                if meta_info.type == MediaType.MOVIE:
-                    if not begin_size * 1024 ** 3 <= int(meta_info.size) <= end_size * 1024 ** 3:
-                        rule_match = False
-                else:
-                    if meta_info.total_episodes \
-                            and not begin_size * 1024 ** 3 <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size * 1024 ** 3:
-                        rule_match = False
-
-            # 促销
-            free = filter_info.get("free")
-            if free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
-                ul_factor, dl_factor = free.split()
-                if float(ul_factor) > meta_info.upload_volume_factor \
-                        or float(dl_factor) < meta_info.download_volume_factor:
-                    rule_match = False
-
-            if rule_match:
-                return True, order_seq, rulegroup.get("name")
-            else:
-                group_match = False
-        if not group_match:
-            return False, 0, rulegroup.get("name")
-        return True, order_seq, rulegroup.get("name")
+            matcher = self.__get_group_matcher(groupid=rulegroup)
+            if not matcher:
+                return True, 0, None
+        match_flag, order_seq = matcher.match(meta_info)
+        return match_flag, order_seq, matcher.name
 
     def is_rule_free(self, rulegroup=None):
         """
         判断规则中是否需要Free检测
         """
         if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
-            if not rulegroup:
+            matcher = self.__get_group_matcher(default=True)
+            if not matcher:
                 return True, 0, ""
         else:
-            rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
-        for filter_info in filters:
-            if filter_info.get("free"):
-                return True
-        return False
+            matcher = self.__get_group_matcher(groupid=rulegroup)
+        return matcher.free if matcher else False
 
     @staticmethod
     def is_torrent_match_sey(media_info, s_num, e_num, year_str):
@@ -14,3 +14,6 @@ from .words_helper import WordsHelper
 from .submodule_helper import SubmoduleHelper
 from .cookiecloud_helper import CookieCloudHelper
 from .ffmpeg_helper import FfmpegHelper
+from .rss_helper import RssHelper
+from .transfer_helper import TransferHelper, TransferBatch
+from .library_helper import LibraryHelper
@@ -3,7 +3,7 @@ import os.path
 import time
 import json
 from enum import Enum
-from sqlalchemy import cast, func
+from sqlalchemy import cast, func, or_
 
 from app.db import MainDb, DbPersist
 from app.db.models import *
@@ -100,6 +100,86 @@ class DbHelper:
             ret = self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == torrent_name).count()
         return True if ret > 0 else False
 
+    def get_rssd_enclosures(self, enclosures):
+        """
+        批量查询RSS处理过的下载链接
+        :param enclosures: 下载链接列表
+        :return: 已处理过的下载链接集合
+        """
+        enclosures = list(set([enclosure for enclosure in enclosures or [] if enclosure]))
+        rssd = set()
+        # SQLite单条语句的参数数量有限制，分批查询
+        for i in range(0, len(enclosures), 500):
+            ret = self._db.query(RSSTORRENTS.ENCLOSURE).filter(
+                RSSTORRENTS.ENCLOSURE.in_(enclosures[i:i + 500])).all()
+            rssd.update([item.ENCLOSURE for item in ret])
+        return rssd
+
+    def get_userrss_finished(self, torrent_names, enclosures):
+        """
+        批量查询RSS是否处理过，有下载链接的根据下载链接，否则根据名称
+        :param torrent_names: 名称列表
+        :param enclosures: 下载链接列表
+        :return: 已处理过的名称集合，已处理过的下载链接集合
+        """
+        torrent_names = list(set([name for name in torrent_names or [] if name]))
+        finished_names = set()
+        for i in range(0, len(torrent_names), 500):
+            ret = self._db.query(RSSTORRENTS.TORRENT_NAME).filter(
+                RSSTORRENTS.TORRENT_NAME.in_(torrent_names[i:i + 500])).all()
+            finished_names.update([item.TORRENT_NAME for item in ret])
+        return finished_names, self.get_rssd_enclosures(enclosures)
+
+    def get_rss_seen(self, feed, fingerprint):
+        """
+        查询RSS源已处理过的条目
+        :param feed: RSS源标识
+        :param fingerprint: 处理条件指纹，条件变化后已处理记录失效
+        :return: 条目标识集合
+        """
+        if not feed:
+            return set()
+        ret = self._db.query(RSSSEEN.GUID).filter(RSSSEEN.FEED == feed,
+                                                  RSSSEEN.FINGERPRINT == fingerprint).all()
+        return set([item.GUID for item in ret])
+
+    @DbPersist(_db)
+    def insert_rss_seen(self, feed, fingerprint, guids):
+        """
+        记录RSS源已处理过的条目
+        """
+        if not feed or not guids:
+            return
+        timestr = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        self._db.insert([RSSSEEN(
+            FEED=feed,
+            GUID=guid,
+            FINGERPRINT=fingerprint,
+            DATE=timestr
+        ) for guid in guids])
+
+    @DbPersist(_db)
+    def delete_rss_seen(self, feed=None, fingerprint=None, guids=None):
+        """
+        删除RSS源已处理过的条目
+        :param feed: RSS源标识，为空时不限
+        :param fingerprint: 为空时删除所有指纹的记录，否则删除指纹不一致的记录
+        :param guids: 需要删除的条目标识，为空时不限
+        """
+        if not feed and not guids:
+            return
+        query = self._db.query(RSSSEEN)
+        if feed:
+            query = query.filter(RSSSEEN.FEED == feed)
+        if fingerprint is not None:
+            query = query.filter(RSSSEEN.FINGERPRINT != fingerprint)
+        if guids:
+            guids = list(guids)
+            for i in range(0, len(guids), 500):
+                query.filter(RSSSEEN.GUID.in_(guids[i:i + 500])).delete(synchronize_session=False)
+        else:
+            query.delete(synchronize_session=False)
+
     @DbPersist(_db)
     def delete_all_search_torrents(self, ):
         """
@@ -634,6 +714,39 @@ class DbHelper:
         else:
             return ""
 
+    def get_rss_movie_ids(self, medias):
+        """
+        批量获取订阅电影ID，一次查询，匹配规则与get_rss_movie_id一致
+        :param medias: [(标题, 年份, TMDBID)]
+        :return: 与medias一一对应的订阅ID，未订阅为空
+        """
+        titles = list(set([title for title, _, _ in medias if title]))
+        if not titles:
+            return ["" for _ in medias]
+        tmdbids = list(set([str(tmdbid) for title, _, tmdbid in medias if title and tmdbid]))
+        items = self._db.query(RSSMOVIES.ID,
+                               RSSMOVIES.NAME,
+                               RSSMOVIES.YEAR,
+                               RSSMOVIES.TMDBID).filter(or_(RSSMOVIES.NAME.in_(titles),
+                                                            RSSMOVIES.TMDBID.in_(tmdbids))).all()
+        rssids = []
+        for title, year, tmdbid in medias:
+            rssid = ""
+            if title:
+                tmdbid = str(tmdbid) if tmdbid else None
+                matched = [item for item in items if tmdbid and item.TMDBID == tmdbid]
+                if matched:
+                    rssid = matched[0].ID
+                else:
+                    matched = [item for item in items
+                               if item.NAME == title and (not year or item.YEAR == str(year))]
+                    if tmdbid:
+                        matched = [item for item in matched if not item.TMDBID or item.TMDBID == tmdbid]
+                    if matched:
+                        rssid = matched[0].ID
+            rssids.append(rssid)
+        return rssids
+
     def get_rss_movie_sites(self, rssid):
         """
         获取订阅电影站点
@@ -843,6 +956,43 @@ class DbHelper:
         else:
             return ""
 
+    def get_rss_tv_ids(self, medias):
+        """
+        批量获取订阅电视剧ID，一次查询，匹配规则与get_rss_tv_id一致
+        :param medias: [(标题, 年份, 季, TMDBID)]
+        :return: 与medias一一对应的订阅ID，未订阅为空
+        """
+        titles = list(set([title for title, _, _, _ in medias if title]))
+        if not titles:
+            return ["" for _ in medias]
+        tmdbids = list(set([str(tmdbid) for title, _, _, tmdbid in medias if title and tmdbid]))
+        items = self._db.query(RSSTVS.ID,
+                               RSSTVS.NAME,
+                               RSSTVS.YEAR,
+                               RSSTVS.SEASON,
+                               RSSTVS.TMDBID).filter(or_(RSSTVS.NAME.in_(titles),
+                                                         RSSTVS.TMDBID.in_(tmdbids))).all()
+        rssids = []
+        for title, year, season, tmdbid in medias:
+            rssid = ""
+            if title:
+                tmdbid = str(tmdbid) if tmdbid else None
+                matched = [item for item in items
+                           if tmdbid and item.TMDBID == tmdbid and (not season or item.SEASON == str(season))]
+                if matched:
+                    rssid = matched[0].ID
+                else:
+                    matched = [item for item in items
+                               if item.NAME == title
+                               and (not season or item.SEASON == str(season))
+                               and (not year or item.YEAR == str(year))]
+                    if tmdbid:
+                        matched = [item for item in matched if not item.TMDBID or item.TMDBID == tmdbid]
+                    if matched:
+                        rssid = matched[0].ID
+            rssids.append(rssid)
+        return rssids
+
     def get_rss_tv_sites(self, rssid):
         """
         获取订阅电视剧站点
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+from app.utils.commons import singleton
+from config import LIBRARY_INDEX_TTL
+
+lock = threading.Lock()
+
+
+@singleton
+class LibraryHelper:
+    """
+    媒体库目录索引：按目录缓存一级文件清单，存在性判断只查字典，
+    网络挂载的媒体库不用逐个路径访问；转移时同步更新，超时或手动刷新后重新读取
+    """
+    # 目录 -> (读取时间, {名称: 是否目录})，目录不存在时清单为None
+    _dirs = {}
+
+    def __init__(self):
+        self._dirs = {}
+
+    def init_config(self):
+        self.refresh()
+
+    def __get_listing(self, path):
+        """
+        获取目录的一级清单，上级目录已索引且不包含该目录时不再访问文件系统
+        """
+        now = time.time()
+        with lock:
+            cache = self._dirs.get(path)
+            if cache and now - cache[0] < LIBRARY_INDEX_TTL:
+                return cache[1]
+            parent, name = os.path.split(path)
+            parent_cache = self._dirs.get(parent) if parent != path else None
+        if parent_cache and now - parent_cache[0] < LIBRARY_INDEX_TTL \
+                and (parent_cache[1] is None or not parent_cache[1].get(name)):
+            listing = None
+        else:
+            try:
+                with os.scandir(path) as it:
+                    listing = {}
+                    for entry in it:
+                        try:
+                            listing[entry.name] = entry.is_dir()
+                        except OSError:
+                            listing[entry.name] = False
+            except OSError:
+                listing = None
+        with lock:
+            self._dirs[path] = (now, listing)
+        return listing
+
+    def exists(self, path):
+        """
+        判断文件或目录是否存在
+        """
+        if not path:
+            return False
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            return os.path.exists(path)
+        listing = self.__get_listing(parent)
+        return listing is not None and name in listing
+
+    def find_file(self, path, exts):
+        """
+        按后缀顺序查找存在的文件
+        :param path: 不带后缀的文件路径
+        :param exts: 后缀列表
+        :return: 第一个存在的文件路径，不存在时返回None
+        """
+        if not path:
+            return None
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        listing = self.__get_listing(parent)
+        if not listing:
+            return None
+        for ext in exts:
+            if "%s%s" % (name, ext) in listing:
+                return "%s%s" % (path, ext)
+        return None
+
+    def get_files(self, path, exts=None):
+        """
+        递归查询目录下的文件，跳过回收站及隐藏目录
+        :param path: 目录
+        :param exts: 后缀列表，为空时返回全部文件
+        """
+        if not path:
+            return []
+        ret_list = []
+        dirs = [os.path.normpath(path)]
+        while dirs:
+            cur_path = dirs.pop()
+            listing = self.__get_listing(cur_path)
+            if not listing:
+                continue
+            for name, is_dir in sorted(listing.items()):
+                if name.startswith(".") or name.startswith("@eaDir"):
+                    continue
+                if is_dir:
+                    if name in ["@Recycle", "#recycle"]:
+                        continue
+                    dirs.append(os.path.join(cur_path, name))
+                elif not exts or os.path.splitext(name)[-1].lower() in exts:
+                    ret_list.append(os.path.join(cur_path, name))
+        return ret_list
+
+    def add(self, path, is_dir=False):
+        """
+        登记新建的文件或目录，只更新已索引的上级目录
+        """
+        if not path:
+            return
+        path = os.path.normpath(path)
+        with lock:
+            if is_dir:
+                cache = self._dirs.get(path)
+                if cache and cache[1] is None:
+                    self._dirs[path] = (cache[0], {})
+            while True:
+                parent, name = os.path.split(path)
+                if not name or parent == path:
+                    break
+                cache = self._dirs.get(parent)
+                if not cache:
+                    break
+                listing = cache[1]
+                if listing is None:
+                    listing = {}
+                    self._dirs[parent] = (cache[0], listing)
+                elif name in listing:
+                    listing[name] = listing[name] or is_dir
+                    break
+                listing[name] = is_dir
+                path, is_dir = parent, True
+
+    def remove(self, path):
+        """
+        登记删除的文件或目录
+        """
+        if not path:
+            return
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        with lock:
+            cache = self._dirs.get(parent)
+            if cache and cache[1]:
+                cache[1].pop(name, None)
+            # 删除的是目录时清除其下的索引
+            for dir_path in [dir_path for dir_path in self._dirs
+                             if dir_path == path or dir_path.startswith(path + os.sep)]:
+                self._dirs.pop(dir_path, None)
+
+    def refresh(self, path=None):
+        """
+        清除索引，下次查询时重新读取
+        :param path: 目录，为空时清除全部
+        """
+        with lock:
+            if not path:
+                self._dirs.clear()
+                return
+            path = os.path.normpath(path)
+            for dir_path in [dir_path for dir_path in self._dirs
+                             if dir_path == path or dir_path.startswith(path + os.sep)]:
+                self._dirs.pop(dir_path, None)
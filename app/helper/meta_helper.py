@@ -1,18 +1,251 @@
 import os
 import pickle
-import random
+import sqlite3
 import time
+from abc import ABCMeta, abstractmethod
 from enum import Enum
 from threading import RLock
 
+import log
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
+from app.utils.types import MediaType
 from config import Config
 
 lock = RLock()
 
 CACHE_EXPIRE_TIMESTAMP_STR = "cache_expire_timestamp"
 EXPIRE_TIMESTAMP = 7 * 24 * 3600
+# TMDB详情缓存默认有效期（小时）
+DEFAULT_DETAIL_TTL = 24
+
+
+class _IMetaStore(metaclass=ABCMeta):
+    """
+    TMDB识别缓存存储后端，所有写操作都按单条KEY增量持久化
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """
+        按KEY查询缓存，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def insert(self, key, item):
+        """
+        新增缓存，KEY已存在时不覆盖
+        """
+        pass
+
+    @abstractmethod
+    def insert_many(self, items):
+        """
+        批量新增缓存，items为(key, item)的列表
+        """
+        pass
+
+    @abstractmethod
+    def touch(self, key, expire):
+        """
+        刷新缓存过期时间
+        """
+        pass
+
+    @abstractmethod
+    def update_title(self, key, title, expire=None):
+        """
+        更新缓存标题
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        删除缓存
+        """
+        pass
+
+    @abstractmethod
+    def delete_by_tmdbid(self, tmdbid):
+        """
+        删除对应TMDBID的所有缓存
+        """
+        pass
+
+    @abstractmethod
+    def delete_expired(self, timestamp):
+        """
+        删除在指定时间之前过期的缓存
+        """
+        pass
+
+    @abstractmethod
+    def search(self, search, offset, limit):
+        """
+        按KEY模糊查询已识别的缓存
+        :return: 总数, [(key, item)]
+        """
+        pass
+
+    @abstractmethod
+    def get_detail(self, key):
+        """
+        查询TMDB详情缓存
+        :return: (JSON文本, 更新时间)，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def set_detail(self, key, tmdbid, data, update_time):
+        """
+        新增或覆盖TMDB详情缓存
+        """
+        pass
+
+    @abstractmethod
+    def delete_detail_before(self, timestamp):
+        """
+        删除在指定时间之前更新的详情缓存
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """
+        清空缓存
+        """
+        pass
+
+    @abstractmethod
+    def checkpoint(self):
+        """
+        将日志合并到主文件
+        """
+        pass
+
+
+class _SqliteMetaStore(_IMetaStore):
+    """
+    基于SQLite WAL的缓存存储，tmdbid建有索引
+    """
+    _db = None
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS META ("
+                         "KEY TEXT PRIMARY KEY, "
+                         "TMDBID TEXT, "
+                         "TYPE TEXT, "
+                         "TITLE TEXT, "
+                         "YEAR TEXT, "
+                         "POSTER_PATH TEXT, "
+                         "BACKDROP_PATH TEXT, "
+                         "EXPIRE INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS INDX_META_TMDBID ON META (TMDBID)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS INDX_META_EXPIRE ON META (EXPIRE)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS DETAIL ("
+                         "KEY TEXT PRIMARY KEY, "
+                         "TMDBID TEXT, "
+                         "DATA TEXT, "
+                         "UPDATE_TIME INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS INDX_DETAIL_TMDBID ON DETAIL (TMDBID)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS INDX_DETAIL_UPDATE_TIME ON DETAIL (UPDATE_TIME)")
+
+    @staticmethod
+    def __to_row(key, item):
+        mtype = item.get("type")
+        return (key,
+                str(item.get("id") or 0),
+                mtype.value if isinstance(mtype, Enum) else mtype,
+                item.get("title"),
+                item.get("year"),
+                item.get("poster_path"),
+                item.get("backdrop_path"),
+                item.get(CACHE_EXPIRE_TIMESTAMP_STR))
+
+    @staticmethod
+    def __to_item(row):
+        if not row:
+            return None
+        tmdbid, mtype, title, year, poster_path, backdrop_path, expire = row
+        if tmdbid == "0":
+            return {"id": 0, CACHE_EXPIRE_TIMESTAMP_STR: expire}
+        try:
+            mtype = MediaType(mtype)
+        except ValueError:
+            pass
+        return {
+            "id": int(tmdbid) if tmdbid.isdigit() else tmdbid,
+            "type": mtype,
+            "year": year,
+            "title": title,
+            "poster_path": poster_path,
+            "backdrop_path": backdrop_path,
+            CACHE_EXPIRE_TIMESTAMP_STR: expire
+        }
+
+    def get(self, key):
+        row = self._db.execute("SELECT TMDBID, TYPE, TITLE, YEAR, POSTER_PATH, BACKDROP_PATH, EXPIRE "
+                               "FROM META WHERE KEY = ?", (key,)).fetchone()
+        return self.__to_item(row)
+
+    def insert(self, key, item):
+        self._db.execute("INSERT OR IGNORE INTO META VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         self.__to_row(key, item))
+
+    def insert_many(self, items):
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO META VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [self.__to_row(key, item) for key, item in items])
+
+    def touch(self, key, expire):
+        self._db.execute("UPDATE META SET EXPIRE = ? WHERE KEY = ?", (expire, key))
+
+    def update_title(self, key, title, expire=None):
+        if expire:
+            self._db.execute("UPDATE META SET TITLE = ?, EXPIRE = ? WHERE KEY = ?", (title, expire, key))
+        else:
+            self._db.execute("UPDATE META SET TITLE = ? WHERE KEY = ?", (title, key))
+
+    def delete(self, key):
+        self._db.execute("DELETE FROM META WHERE KEY = ?", (key,))
+
+    def delete_by_tmdbid(self, tmdbid):
+        self._db.execute("DELETE FROM META WHERE TMDBID = ?", (str(tmdbid),))
+        self._db.execute("DELETE FROM DETAIL WHERE TMDBID = ?", (str(tmdbid),))
+
+    def delete_expired(self, timestamp):
+        self._db.execute("DELETE FROM META WHERE EXPIRE < ?", (timestamp,))
+
+    def search(self, search, offset, limit):
+        condition = "TMDBID != '0' AND KEY LIKE ? ESCAPE '\\'"
+        pattern = "%%%s%%" % str(search or "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        total = self._db.execute(f"SELECT COUNT(1) FROM META WHERE {condition}", (pattern,)).fetchone()[0]
+        rows = self._db.execute(f"SELECT KEY, TMDBID, TYPE, TITLE, YEAR, POSTER_PATH, BACKDROP_PATH, EXPIRE "
+                                f"FROM META WHERE {condition} LIMIT ? OFFSET ?",
+                                (pattern, limit, offset)).fetchall()
+        return total, [(row[0], self.__to_item(row[1:])) for row in rows]
+
+    def get_detail(self, key):
+        return self._db.execute("SELECT DATA, UPDATE_TIME FROM DETAIL WHERE KEY = ?", (key,)).fetchone()
+
+    def set_detail(self, key, tmdbid, data, update_time):
+        self._db.execute("INSERT OR REPLACE INTO DETAIL VALUES (?, ?, ?, ?)",
+                         (key, str(tmdbid), data, update_time))
+
+    def delete_detail_before(self, timestamp):
+        self._db.execute("DELETE FROM DETAIL WHERE UPDATE_TIME < ?", (timestamp,))
+
+    def clear(self):
+        self._db.execute("DELETE FROM META")
+        self._db.execute("DELETE FROM DETAIL")
+
+    def checkpoint(self):
+        self._db.execute("PRAGMA wal_checkpoint(PASSIVE)")
 
 
 @singleton
@@ -25,10 +258,11 @@ class MetaHelper(object):
         "type": MediaType
     }
     """
-    _meta_data = {}
+    _meta_store = None
 
     _meta_path = None
     _tmdb_cache_expire = False
+    _tmdb_detail_ttl = DEFAULT_DETAIL_TTL * 3600
 
     def __init__(self):
         self.init_config()
@@ -37,15 +271,21 @@ class MetaHelper(object):
         laboratory = Config().get_config('laboratory')
         if laboratory:
             self._tmdb_cache_expire = laboratory.get("tmdb_cache_expire")
-        self._meta_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
-        self._meta_data = self.__load_meta_data(self._meta_path)
+            self._tmdb_detail_ttl = int(laboratory.get("tmdb_detail_cache_ttl") or DEFAULT_DETAIL_TTL) * 3600
+        self._meta_path = os.path.join(Config().get_config_path(), 'tmdb.db')
+        with lock:
+            if not self._meta_store:
+                self._meta_store = _SqliteMetaStore(self._meta_path)
+                self.__migrate_meta_data(os.path.join(Config().get_config_path(), 'tmdb.dat'))
+                # 未识别的缓存不跨重启保留
+                self._meta_store.delete_by_tmdbid(0)
 
     def clear_meta_data(self):
         """
         清空所有TMDB缓存
         """
         with lock:
-            self._meta_data = {}
+            self._meta_store.clear()
 
     def get_meta_data_path(self):
         """
@@ -58,12 +298,15 @@ class MetaHelper(object):
         根据KEY值获取缓存值
         """
         with lock:
-            info: dict = self._meta_data.get(key)
+            info = self._meta_store.get(key)
             if info:
+                now = int(time.time())
                 expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire or int(time.time()) < expire:
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self.update_meta_data({key: info})
+                if not expire or now < expire:
+                    # 剩余有效期不足一半时才刷新，避免每次读取都写库
+                    if not expire or expire - now < EXPIRE_TIMESTAMP / 2:
+                        info[CACHE_EXPIRE_TIMESTAMP_STR] = now + EXPIRE_TIMESTAMP
+                        self._meta_store.touch(key, info[CACHE_EXPIRE_TIMESTAMP_STR])
                 elif expire and self._tmdb_cache_expire:
                     self.delete_meta_data(key)
             return info or {}
@@ -76,22 +319,23 @@ class MetaHelper(object):
         @param num: 单页大小
         @return: 总数, 缓存列表
         """
+        num = int(num)
         if page == 1:
             begin_pos = 0
         else:
             begin_pos = (page - 1) * num
 
         with lock:
-            search_metas = [(k, {
-                "id": v.get("id"),
-                "title": v.get("title"),
-                "year": v.get("year"),
-                "media_type": v.get("type").value if isinstance(v.get("type"), Enum) else v.get("type"),
-                "poster_path": v.get("poster_path"),
-                "backdrop_path": v.get("backdrop_path")
-            },  str(k).replace("[电影]", "").replace("[电视剧]", "").replace("[未知]", "").replace("-None", ""))
-                for k, v in self._meta_data.items() if search.lower() in k.lower() and v.get("id") != 0]
-            return len(search_metas), search_metas[begin_pos: begin_pos + num]
+            total, metas = self._meta_store.search(search, begin_pos, num)
+        return total, [(k, {
+            "id": v.get("id"),
+            "title": v.get("title"),
+            "year": v.get("year"),
+            "media_type": v.get("type").value if isinstance(v.get("type"), Enum) else v.get("type"),
+            "poster_path": v.get("poster_path"),
+            "backdrop_path": v.get("backdrop_path")
+        }, str(k).replace("[电影]", "").replace("[电视剧]", "").replace("[未知]", "").replace("-None", ""))
+            for k, v in metas]
 
     def delete_meta_data(self, key):
         """
@@ -100,25 +344,26 @@ class MetaHelper(object):
         @return: 被删除的缓存内容
         """
         with lock:
-            return self._meta_data.pop(key, None)
+            info = self._meta_store.get(key)
+            if info:
+                self._meta_store.delete(key)
+            return info
 
     def delete_meta_data_by_tmdbid(self, tmdbid):
         """
         清空对应TMDBID的所有缓存记录，以强制更新TMDB中最新的数据
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == str(tmdbid):
-                with lock:
-                    self._meta_data.pop(key)
+        if not tmdbid:
+            return
+        with lock:
+            self._meta_store.delete_by_tmdbid(tmdbid)
 
     def delete_unknown_meta(self):
         """
         清除未识别的缓存记录，以便重新检索TMDB
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == '0':
-                with lock:
-                    self._meta_data.pop(key)
+        with lock:
+            self._meta_store.delete_by_tmdbid(0)
 
     def modify_meta_data(self, key, title):
         """
@@ -128,25 +373,26 @@ class MetaHelper(object):
         @return: 被修改后缓存内容
         """
         with lock:
-            if self._meta_data.get(key):
-                self._meta_data[key]['title'] = title
-                self._meta_data[key][CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-            return self._meta_data.get(key)
+            if not self._meta_store.get(key):
+                return None
+            self._meta_store.update_title(key, title, int(time.time()) + EXPIRE_TIMESTAMP)
+            return self._meta_store.get(key)
 
-    @staticmethod
-    def __load_meta_data(path):
+    def __migrate_meta_data(self, path):
         """
-        从文件中加载缓存
+        将旧版本pickle格式的缓存文件一次性导入，导入后备份原文件
         """
+        if not os.path.exists(path):
+            return
         try:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                return data
-            return {}
+            with open(path, 'rb') as f:
+                data = pickle.load(f) or {}
+            items = [(k, v) for k, v in data.items() if v and str(v.get("id")) != '0']
+            self._meta_store.insert_many(items)
+            os.replace(path, "%s.bak" % path)
+            log.info(f"【Meta】已导入 {len(items)} 条TMDB缓存")
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
-            return {}
 
     def update_meta_data(self, meta_data):
         """
@@ -156,65 +402,27 @@ class MetaHelper(object):
             return
         with lock:
             for key, item in meta_data.items():
-                if not self._meta_data.get(key):
-                    item[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self._meta_data[key] = item
+                item[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
+                self._meta_store.insert(key, item)
 
     def save_meta_data(self, force=False):
         """
-        保存缓存数据到文件
-        """
-        meta_data = self.__load_meta_data(self._meta_path)
-        new_meta_data = {k: v for k, v in self._meta_data.items() if str(v.get("id")) != '0'}
-
-        if not force \
-                and not self._random_sample(new_meta_data) \
-                and meta_data.keys() == new_meta_data.keys():
-            return
-
-        with open(self._meta_path, 'wb') as f:
-            pickle.dump(new_meta_data, f, pickle.HIGHEST_PROTOCOL)
-
-    def _random_sample(self, new_meta_data):
-        """
-        采样分析是否需要保存
+        缓存已增量写入，此处仅清理过期条目并合并WAL日志
         """
-        ret = False
-        if len(new_meta_data) < 25:
-            keys = list(new_meta_data.keys())
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-        else:
-            count = 0
-            keys = random.sample(new_meta_data.keys(), 25)
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-                        count += 1
-            if count >= 5:
-                ret |= self._random_sample(new_meta_data)
-        return ret
+        with lock:
+            if self._tmdb_cache_expire:
+                self._meta_store.delete_expired(int(time.time()))
+            # 超过有效期太久未被刷新的详情不再保留
+            self._meta_store.delete_detail_before(int(time.time()) - self._tmdb_detail_ttl - EXPIRE_TIMESTAMP)
+            if force:
+                self._meta_store.checkpoint()
 
     def get_cache_title(self, key):
         """
         获取缓存的标题
         """
-        cache_media_info = self._meta_data.get(key)
+        with lock:
+            cache_media_info = self._meta_store.get(key)
         if not cache_media_info or not cache_media_info.get("id"):
             return None
         return cache_media_info.get("title")
@@ -223,7 +431,27 @@ class MetaHelper(object):
         """
         重新设置缓存标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info:
+        with lock:
+            self._meta_store.update_title(key, cn_title)
+
+    def get_tmdb_detail(self, key):
+        """
+        获取TMDB详情缓存
+        @param key: 详情缓存key
+        @return: JSON文本, 是否已过期需要刷新；没有缓存时返回 None, True
+        """
+        with lock:
+            row = self._meta_store.get_detail(key)
+        if not row:
+            return None, True
+        data, update_time = row
+        return data, int(time.time()) - (update_time or 0) > self._tmdb_detail_ttl
+
+    def update_tmdb_detail(self, key, tmdbid, data):
+        """
+        保存TMDB详情缓存
+        """
+        if not key or not data:
             return
-        self._meta_data[key]['title'] = cn_title
+        with lock:
+            self._meta_store.set_detail(key, tmdbid, data, int(time.time()))
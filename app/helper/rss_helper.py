@@ -0,0 +1,137 @@
+import hashlib
+import json
+import threading
+import time
+
+from app.helper.db_helper import DbHelper
+from app.utils.commons import singleton
+
+lock = threading.Lock()
+
+
+@singleton
+class RssHelper:
+    """
+    记录各RSS源已处理过的条目，内存中按RSS源缓存，已下载等最终结果持久化到数据库，
+    未匹配等可能变化的结果只在内存中保留一段时间，在识别前批量剔除已处理过的条目
+    """
+    dbhelper = None
+    # RSS源 -> (指纹, 已处理条目标识集合, 暂不处理的条目标识及过期时间)
+    _seen = {}
+
+    def __init__(self):
+        self.dbhelper = DbHelper()
+
+    @staticmethod
+    def get_fingerprint(*args):
+        """
+        计算处理条件的指纹，条件变化后已处理记录失效
+        """
+        return hashlib.md5(json.dumps(args,
+                                      sort_keys=True,
+                                      default=str,
+                                      ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_article_guid(article):
+        """
+        RSS条目的唯一标识，优先使用下载链接
+        """
+        return article.get("enclosure") or article.get("link") or article.get("title")
+
+    def __get_seen(self, feed, fingerprint):
+        """
+        获取RSS源已处理条目集合，内存中没有或指纹变化时从数据库加载
+        """
+        with lock:
+            cache = self._seen.get(feed)
+            if cache and cache[0] == fingerprint:
+                return cache[1], cache[2]
+        # 清除指纹不一致的历史记录
+        self.dbhelper.delete_rss_seen(feed, fingerprint=fingerprint)
+        seen = self.dbhelper.get_rss_seen(feed, fingerprint)
+        expiring = {}
+        with lock:
+            self._seen[feed] = (fingerprint, seen, expiring)
+        return seen, expiring
+
+    def filter_new_articles(self, feed, articles, fingerprint=""):
+        """
+        过滤掉已处理过的RSS条目
+        :param feed: RSS源标识
+        :param articles: RSS条目列表
+        :param fingerprint: 处理条件指纹
+        :return: 未处理过的RSS条目列表
+        """
+        if not feed or not articles:
+            return articles or []
+        seen, expiring = self.__get_seen(feed, fingerprint)
+        # 已从RSS源中滚出的条目不会再出现，移除记录以限制规模
+        guids = set([self.get_article_guid(article) for article in articles])
+        now = time.time()
+        with lock:
+            expired = seen - guids
+            seen -= expired
+            for guid in [guid for guid, expire_time in expiring.items() if expire_time <= now or guid not in guids]:
+                expiring.pop(guid, None)
+            new_articles = [article for article in articles
+                            if self.get_article_guid(article) not in seen
+                            and self.get_article_guid(article) not in expiring]
+        if expired:
+            self.dbhelper.delete_rss_seen(feed, guids=expired)
+        return new_articles
+
+    def mark_articles_seen(self, feed, articles, fingerprint="", ttl=None):
+        """
+        记录已处理过的RSS条目
+        :param feed: RSS源标识
+        :param articles: RSS条目列表
+        :param fingerprint: 处理条件指纹
+        :param ttl: 不为空时只在内存中记录，该时间（秒）内不再处理，用于结果可能变化的条目
+        """
+        if not feed or not articles:
+            return
+        seen, expiring = self.__get_seen(feed, fingerprint)
+        guids = set([self.get_article_guid(article) for article in articles])
+        guids.discard(None)
+        if ttl:
+            expire_time = time.time() + ttl
+            with lock:
+                for guid in guids - seen:
+                    expiring[guid] = expire_time
+            return
+        with lock:
+            guids -= seen
+            seen.update(guids)
+            for guid in guids:
+                expiring.pop(guid, None)
+        if guids:
+            self.dbhelper.insert_rss_seen(feed, fingerprint, guids)
+
+    def unmark_articles_seen(self, articles):
+        """
+        取消RSS条目的已处理记录，不区分RSS源
+        :param articles: RSS条目列表
+        """
+        guids = set([self.get_article_guid(article) for article in articles or []])
+        guids.discard(None)
+        if not guids:
+            return
+        with lock:
+            for _, seen, expiring in self._seen.values():
+                seen -= guids
+                for guid in guids:
+                    expiring.pop(guid, None)
+        self.dbhelper.delete_rss_seen(guids=guids)
+
+    def clear(self, feed=None):
+        """
+        清除已处理记录，RSS源为空时清除内存中的全部记录
+        """
+        with lock:
+            if feed:
+                self._seen.pop(feed, None)
+            else:
+                self._seen.clear()
+        if feed:
+            self.dbhelper.delete_rss_seen(feed)
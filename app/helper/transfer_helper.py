@@ -0,0 +1,373 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import log
+from app.helper.library_helper import LibraryHelper
+from app.helper.progress_helper import ProgressHelper
+from app.utils import SystemUtils, StringUtils
+from app.utils.commons import singleton, SingleFlight
+from app.utils.types import RmtMode
+from config import TRANSFER_LANE_THREADS
+
+lock = threading.Lock()
+
+
+@singleton
+class TransferHelper:
+    """
+    文件转移执行器：硬链接、软链接及同一文件系统内的移动直接执行，
+    其余耗时的复制、跨文件系统移动、Rclone、Minio按目的地分通道排队，
+    不同目的地之间并行，同一目标文件同时只有一个任务
+    """
+    # 通道 -> 线程池
+    _lanes = {}
+    # 任务ID -> 任务信息
+    _jobs = {}
+    # 目标文件 -> [锁, 引用数]
+    _target_locks = {}
+    _job_id = 0
+    _flight = None
+
+    def __init__(self):
+        self._flight = SingleFlight()
+
+    def init_config(self):
+        pass
+
+    def transfer(self, src, dest, rmt_mode):
+        """
+        转移单个文件，阻塞直到完成
+        :param src: 源文件路径
+        :param dest: 目标文件路径
+        :param rmt_mode: RmtMode转移方式
+        :return: 错误码，错误信息
+        """
+        # 相同的转移请求只执行一次
+        ret, _ = self._flight.do((src, dest, rmt_mode), self.__transfer, src, dest, rmt_mode)
+        return ret
+
+    @staticmethod
+    def is_batch_mode(rmt_mode):
+        """
+        是否为可批量执行的远程转移方式
+        """
+        return rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY, RmtMode.MINIO, RmtMode.MINIOCOPY]
+
+    def transfer_batch(self, files, dest_root, rmt_mode):
+        """
+        批量转移同一目的根目录下的文件，Rclone、Minio合并为一次命令执行，阻塞直到完成
+        :param files: [(源文件路径, 目标文件路径)]
+        :param dest_root: 目的根目录
+        :param rmt_mode: RmtMode转移方式
+        :return: [(错误码, 错误信息)]，与files一一对应
+        """
+        if not files:
+            return []
+        if not self.is_batch_mode(rmt_mode):
+            return [self.transfer(src, dest, rmt_mode) for src, dest in files]
+        lane = self.__get_lane(files[0][0], files[0][1], rmt_mode)
+        job_id = self.__add_job(dest_root, dest_root, rmt_mode, lane,
+                                size=sum([self.__get_size(src) for src, _ in files]))
+        try:
+            results = self.__get_executor(lane).submit(self.__execute_batch,
+                                                       files, dest_root, rmt_mode, job_id).result()
+        finally:
+            with lock:
+                self._jobs.pop(job_id, None)
+        for (src, dest), (retcode, _) in zip(files, results):
+            if retcode == 0:
+                self.__update_library(src, dest, rmt_mode)
+        return results
+
+    def get_jobs(self):
+        """
+        查询排队及执行中的转移任务
+        :return: 任务列表，进度为0-100，无法获取时为None
+        """
+        with lock:
+            jobs = [dict(job) for job in self._jobs.values()]
+        for job in jobs:
+            job["progress"] = self.__get_progress(job)
+        return jobs
+
+    def __transfer(self, src, dest, rmt_mode):
+        lane = self.__get_lane(src, dest, rmt_mode)
+        if not lane:
+            # 廉价操作直接执行
+            ret = self.__execute(src, dest, rmt_mode)
+        else:
+            job_id = self.__add_job(src, dest, rmt_mode, lane)
+            try:
+                ret = self.__get_executor(lane).submit(self.__execute, src, dest, rmt_mode, job_id).result()
+            finally:
+                with lock:
+                    self._jobs.pop(job_id, None)
+        if ret[0] == 0:
+            self.__update_library(src, dest, rmt_mode)
+        return ret
+
+    @staticmethod
+    def __update_library(src, dest, rmt_mode):
+        """
+        转移成功后更新媒体库目录索引
+        """
+        LibraryHelper().add(dest)
+        if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+            LibraryHelper().remove(src)
+
+    @staticmethod
+    def __get_device(path):
+        """
+        获取路径所在的设备，路径不存在时向上查找
+        """
+        path = os.path.abspath(path)
+        while path:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return None
+                path = parent
+        return None
+
+    def __get_lane(self, src, dest, rmt_mode):
+        """
+        确定转移使用的通道，为空时直接执行
+        """
+        if rmt_mode in [RmtMode.LINK, RmtMode.SOFTLINK]:
+            return None
+        if rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
+            return "rclone"
+        if rmt_mode in [RmtMode.MINIO, RmtMode.MINIOCOPY]:
+            return "minio"
+        dest_device = self.__get_device(os.path.dirname(dest))
+        # 同一文件系统内移动只是重命名
+        if rmt_mode == RmtMode.MOVE and dest_device is not None and dest_device == self.__get_device(src):
+            return None
+        return "local:%s" % dest_device
+
+    def __get_executor(self, lane):
+        with lock:
+            executor = self._lanes.get(lane)
+            if not executor:
+                executor = ThreadPoolExecutor(max_workers=TRANSFER_LANE_THREADS,
+                                              thread_name_prefix="transfer-%s" % lane)
+                self._lanes[lane] = executor
+            return executor
+
+    @staticmethod
+    def __get_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def __add_job(self, src, dest, rmt_mode, lane, size=None):
+        if size is None:
+            size = self.__get_size(src)
+        with lock:
+            self._job_id += 1
+            self._jobs[self._job_id] = {
+                "id": self._job_id,
+                "src": src,
+                "dest": dest,
+                "mode": rmt_mode.value,
+                "lane": lane,
+                "size": size,
+                "state": "queued",
+                "start_time": None,
+                "copied": None,
+                "speed": 0
+            }
+            return self._job_id
+
+    def __set_job_state(self, job_id, state):
+        with lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["state"] = state
+                if state == "running":
+                    job["start_time"] = time.time()
+
+    def __update_copied(self, job_id, copied, total, speed):
+        """
+        复制进度回调，记录已复制大小及速度并更新转移进度
+        """
+        with lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job["copied"] = copied
+            job["speed"] = speed
+        if speed and total:
+            ProgressHelper().update(ptype="filetransfer",
+                                    text="正在复制 %s：%s%%，%s/s" % (os.path.basename(job.get("src")),
+                                                                 round(copied * 100 / total, 1),
+                                                                 StringUtils.str_filesize(speed)))
+
+    @staticmethod
+    def __get_progress(job):
+        """
+        本地复制按已复制大小或目标文件大小计算进度
+        """
+        if job.get("state") != "running":
+            return 0
+        if not job.get("lane", "").startswith("local:") or not job.get("size"):
+            return None
+        if job.get("copied") is not None:
+            return min(round(job.get("copied") * 100 / job.get("size"), 1), 100)
+        try:
+            return min(round(os.path.getsize(job.get("dest")) * 100 / job.get("size"), 1), 100)
+        except OSError:
+            return 0
+
+    def __acquire_target(self, dest):
+        with lock:
+            target_lock = self._target_locks.get(dest)
+            if not target_lock:
+                target_lock = [threading.Lock(), 0]
+                self._target_locks[dest] = target_lock
+            target_lock[1] += 1
+        target_lock[0].acquire()
+
+    def __release_target(self, dest):
+        with lock:
+            target_lock = self._target_locks.get(dest)
+            target_lock[0].release()
+            target_lock[1] -= 1
+            if not target_lock[1]:
+                self._target_locks.pop(dest, None)
+
+    def __execute(self, src, dest, rmt_mode, job_id=None):
+        """
+        执行转移命令，同一目标文件串行执行
+        """
+        self.__acquire_target(dest)
+        try:
+            if job_id:
+                self.__set_job_state(job_id, "running")
+            if rmt_mode == RmtMode.LINK:
+                # 更链接
+                return SystemUtils.link(src, dest)
+            elif rmt_mode == RmtMode.SOFTLINK:
+                # 软链接
+                return SystemUtils.softlink(src, dest)
+            elif rmt_mode == RmtMode.MOVE:
+                # 移动
+                return SystemUtils.move(src, dest)
+            elif rmt_mode == RmtMode.RCLONE:
+                # Rclone移动
+                return SystemUtils.rclone_move(src, dest)
+            elif rmt_mode == RmtMode.RCLONECOPY:
+                # Rclone复制
+                return SystemUtils.rclone_copy(src, dest)
+            elif rmt_mode == RmtMode.MINIO:
+                # Minio移动
+                return SystemUtils.minio_move(src, dest)
+            elif rmt_mode == RmtMode.MINIOCOPY:
+                # Minio复制
+                return SystemUtils.minio_copy(src, dest)
+            else:
+                # 复制
+                return SystemUtils.copy(src, dest,
+                                        callback=partial(self.__update_copied, job_id) if job_id else None)
+        finally:
+            self.__release_target(dest)
+
+    def __execute_batch(self, files, dest_root, rmt_mode, job_id=None):
+        """
+        执行批量转移命令，按顺序锁定全部目标文件
+        """
+        targets = sorted(set([dest for _, dest in files]))
+        for dest in targets:
+            self.__acquire_target(dest)
+        try:
+            if job_id:
+                self.__set_job_state(job_id, "running")
+            if rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
+                return SystemUtils.rclone_batch(files, dest_root, move=rmt_mode == RmtMode.RCLONE)
+            else:
+                return SystemUtils.minio_batch(files, dest_root, move=rmt_mode == RmtMode.MINIO)
+        finally:
+            for dest in targets:
+                self.__release_target(dest)
+
+
+class TransferBatch:
+    """
+    一次转移任务中排队的远程转移操作，统一执行时按目的根目录合并为一次命令
+    """
+
+    def __init__(self, rmt_mode, roots=None):
+        """
+        :param rmt_mode: RmtMode转移方式
+        :param roots: 目的根目录列表，目标文件按所在的根目录分组
+        """
+        self.rmt_mode = rmt_mode
+        self._roots = sorted(set([os.path.normpath(root) for root in roots or [] if root]),
+                             key=len, reverse=True)
+        # [(源文件, 目标文件)]
+        self._files = []
+        # 序号 -> (错误码, 错误信息)
+        self._results = {}
+        # [(开始序号, 结束序号, 回调)]
+        self._callbacks = []
+
+    def __len__(self):
+        return len(self._files)
+
+    def add(self, src, dest):
+        """
+        加入一个转移操作
+        :return: 操作序号
+        """
+        self._files.append((src, dest))
+        return len(self._files) - 1
+
+    def on_success(self, start, end, callback):
+        """
+        序号范围内的操作全部成功后执行回调，用于登记转移记录
+        """
+        self._callbacks.append((start, end, callback))
+
+    def get_retcode(self, start, end):
+        """
+        获取序号范围内的操作结果，全部成功时为0，否则为第一个错误码
+        """
+        for index in range(start, end):
+            retcode, _ = self._results.get(index, (-1, ""))
+            if retcode != 0:
+                return retcode
+        return 0
+
+    def __get_root(self, dest):
+        for root in self._roots:
+            if os.path.normpath(dest).startswith(root + os.sep):
+                return root
+        return os.path.dirname(os.path.normpath(dest))
+
+    def flush(self):
+        """
+        执行所有未执行的操作，同一目的根目录下的文件只启动一次命令
+        """
+        groups = {}
+        for index, (src, dest) in enumerate(self._files):
+            if index in self._results:
+                continue
+            groups.setdefault(self.__get_root(dest), []).append(index)
+        for root, indexes in groups.items():
+            files = [self._files[index] for index in indexes]
+            log.info("【Rmt】开始批量%s %s 个文件到 %s" % (self.rmt_mode.value, len(files), root))
+            results = TransferHelper().transfer_batch(files, root, self.rmt_mode)
+            for index, (src, dest), (retcode, retmsg) in zip(indexes, files, results):
+                self._results[index] = (retcode, retmsg)
+                if retcode != 0:
+                    log.error("【Rmt】文件 %s %s失败，错误码 %s：%s" % (src, self.rmt_mode.value, retcode, retmsg))
+        callbacks, self._callbacks = self._callbacks, []
+        for start, end, callback in callbacks:
+            if self.get_retcode(start, end) == 0:
+                callback()
@@ -1,6 +1,7 @@
 import regex as re
 
 from app.helper import DbHelper
+from app.utils import StringUtils
 from app.utils.commons import singleton
 from app.utils.exception_utils import ExceptionUtils
 
@@ -8,24 +9,98 @@ from app.utils.exception_utils import ExceptionUtils
 @singleton
 class WordsHelper:
     dbhelper = None
-    ignored_words_info = []
-    ignored_words_noregex_info = []
-    replaced_words_info = []
-    replaced_words_noregex_info = []
-    replaced_offset_words_info = []
-    offset_words_info = []
+    # 编译后的处理流程
+    _program = []
+    # 已编译的识别词，识别词未变化时不重新编译
+    _signature = None
+    # 识别词版本，每次重新编译后递增
+    version = 0
 
     def __init__(self):
         self.init_config()
 
     def init_config(self):
         self.dbhelper = DbHelper()
-        self.ignored_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=1, regex=1)
-        self.ignored_words_noregex_info = self.dbhelper.get_custom_words(enabled=1, wtype=1, regex=0)
-        self.replaced_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=2, regex=1)
-        self.replaced_words_noregex_info = self.dbhelper.get_custom_words(enabled=1, wtype=2, regex=0)
-        self.replaced_offset_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=3, regex=1)
-        self.offset_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=4, regex=1)
+        ignored_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=1, regex=1)
+        ignored_words_noregex_info = self.dbhelper.get_custom_words(enabled=1, wtype=1, regex=0)
+        replaced_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=2, regex=1)
+        replaced_words_noregex_info = self.dbhelper.get_custom_words(enabled=1, wtype=2, regex=0)
+        replaced_offset_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=3, regex=1)
+        offset_words_info = self.dbhelper.get_custom_words(enabled=1, wtype=4, regex=1)
+        signature = tuple(tuple((word_info.ID,
+                                 word_info.REPLACED,
+                                 word_info.REPLACE,
+                                 word_info.FRONT,
+                                 word_info.BACK,
+                                 word_info.OFFSET) for word_info in words_info)
+                          for words_info in (ignored_words_info,
+                                             ignored_words_noregex_info,
+                                             replaced_words_info,
+                                             replaced_words_noregex_info,
+                                             replaced_offset_words_info,
+                                             offset_words_info))
+        if signature == self._signature:
+            return
+        # 按处理顺序编译：屏蔽、替换、替换+集偏移、集偏移
+        program = []
+        if ignored_words_info:
+            program.append(("regex", "ignored", [
+                (word_info.REPLACED, "", self.__compile(word_info.REPLACED))
+                for word_info in ignored_words_info]))
+        if ignored_words_noregex_info:
+            program.append(("noregex", "ignored", self.__compile_noregex([
+                (word_info.REPLACED, "") for word_info in ignored_words_noregex_info])))
+        if replaced_words_info:
+            program.append(("regex", "replaced", [
+                (word_info.REPLACED, word_info.REPLACE, self.__compile(word_info.REPLACED))
+                for word_info in replaced_words_info]))
+        if replaced_words_noregex_info:
+            program.append(("noregex", "replaced", self.__compile_noregex([
+                (word_info.REPLACED, word_info.REPLACE) for word_info in replaced_words_noregex_info])))
+        if replaced_offset_words_info:
+            program.append(("replace_offset", None, [
+                (word_info.REPLACED, word_info.REPLACE, self.__compile(word_info.REPLACED),
+                 self.__compile_offset(word_info))
+                for word_info in replaced_offset_words_info]))
+        if offset_words_info:
+            program.append(("offset", None, [
+                self.__compile_offset(word_info) for word_info in offset_words_info]))
+        self._program = program
+        self._signature = signature
+        self.version += 1
+
+    @staticmethod
+    def __compile(pattern):
+        """
+        编译正则，返回编译结果及错误信息
+        """
+        try:
+            return re.compile(r'%s' % pattern), ""
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return None, str(err)
+
+    @staticmethod
+    def __compile_noregex(words):
+        """
+        普通文本识别词合并为一个正则，标题中不包含其中任何一个时整体跳过
+        """
+        if all(replaced for replaced, _ in words):
+            return StringUtils.words_regex([replaced for replaced, _ in words]), words
+        return None, words
+
+    def __compile_offset(self, word_info):
+        """
+        编译集偏移的前后定位正则
+        """
+        front = word_info.FRONT
+        back = word_info.BACK
+        return (front,
+                back,
+                word_info.OFFSET,
+                self.__compile(front) if front else (None, ""),
+                self.__compile(back) if back else (None, ""),
+                self.__compile(r'(?<=%s.*?)[0-9]+(?=.*?%s)' % (front, back)))
 
     def process(self, title):
         # 错误信息
@@ -36,96 +111,71 @@ class WordsHelper:
         used_replaced_words = []
         # 应用集偏移
         used_offset_words = []
-        # 屏蔽
-        if self.ignored_words_info:
-            for ignored_word_info in self.ignored_words_info:
-                ignored = ignored_word_info.REPLACED
-                ignored_word = ignored
-                title, ignore_msg, ignore_flag = self.replace_regex(replaced=ignored,
-                                                                    replace="",
-                                                                    title=title)
-                if ignore_flag:
-                    used_ignored_words.append(ignored_word)
-                elif ignore_msg:
-                    msg.append(f"自定义屏蔽词 {ignored_word} 设置有误：{ignore_msg}")
-        if self.ignored_words_noregex_info:
-            for ignored_word_noregex_info in self.ignored_words_noregex_info:
-                ignored = ignored_word_noregex_info.REPLACED
-                ignored_word = ignored
-                title, ignore_msg, ignore_flag = self.replace_noregex(replaced=ignored,
-                                                                      replace="",
-                                                                      title=title)
-                if ignore_flag:
-                    used_ignored_words.append(ignored_word)
-                elif ignore_msg:
-                    msg.append(f"自定义屏蔽词 {ignored_word} 设置有误：{ignore_msg}")
-        # 替换
-        if self.replaced_words_info:
-            for replaced_word_info in self.replaced_words_info:
-                replaced = replaced_word_info.REPLACED
-                replace = replaced_word_info.REPLACE
-                replaced_word = f"{replaced}@{replace}"
-                title, replace_msg, replace_flag = self.replace_regex(replaced=replaced,
-                                                                      replace=replace,
-                                                                      title=title)
-                if replace_flag:
-                    used_replaced_words.append(replaced_word)
-                elif replace_msg:
-                    msg.append(f"自定义替换词 {replaced_word} 格式有误：{replace_msg}")
-        if self.replaced_words_noregex_info:
-            for replaced_word_noregex_info in self.replaced_words_noregex_info:
-                replaced = replaced_word_noregex_info.REPLACED
-                replace = replaced_word_noregex_info.REPLACE
-                replaced_word = f"{replaced}@{replace}"
-                title, replace_msg, replace_flag = self.replace_noregex(replaced=replaced,
-                                                                        replace=replace,
-                                                                        title=title)
-                if replace_flag:
-                    used_replaced_words.append(replaced_word)
-                elif replace_msg:
-                    msg.append(f"自定义替换词 {replaced_word} 格式有误：{replace_msg}")
-        # 替换+集偏移
-        if self.replaced_offset_words_info:
-            for replaced_offset_word_info in self.replaced_offset_words_info:
-                replaced = replaced_offset_word_info.REPLACED
-                replace = replaced_offset_word_info.REPLACE
-                front = replaced_offset_word_info.FRONT
-                back = replaced_offset_word_info.BACK
-                offset = replaced_offset_word_info.OFFSET
-                replaced_word = f"{replaced}@{replace}"
-                offset_word = f"{front}@{back}@{offset}"
-                replaced_offset_word = f"{replaced}@{replace}@{front}@{back}@{offset}"
-                # 替换
-                title_replace, replace_msg, replace_flag = self.replace_regex(replaced=replaced,
+        for step, wtype, words in self._program:
+            # 屏蔽、替换
+            if step in ("regex", "noregex"):
+                if step == "noregex":
+                    words_re, words = words
+                    # 不包含任何一个普通文本识别词
+                    if words_re and not words_re.search(title):
+                        continue
+                for word_info in words:
+                    if step == "regex":
+                        replaced, replace, replaced_re = word_info
+                        title, replace_msg, replace_flag = self.replace_regex(replaced=replaced_re,
                                                                               replace=replace,
                                                                               title=title)
-                # 替换应用成功进行集数偏移
-                if replace_flag:
-                    title_offset, offset_msg, offset_flag = self.episode_offset(front=front,
-                                                                                back=back,
-                                                                                offset=offset,
-                                                                                title=title_replace)
-                    # 集数偏移应用成功
+                    else:
+                        replaced, replace = word_info
+                        title, replace_msg, replace_flag = self.replace_noregex(replaced=replaced,
+                                                                                replace=replace,
+                                                                                title=title)
+                    if wtype == "ignored":
+                        if replace_flag:
+                            used_ignored_words.append(replaced)
+                        elif replace_msg:
+                            msg.append(f"自定义屏蔽词 {replaced} 设置有误：{replace_msg}")
+                    else:
+                        replaced_word = f"{replaced}@{replace}"
+                        if replace_flag:
+                            used_replaced_words.append(replaced_word)
+                        elif replace_msg:
+                            msg.append(f"自定义替换词 {replaced_word} 格式有误：{replace_msg}")
+            # 替换+集偏移
+            elif step == "replace_offset":
+                for replaced, replace, replaced_re, offset_info in words:
+                    front, back, offset = offset_info[:3]
+                    replaced_word = f"{replaced}@{replace}"
+                    offset_word = f"{front}@{back}@{offset}"
+                    replaced_offset_word = f"{replaced}@{replace}@{front}@{back}@{offset}"
+                    # 替换
+                    title_replace, replace_msg, replace_flag = self.replace_regex(replaced=replaced_re,
+                                                                                  replace=replace,
+                                                                                  title=title)
+                    # 替换应用成功进行集数偏移
+                    if replace_flag:
+                        title_offset, offset_msg, offset_flag = self.episode_offset(offset_info=offset_info,
+                                                                                    title=title_replace)
+                        # 集数偏移应用成功
+                        if offset_flag:
+                            used_replaced_words.append(replaced_word)
+                            used_offset_words.append(offset_word)
+                            title = title_offset
+                        elif offset_msg:
+                            msg.append(f"自定义替换+集偏移词 {replaced_offset_word} 集偏移部分格式有误：{offset_msg}")
+                    elif replace_msg:
+                        msg.append(f"自定义替换+集偏移词 {replaced_offset_word} 替换部分格式有误：{replace_msg}")
+            # 集数偏移
+            elif step == "offset":
+                for offset_info in words:
+                    front, back, offset = offset_info[:3]
+                    offset_word = f"{front}@{back}@{offset}"
+                    title, offset_msg, offset_flag = self.episode_offset(offset_info=offset_info,
+                                                                         title=title)
                     if offset_flag:
-                        used_replaced_words.append(replaced_word)
                         used_offset_words.append(offset_word)
-                        title = title_offset
                     elif offset_msg:
-                        msg.append(f"自定义替换+集偏移词 {replaced_offset_word} 集偏移部分格式有误：{offset_msg}")
-                elif replace_msg:
-                    msg.append(f"自定义替换+集偏移词 {replaced_offset_word} 替换部分格式有误：{replace_msg}")
-        # 集数偏移
-        if self.offset_words_info:
-            for offset_word_info in self.offset_words_info:
-                front = offset_word_info.FRONT
-                back = offset_word_info.BACK
-                offset = offset_word_info.OFFSET
-                offset_word = f"{front}@{back}@{offset}"
-                title, offset_msg, offset_flag = self.episode_offset(front, back, offset, title)
-                if offset_flag:
-                    used_offset_words.append(offset_word)
-                elif offset_msg:
-                    msg.append(f"自定义集偏移词 {offset_word} 格式有误：{offset_msg}")
+                        msg.append(f"自定义集偏移词 {offset_word} 格式有误：{offset_msg}")
 
         return title, msg, {"ignored": used_ignored_words,
                             "replaced": used_replaced_words,
@@ -133,12 +183,17 @@ class WordsHelper:
 
     @staticmethod
     def replace_regex(replaced, replace, title):
-        msg = ""
+        """
+        :param replaced: 编译后的正则及编译错误信息
+        """
+        replaced_re, msg = replaced
+        if not replaced_re:
+            return title, msg, False
         try:
-            if not re.findall(r'%s' % replaced, title):
+            if not replaced_re.search(title):
                 return title, msg, False
             else:
-                title = re.sub(r'%s' % replaced, r'%s' % replace, title)
+                title = replaced_re.sub(r'%s' % replace, title)
                 return title, msg, True
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
@@ -160,15 +215,26 @@ class WordsHelper:
             return title, msg, False
 
     @staticmethod
-    def episode_offset(front, back, offset, title):
+    def episode_offset(offset_info, title):
+        """
+        :param offset_info: 前后定位词、偏移量及编译后的前后定位正则、集数正则
+        """
+        front, back, offset, (front_re, front_msg), (back_re, back_msg), (offset_re, offset_msg) = offset_info
+        if back:
+            if not back_re:
+                return title, back_msg, False
+            if not back_re.search(title):
+                return title, "", False
+        if front:
+            if not front_re:
+                return title, front_msg, False
+            if not front_re.search(title):
+                return title, "", False
+        if not offset_re:
+            return title, offset_msg, False
         msg = ""
         try:
-            if back and not re.findall(r'%s' % back, title):
-                return title, msg, False
-            if front and not re.findall(r'%s' % front, title):
-                return title, msg, False
-            offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9]+(?=.*?%s)' % (front, back))
-            episode_nums_str = re.findall(offset_word_info_re, title)
+            episode_nums_str = offset_re.findall(title)
             if not episode_nums_str:
                 return title, msg, False
             episode_nums_offset_int = []
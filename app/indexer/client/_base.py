@@ -1,5 +1,4 @@
 import datetime
-import xml.dom.minidom
 from abc import ABCMeta, abstractmethod
 
 import log
@@ -7,7 +6,7 @@ from app.filter import Filter
 from app.helper import ProgressHelper
 from app.media import Media
 from app.media.meta import MetaInfo
-from app.utils import DomUtils, RequestUtils, StringUtils, ExceptionUtils
+from app.utils import FeedUtils, RequestUtils, StringUtils, ExceptionUtils
 from app.utils.types import MediaType, SearchType
 
 
@@ -95,47 +94,43 @@ class _IIndexClient(metaclass=ABCMeta):
         if not url:
             return []
         try:
-            ret = RequestUtils(timeout=10).get_res(url)
+            ret = RequestUtils(timeout=10).get_res(url, stream=True)
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
             return []
         if not ret:
-            return []
-        xmls = ret.text
-        if not xmls:
+            if ret is not None:
+                ret.close()
             return []
 
         torrents = []
         try:
-            # 解析XML
-            dom_tree = xml.dom.minidom.parseString(xmls)
-            root_node = dom_tree.documentElement
-            items = root_node.getElementsByTagName("item")
-            for item in items:
+            # 流式解析XML
+            for item in FeedUtils.iter_items(ret):
                 try:
                     # indexer id
-                    indexer_id = DomUtils.tag_value(item, "jackettindexer", "id",
-                                                    default=DomUtils.tag_value(item, "prowlarrindexer", "id", ""))
+                    indexer_id = FeedUtils.tag_value(item, "jackettindexer", "id",
+                                                     default=FeedUtils.tag_value(item, "prowlarrindexer", "id", ""))
                     # indexer
-                    indexer = DomUtils.tag_value(item, "jackettindexer",
-                                                 default=DomUtils.tag_value(item, "prowlarrindexer", default=""))
+                    indexer = FeedUtils.tag_value(item, "jackettindexer",
+                                                  default=FeedUtils.tag_value(item, "prowlarrindexer", default=""))
 
                     # 标题
-                    title = DomUtils.tag_value(item, "title", default="")
+                    title = FeedUtils.tag_value(item, "title", default="")
                     if not title:
                         continue
                     # 种子链接
-                    enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
+                    enclosure = FeedUtils.tag_value(item, "enclosure", "url", default="")
                     if not enclosure:
                         continue
                     # 描述
-                    description = DomUtils.tag_value(item, "description", default="")
+                    description = FeedUtils.tag_value(item, "description", default="")
                     # 类别
-                    category = DomUtils.tag_value(item, "category", default="")
+                    category = FeedUtils.tag_value(item, "category", default="")
                     # 种子大小
-                    size = DomUtils.tag_value(item, "size", default=0)
+                    size = FeedUtils.tag_value(item, "size", default=0)
                     # 种子页面
-                    page_url = DomUtils.tag_value(item, "comments", default="")
+                    page_url = FeedUtils.tag_value(item, "comments", default="")
 
                     # 做种数
                     seeders = 0
@@ -150,10 +145,10 @@ class _IIndexClient(metaclass=ABCMeta):
                     # imdbid
                     imdbid = ""
 
-                    torznab_attrs = item.getElementsByTagName("torznab:attr")
+                    torznab_attrs = FeedUtils.tag_nodes(item, "torznab:attr")
                     for torznab_attr in torznab_attrs:
-                        name = torznab_attr.getAttribute('name')
-                        value = torznab_attr.getAttribute('value')
+                        name = torznab_attr.get('name')
+                        value = torznab_attr.get('value')
                         if name == "seeders":
                             seeders = value
                         if name == "peers":
@@ -188,6 +183,8 @@ class _IIndexClient(metaclass=ABCMeta):
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
             pass
+        finally:
+            ret.close()
 
         return torrents
 
@@ -1,22 +1,34 @@
 import difflib
+import json
 import os
 import random
 import re
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import zhconv
 from lxml import etree
 
 import log
-from app.helper import MetaHelper
+from app.helper import MetaHelper, ThreadHelper
 from app.media.meta.metainfo import MetaInfo
 from app.media.tmdbv3api import TMDb, Search, Movie, TV, Person, Find, TMDbException, Discover, Trending, Episode, Genre
+from app.media.tmdbv3api.as_obj import AsObj
 from app.utils import PathUtils, EpisodeFormat, RequestUtils, NumberUtils, StringUtils, cacheman
+from app.utils.commons import SingleFlight
 from app.utils.types import MediaType, MatchMode
 from config import Config, KEYWORD_BLACKLIST, KEYWORD_SEARCH_WEIGHT_3, KEYWORD_SEARCH_WEIGHT_2, KEYWORD_SEARCH_WEIGHT_1, \
     KEYWORD_STR_SIMILARITY_THRESHOLD, KEYWORD_DIFF_SCORE_THRESHOLD, TMDB_IMAGE_ORIGINAL_URL, DEFAULT_TMDB_PROXY, \
-    TMDB_IMAGE_FACE_URL, TMDB_PEOPLE_PROFILE_URL, TMDB_IMAGE_W500_URL
+    TMDB_IMAGE_FACE_URL, TMDB_PEOPLE_PROFILE_URL, TMDB_IMAGE_W500_URL, MEDIA_IDENTIFY_THREADS
+
+
+# 合并相同缓存key的并发识别
+_identify_flight = SingleFlight()
+# 正在后台刷新的TMDB详情缓存
+_refreshing_details = set()
+_refreshing_lock = threading.Lock()
 
 
 class Media:
@@ -165,56 +177,53 @@ class Media:
             return None
         if not file_media_name:
             return None
-        if language:
-            self.tmdb.language = language
-        else:
-            self.tmdb.language = 'zh-CN'
-        # TMDB检索
-        info = {}
-        if search_type == MediaType.MOVIE:
-            year_range = [first_media_year]
-            if first_media_year:
-                year_range.append(str(int(first_media_year) + 1))
-                year_range.append(str(int(first_media_year) - 1))
-            for year in year_range:
-                log.debug(
-                    f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={year} ...")
-                info = self.__search_movie_by_name(file_media_name, year)
+        with self.tmdb.use_language(language or 'zh-CN'):
+            # TMDB检索
+            info = {}
+            if search_type == MediaType.MOVIE:
+                year_range = [first_media_year]
+                if first_media_year:
+                    year_range.append(str(int(first_media_year) + 1))
+                    year_range.append(str(int(first_media_year) - 1))
+                for year in year_range:
+                    log.debug(
+                        f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={year} ...")
+                    info = self.__search_movie_by_name(file_media_name, year)
+                    if info:
+                        info['media_type'] = MediaType.MOVIE
+                        log.info("【Meta】%s 识别到 电影：TMDBID=%s, 名称=%s, 上映日期=%s" % (
+                            file_media_name,
+                            info.get('id'),
+                            info.get('title'),
+                            info.get('release_date')))
+                        break
+            else:
+                # 有当前季和当前季集年份，使用精确匹配
+                if media_year and season_number:
+                    log.debug(
+                        f"【Meta】正在识别{search_type.value}：{file_media_name}, 季集={season_number}, 季集年份={media_year} ...")
+                    info = self.__search_tv_by_season(file_media_name,
+                                                      media_year,
+                                                      season_number)
+                if not info:
+                    log.debug(
+                        f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={StringUtils.xstr(first_media_year)} ...")
+                    info = self.__search_tv_by_name(file_media_name,
+                                                    first_media_year)
                 if info:
-                    info['media_type'] = MediaType.MOVIE
-                    log.info("【Meta】%s 识别到 电影：TMDBID=%s, 名称=%s, 上映日期=%s" % (
+                    info['media_type'] = MediaType.TV
+                    log.info("【Meta】%s 识别到 电视剧：TMDBID=%s, 名称=%s, 首播日期=%s" % (
                         file_media_name,
                         info.get('id'),
-                        info.get('title'),
-                        info.get('release_date')))
-                    break
-        else:
-            # 有当前季和当前季集年份，使用精确匹配
-            if media_year and season_number:
-                log.debug(
-                    f"【Meta】正在识别{search_type.value}：{file_media_name}, 季集={season_number}, 季集年份={media_year} ...")
-                info = self.__search_tv_by_season(file_media_name,
-                                                  media_year,
-                                                  season_number)
-            if not info:
-                log.debug(
-                    f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={StringUtils.xstr(first_media_year)} ...")
-                info = self.__search_tv_by_name(file_media_name,
-                                                first_media_year)
+                        info.get('name'),
+                        info.get('first_air_date')))
+            # 返回
             if info:
-                info['media_type'] = MediaType.TV
-                log.info("【Meta】%s 识别到 电视剧：TMDBID=%s, 名称=%s, 首播日期=%s" % (
-                    file_media_name,
-                    info.get('id'),
-                    info.get('name'),
-                    info.get('first_air_date')))
-        # 返回
-        if info:
-            return info
-        else:
-            log.info("【Meta】%s 以年份 %s 在TMDB中未找到%s信息!" % (
-                file_media_name, StringUtils.xstr(first_media_year), search_type.value if search_type else ""))
-            return info
+                return info
+            else:
+                log.info("【Meta】%s 以年份 %s 在TMDB中未找到%s信息!" % (
+                    file_media_name, StringUtils.xstr(first_media_year), search_type.value if search_type else ""))
+                return info
 
     def __search_movie_by_name(self, file_media_name, first_media_year):
         """
@@ -503,31 +512,78 @@ class Media:
         if not self.tmdb:
             log.error("【Meta】TMDB API Key 未设置！")
             return None
-        if language:
-            self.tmdb.language = language
-        else:
-            self.tmdb.language = 'zh-CN'
+        with self.tmdb.use_language(language or 'zh-CN'):
+            if mtype == MediaType.MOVIE:
+                tmdb_info = self.__get_tmdb_detail_cached(MediaType.MOVIE, tmdbid, append_to_response)
+                if tmdb_info:
+                    tmdb_info['media_type'] = MediaType.MOVIE
+                    # 把别名赋值到搜索词
+                    tmdb_info['keyword'] = self.__get_tmdb_allnames(MediaType.MOVIE, tmdb_info)
+            else:
+                tmdb_info = self.__get_tmdb_detail_cached(MediaType.TV, tmdbid, append_to_response)
+                if tmdb_info:
+                    tmdb_info['media_type'] = MediaType.TV
+                    # 把别名赋值到搜索词
+                    tmdb_info['keyword'] = self.__get_tmdb_allnames(MediaType.TV, tmdb_info)
+            if tmdb_info:
+                # 转换genreid
+                tmdb_info['genre_ids'] = self.__get_genre_ids_from_detail(tmdb_info.get('genres'))
+                # 转换中文标题
+                if chinese:
+                    tmdb_info = self.__update_tmdbinfo_cn_title(tmdb_info)
+
+            return tmdb_info
+
+    def __get_tmdb_detail_cached(self, mtype: MediaType, tmdbid, append_to_response=None):
+        """
+        优先从本地缓存获取TMDB详情，缓存过期时先返回旧数据并在后台刷新
+        :param mtype: 电影或电视剧
+        :param tmdbid: TMDB ID
+        :param append_to_response: 附加信息
+        :return: TMDB信息
+        """
+        if not tmdbid:
+            return None
+        language = self.tmdb.language
+        cache_key = f"{'movie' if mtype == MediaType.MOVIE else 'tv'}-{tmdbid}-{language}-{append_to_response}"
+        data, stale = self.meta.get_tmdb_detail(cache_key)
+        if data:
+            if stale:
+                with _refreshing_lock:
+                    refresh = cache_key not in _refreshing_details
+                    _refreshing_details.add(cache_key)
+                if refresh:
+                    ThreadHelper().start_thread(self.__refresh_tmdb_detail,
+                                                (cache_key, mtype, tmdbid, language, append_to_response))
+            try:
+                return AsObj(**json.loads(data))
+            except Exception as err:
+                print(str(err))
+        return self.__fetch_tmdb_detail(cache_key, mtype, tmdbid, append_to_response)
+
+    def __fetch_tmdb_detail(self, cache_key, mtype: MediaType, tmdbid, append_to_response=None):
+        """
+        从TMDB查询详情并写入缓存
+        """
         if mtype == MediaType.MOVIE:
             tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response)
-            if tmdb_info:
-                tmdb_info['media_type'] = MediaType.MOVIE
-                # 把别名赋值到搜索词
-                tmdb_info['keyword'] = self.__get_tmdb_allnames(MediaType.MOVIE, tmdb_info)
         else:
             tmdb_info = self.__get_tmdb_tv_detail(tmdbid, append_to_response)
-            if tmdb_info:
-                tmdb_info['media_type'] = MediaType.TV
-                # 把别名赋值到搜索词
-                tmdb_info['keyword'] = self.__get_tmdb_allnames(MediaType.TV, tmdb_info)
         if tmdb_info:
-            # 转换genreid
-            tmdb_info['genre_ids'] = self.__get_genre_ids_from_detail(tmdb_info.get('genres'))
-            # 转换中文标题
-            if chinese:
-                tmdb_info = self.__update_tmdbinfo_cn_title(tmdb_info)
-
+            self.meta.update_tmdb_detail(cache_key, tmdbid, json.dumps(tmdb_info, default=lambda o: o.__dict__))
         return tmdb_info
 
+    def __refresh_tmdb_detail(self, cache_key, mtype: MediaType, tmdbid, language, append_to_response=None):
+        """
+        后台刷新TMDB详情缓存
+        """
+        try:
+            with self.tmdb.use_language(language):
+                self.__fetch_tmdb_detail(cache_key, mtype, tmdbid, append_to_response)
+        finally:
+            with _refreshing_lock:
+                _refreshing_details.discard(cache_key)
+
     def __update_tmdbinfo_cn_title(self, tmdb_info):
         """
         更新TMDB信息中的中文名称
@@ -626,6 +682,13 @@ class Media:
             return None
         return f"[{meta_info.type.value}]{meta_info.get_name()}-{meta_info.year}-{meta_info.begin_season}"
 
+    @staticmethod
+    def get_identify_stats():
+        """
+        返回并发识别合并的统计：总调用数、被合并的调用数、进行中的数量
+        """
+        return _identify_flight.stats()
+
     def get_cache_info(self, meta_info):
         """
         根据名称查询是否已经有缓存
@@ -666,63 +729,18 @@ class Media:
             meta_info.type = mtype
         media_key = self.__make_cache_key(meta_info)
         if not cache or not self.meta.get_meta_data_by_key(media_key):
-            # 缓存没有或者强制不使用缓存
-            if meta_info.type != MediaType.TV and not meta_info.year:
-                file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
-            else:
-                if meta_info.type == MediaType.TV:
-                    # 确定是电视
-                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                         first_media_year=meta_info.year,
-                                                         search_type=meta_info.type,
-                                                         media_year=meta_info.year,
-                                                         season_number=meta_info.begin_season
-                                                         )
-                    if not file_media_info and meta_info.year and self._rmt_match_mode == MatchMode.NORMAL and not strict:
-                        # 非严格模式下去掉年份再查一次
-                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                             search_type=meta_info.type
-                                                             )
-                else:
-                    # 有年份先按电影查
-                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                         first_media_year=meta_info.year,
-                                                         search_type=MediaType.MOVIE
-                                                         )
-                    # 没有再按电视剧查
-                    if not file_media_info:
-                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                             first_media_year=meta_info.year,
-                                                             search_type=MediaType.TV
-                                                             )
-                    if not file_media_info and self._rmt_match_mode == MatchMode.NORMAL and not strict:
-                        # 非严格模式下去掉年份和类型再查一次
-                        file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
-            if not file_media_info and self._search_tmdbweb:
-                file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
-                                                         mtype=meta_info.type)
-            if not file_media_info and self._search_keyword:
-                cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
-                is_movie = False
-                if not cache_name:
-                    cache_name, is_movie = self.__search_engine(meta_info.get_name())
-                    cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
-                if cache_name:
-                    log.info("【Meta】开始辅助查询：%s ..." % cache_name)
-                    if is_movie:
-                        file_media_info = self.__search_tmdb(file_media_name=cache_name, search_type=MediaType.MOVIE)
-                    else:
-                        file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
-            # 补充全量信息
-            if file_media_info and not file_media_info.get("genres"):
-                file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
-                                                     tmdbid=file_media_info.get("id"),
-                                                     chinese=chinese,
-                                                     append_to_response=append_to_response)
-            # 保存到缓存
-            if file_media_info is not None:
-                self.__insert_media_cache(media_key=media_key,
-                                          file_media_info=file_media_info)
+            # 缓存没有或者强制不使用缓存，相同key的并发识别只查询一次
+            file_media_info, shared = _identify_flight.do((media_key, strict, chinese, append_to_response),
+                                                          self.__identify_media_info,
+                                                          meta_info=meta_info,
+                                                          media_key=media_key,
+                                                          strict=strict,
+                                                          chinese=chinese,
+                                                          append_to_response=append_to_response)
+            if shared:
+                log.debug("【Meta】%s 复用并发识别结果" % media_key)
+                if file_media_info:
+                    file_media_info = file_media_info.copy()
         else:
             # 使用缓存信息
             cache_info = self.meta.get_meta_data_by_key(media_key)
@@ -737,6 +755,74 @@ class Media:
         meta_info.set_tmdb_info(file_media_info)
         return meta_info
 
+    def __identify_media_info(self, meta_info, media_key, strict=None, chinese=True, append_to_response=None):
+        """
+        按名称、年份、类型检索TMDB，识别结果写入缓存
+        :param meta_info: 识别的MetaInfo对象
+        :param media_key: 缓存key
+        :param strict: 是否严格模式
+        :param chinese: 原标题为英文时是否从别名中检索中文名称
+        :param append_to_response: 额外查询的信息
+        :return: TMDB信息
+        """
+        if meta_info.type != MediaType.TV and not meta_info.year:
+            file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
+        else:
+            if meta_info.type == MediaType.TV:
+                # 确定是电视
+                file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                     first_media_year=meta_info.year,
+                                                     search_type=meta_info.type,
+                                                     media_year=meta_info.year,
+                                                     season_number=meta_info.begin_season
+                                                     )
+                if not file_media_info and meta_info.year and self._rmt_match_mode == MatchMode.NORMAL and not strict:
+                    # 非严格模式下去掉年份再查一次
+                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                         search_type=meta_info.type
+                                                         )
+            else:
+                # 有年份先按电影查
+                file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                     first_media_year=meta_info.year,
+                                                     search_type=MediaType.MOVIE
+                                                     )
+                # 没有再按电视剧查
+                if not file_media_info:
+                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                         first_media_year=meta_info.year,
+                                                         search_type=MediaType.TV
+                                                         )
+                if not file_media_info and self._rmt_match_mode == MatchMode.NORMAL and not strict:
+                    # 非严格模式下去掉年份和类型再查一次
+                    file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
+        if not file_media_info and self._search_tmdbweb:
+            file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
+                                                     mtype=meta_info.type)
+        if not file_media_info and self._search_keyword:
+            cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
+            is_movie = False
+            if not cache_name:
+                cache_name, is_movie = self.__search_engine(meta_info.get_name())
+                cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
+            if cache_name:
+                log.info("【Meta】开始辅助查询：%s ..." % cache_name)
+                if is_movie:
+                    file_media_info = self.__search_tmdb(file_media_name=cache_name, search_type=MediaType.MOVIE)
+                else:
+                    file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
+        # 补充全量信息
+        if file_media_info and not file_media_info.get("genres"):
+            file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
+                                                 tmdbid=file_media_info.get("id"),
+                                                 chinese=chinese,
+                                                 append_to_response=append_to_response)
+        # 保存到缓存
+        if file_media_info is not None:
+            self.__insert_media_cache(media_key=media_key,
+                                      file_media_info=file_media_info)
+        return file_media_info
+
     def __insert_media_cache(self, media_key, file_media_info):
         """
         将TMDB信息插入缓存
@@ -789,7 +875,11 @@ class Media:
         # 不是list的转为list
         if not isinstance(file_list, list):
             file_list = [file_list]
-        # 遍历每个文件，看得出来的名称是不是不一样，不一样的先搜索媒体信息
+        # 待识别的文件：[(文件路径, MetaInfo, 缓存key)]
+        file_metas = []
+        # 缓存key -> 该key第一个文件的MetaInfo，相同key只识别一次
+        media_keys = {}
+        # 遍历每个文件，先解析名称，得出的名称不一样的再搜索媒体信息
         for file_path in file_list:
             try:
                 if not os.path.exists(file_path):
@@ -834,58 +924,11 @@ class Media:
                     if not meta_info.get_name() or not meta_info.type:
                         log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
                         continue
-                    # 区配缓存及TMDB
+                    # 按缓存key分组，识别完成后统一赋值
                     media_key = self.__make_cache_key(meta_info)
-                    if not self.meta.get_meta_data_by_key(media_key):
-                        # 没有缓存数据
-                        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                             first_media_year=meta_info.year,
-                                                             search_type=meta_info.type,
-                                                             media_year=meta_info.year,
-                                                             season_number=meta_info.begin_season)
-                        if not file_media_info:
-                            if self._rmt_match_mode == MatchMode.NORMAL:
-                                # 去掉年份再查一次，有可能是年份错误
-                                file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                                     search_type=meta_info.type)
-                        if not file_media_info and self._search_tmdbweb:
-                            # 从网站查询
-                            file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
-                                                                     mtype=meta_info.type)
-                        if not file_media_info and self._search_keyword:
-                            cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
-                            is_movie = False
-                            if not cache_name:
-                                cache_name, is_movie = self.__search_engine(meta_info.get_name())
-                                cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
-                            if cache_name:
-                                log.info("【Meta】开始辅助查询：%s ..." % cache_name)
-                                if is_movie:
-                                    file_media_info = self.__search_tmdb(file_media_name=cache_name,
-                                                                         search_type=MediaType.MOVIE)
-                                else:
-                                    file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
-                        # 补全TMDB信息
-                        if file_media_info and not file_media_info.get("genres"):
-                            file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
-                                                                 tmdbid=file_media_info.get("id"),
-                                                                 chinese=chinese)
-                        # 保存到缓存
-                        if file_media_info is not None:
-                            self.__insert_media_cache(media_key=media_key,
-                                                      file_media_info=file_media_info)
-                    else:
-                        # 使用缓存信息
-                        cache_info = self.meta.get_meta_data_by_key(media_key)
-                        if cache_info.get("id"):
-                            file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
-                                                                 tmdbid=cache_info.get("id"),
-                                                                 chinese=chinese)
-                        else:
-                            # 缓存为未识别
-                            file_media_info = None
-                    # 赋值TMDB信息
-                    meta_info.set_tmdb_info(file_media_info)
+                    if media_key not in media_keys:
+                        media_keys[media_key] = meta_info
+                    file_metas.append((file_path, meta_info, media_key))
                 # 自带TMDB信息
                 else:
                     meta_info = MetaInfo(title=file_name, mtype=media_type)
@@ -900,13 +943,119 @@ class Media:
                             meta_info.end_episode = end_ep
                     # 加入缓存
                     self.save_rename_cache(file_name, tmdb_info)
-                # 按文件路程存储
-                return_media_infos[file_path] = meta_info
+                    # 按文件路程存储
+                    return_media_infos[file_path] = meta_info
             except Exception as err:
                 print(str(err))
                 log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+        if not media_keys:
+            return return_media_infos
+        # 不同的缓存key并发识别，TMDB触发限流时由TMDb等待后重试
+        key_media_infos = {}
+        if len(media_keys) == 1:
+            media_key, meta_info = next(iter(media_keys.items()))
+            key_media_infos[media_key] = self.__get_file_media_info(meta_info, media_key, chinese)
+        else:
+            log.info("【Meta】%s 个文件共 %s 个不同名称，开始并发识别 ..." % (len(file_metas), len(media_keys)))
+            with ThreadPoolExecutor(max_workers=min(len(media_keys), MEDIA_IDENTIFY_THREADS),
+                                    thread_name_prefix="identify") as executor:
+                futures = {media_key: executor.submit(self.__get_file_media_info, meta_info, media_key, chinese)
+                           for media_key, meta_info in media_keys.items()}
+                for media_key, future in futures.items():
+                    key_media_infos[media_key] = future.result()
+        # 识别结果按原顺序赋值给每个文件
+        used_keys = set()
+        for file_path, meta_info, media_key in file_metas:
+            if media_key not in key_media_infos:
+                continue
+            file_media_info, succeed = key_media_infos[media_key]
+            if not succeed:
+                continue
+            if file_media_info and media_key in used_keys:
+                file_media_info = file_media_info.copy()
+            used_keys.add(media_key)
+            # 赋值TMDB信息
+            meta_info.set_tmdb_info(file_media_info)
+            # 按文件路程存储
+            return_media_infos[file_path] = meta_info
         # 循环结束
-        return return_media_infos
+        return {file_path: return_media_infos[file_path]
+                for file_path in dict.fromkeys(file_list) if file_path in return_media_infos}
+
+    def __get_file_media_info(self, meta_info, media_key, chinese=True):
+        """
+        查询一个缓存key对应的TMDB信息，用于文件识别
+        :return: TMDB信息，是否成功
+        """
+        try:
+            if not self.meta.get_meta_data_by_key(media_key):
+                # 没有缓存数据，与其它并发识别相同key时只查询一次
+                file_media_info, shared = _identify_flight.do(("files", media_key, chinese),
+                                                              self.__identify_file_media_info,
+                                                              meta_info=meta_info,
+                                                              media_key=media_key,
+                                                              chinese=chinese)
+                if shared:
+                    log.debug("【Meta】%s 复用并发识别结果" % media_key)
+                    if file_media_info:
+                        file_media_info = file_media_info.copy()
+            else:
+                # 使用缓存信息
+                cache_info = self.meta.get_meta_data_by_key(media_key)
+                if cache_info.get("id"):
+                    file_media_info = self.get_tmdb_info(mtype=cache_info.get("type"),
+                                                         tmdbid=cache_info.get("id"),
+                                                         chinese=chinese)
+                else:
+                    # 缓存为未识别
+                    file_media_info = None
+            return file_media_info, True
+        except Exception as err:
+            print(str(err))
+            log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+            return None, False
+
+    def __identify_file_media_info(self, meta_info, media_key, chinese=True):
+        """
+        按文件名称识别的信息检索TMDB，识别结果写入缓存
+        """
+        file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                             first_media_year=meta_info.year,
+                                             search_type=meta_info.type,
+                                             media_year=meta_info.year,
+                                             season_number=meta_info.begin_season)
+        if not file_media_info:
+            if self._rmt_match_mode == MatchMode.NORMAL:
+                # 去掉年份再查一次，有可能是年份错误
+                file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                     search_type=meta_info.type)
+        if not file_media_info and self._search_tmdbweb:
+            # 从网站查询
+            file_media_info = self.__search_tmdb_web(file_media_name=meta_info.get_name(),
+                                                     mtype=meta_info.type)
+        if not file_media_info and self._search_keyword:
+            cache_name = cacheman["tmdb_supply"].get(meta_info.get_name())
+            is_movie = False
+            if not cache_name:
+                cache_name, is_movie = self.__search_engine(meta_info.get_name())
+                cacheman["tmdb_supply"].set(meta_info.get_name(), cache_name)
+            if cache_name:
+                log.info("【Meta】开始辅助查询：%s ..." % cache_name)
+                if is_movie:
+                    file_media_info = self.__search_tmdb(file_media_name=cache_name,
+                                                         search_type=MediaType.MOVIE)
+                else:
+                    file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
+        # 补全TMDB信息
+        if file_media_info and not file_media_info.get("genres"):
+            file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
+                                                 tmdbid=file_media_info.get("id"),
+                                                 chinese=chinese)
+        # 保存到缓存
+        if file_media_info is not None:
+            self.__insert_media_cache(media_key=media_key,
+                                      file_media_info=file_media_info)
+        return file_media_info
 
     @staticmethod
     def __dict_tmdbinfos(infos, mtype=None):
@@ -1,23 +1,64 @@
+import copy
 import os.path
+import threading
+
 import regex as re
 
 import log
 from app.helper import WordsHelper
 from app.media.meta.metaanime import MetaAnime
 from app.media.meta.metavideo import MetaVideo
+from app.utils.cache_manager import cacheman
 from app.utils.types import MediaType
 from config import RMT_MEDIAEXT
 
+# 识别结果缓存的命中统计
+_cache_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
 
 def MetaInfo(title, subtitle=None, mtype=None):
     """
     媒体整理入口，根据名称和副标题，判断是哪种类型的识别，返回对应对象
+    相同的名称、副标题、类型及识别词版本直接使用缓存的识别结果，返回的是副本
     :param title: 标题、种子名、文件名
     :param subtitle: 副标题、描述
     :param mtype: 指定识别类型，为空则自动识别类型
     :return: MetaAnime、MetaVideo
     """
+    cache_key = (title, subtitle, mtype, WordsHelper().version)
+    meta_info = cacheman["meta_info"].get(cache_key)
+    with _stats_lock:
+        _cache_stats["hits" if meta_info else "misses"] += 1
+    if not meta_info:
+        meta_info = _parse_meta_info(title, subtitle, mtype)
+        cacheman["meta_info"].set(cache_key, meta_info)
+    return _copy_meta_info(meta_info)
+
+
+def get_meta_cache_stats():
+    """
+    返回识别结果缓存的统计：命中数、未命中数、缓存数量
+    """
+    with _stats_lock:
+        return dict(_cache_stats, size=len(cacheman["meta_info"]))
+
 
+def _copy_meta_info(meta_info):
+    """
+    复制识别结果，调用方会修改返回的对象，容器类型的属性也需要复制
+    """
+    meta_copy = copy.copy(meta_info)
+    for key, value in meta_info.__dict__.items():
+        if isinstance(value, (list, dict, set)):
+            setattr(meta_copy, key, copy.copy(value))
+    return meta_copy
+
+
+def _parse_meta_info(title, subtitle=None, mtype=None):
+    """
+    识别名称和副标题
+    """
     # 应用自定义识别词
     title, msg, used_info = WordsHelper().process(title)
     if subtitle:
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
-import os
+import threading
 import time
-from functools import lru_cache
+from contextlib import contextmanager
 
 import requests
 import requests.exceptions
+from cacheout import LRUCache
+from requests.adapters import HTTPAdapter
 
 from .as_obj import AsObj
 from .exceptions import TMDbException
@@ -15,44 +18,77 @@ logger = logging.getLogger(__name__)
 
 
 class TMDb(object):
-    TMDB_API_KEY = "TMDB_API_KEY"
-    TMDB_LANGUAGE = "TMDB_LANGUAGE"
-    TMDB_WAIT_ON_RATE_LIMIT = "TMDB_WAIT_ON_RATE_LIMIT"
-    TMDB_DEBUG_ENABLED = "TMDB_DEBUG_ENABLED"
-    TMDB_CACHE_ENABLED = "TMDB_CACHE_ENABLED"
-    TMDB_PROXIES = "TMDB_PROXIES"
-    TMDB_DOMAIN = "TMDB_DOMAIN"
-    REQUEST_CACHE_MAXSIZE = 256
+    REQUEST_CACHE_MAXSIZE = 512
+    REQUEST_CACHE_TTL = 6 * 3600
+    REQUEST_POOL_MAXSIZE = 32
+
+    # 全局配置，所有实例共享
+    _settings = {
+        "api_key": None,
+        "domain": "https://api.themoviedb.org/3",
+        "language": "zh-CN",
+        "proxies": None,
+        "wait_on_rate_limit": True,
+        "debug": False,
+        "cache": True
+    }
+    # 分页信息及临时指定的语言按线程隔离，避免并发识别时相互覆盖
+    _local = threading.local()
+    # 共享的长连接会话
+    _shared_session = None
+    _session_lock = threading.Lock()
+    # 响应缓存，key中不包含api_key，值为JSON文本
+    _request_cache = LRUCache(maxsize=REQUEST_CACHE_MAXSIZE, ttl=REQUEST_CACHE_TTL, timer=time.time)
+    # 速率限制
+    _remaining = 40
+    _reset = None
+    # 统计
+    _stats_lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0, "rate_limit_sleeps": 0}
 
     def __init__(self, obj_cached=True, session=None):
-        self._session = requests.Session() if session is None else session
-        self._remaining = 40
-        self._reset = None
+        self._session = session
         self.obj_cached = obj_cached
-        if os.environ.get(self.TMDB_LANGUAGE) is None:
-            os.environ[self.TMDB_LANGUAGE] = "zh-CN"
-        if not os.environ.get(self.TMDB_DOMAIN):
-            os.environ[self.TMDB_DOMAIN] = "https://api.themoviedb.org/3"
+
+    @classmethod
+    def _get_session(cls):
+        if cls._shared_session is None:
+            with cls._session_lock:
+                if cls._shared_session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cls.REQUEST_POOL_MAXSIZE)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._shared_session = session
+        return cls._shared_session
+
+    @property
+    def session(self):
+        return self._session or self._get_session()
 
     @property
     def page(self):
-        return os.environ["page"]
+        return getattr(self._local, "page", None)
 
     @property
     def total_results(self):
-        return os.environ["total_results"]
+        return getattr(self._local, "total_results", None)
 
     @property
     def total_pages(self):
-        return os.environ["total_pages"]
+        return getattr(self._local, "total_pages", None)
 
     @property
     def api_key(self):
-        return os.environ.get(self.TMDB_API_KEY)
+        return self._settings.get("api_key")
+
+    @api_key.setter
+    def api_key(self, api_key):
+        self._settings["api_key"] = str(api_key)
 
     @property
     def domain(self):
-        return os.environ.get(self.TMDB_DOMAIN)
+        return self._settings.get("domain")
 
     @domain.setter
     def domain(self, domain):
@@ -61,71 +97,63 @@ class TMDb(object):
                 domain = "https://%s" % domain
             if not str(domain).endswith('/3'):
                 domain = "%s/3" % domain
-            os.environ[self.TMDB_DOMAIN] = str(domain)
+            self._settings["domain"] = str(domain)
         else:
-            os.environ[self.TMDB_DOMAIN] = ''
+            self._settings["domain"] = ''
 
     @property
     def proxies(self):
-        return os.environ.get(self.TMDB_PROXIES)
+        return self._settings.get("proxies")
 
     @proxies.setter
     def proxies(self, proxies):
         if proxies:
-            proxies_strs = []
-            for key, value in proxies.items():
-                if not value:
-                    continue
-                proxies_strs.append("'%s': '%s'" % (key, value))
-            if proxies_strs:
-                os.environ[self.TMDB_PROXIES] = "{%s}" % ",".join(proxies_strs)
-            else:
-                os.environ[self.TMDB_PROXIES] = 'None'
-
-    @api_key.setter
-    def api_key(self, api_key):
-        os.environ[self.TMDB_API_KEY] = str(api_key)
+            proxies = {key: value for key, value in proxies.items() if value}
+        self._settings["proxies"] = proxies or None
 
     @property
     def language(self):
-        return os.environ.get(self.TMDB_LANGUAGE)
+        return getattr(self._local, "language", None) or self._settings.get("language")
 
     @language.setter
     def language(self, language):
-        os.environ[self.TMDB_LANGUAGE] = language
+        self._settings["language"] = language
+
+    @contextmanager
+    def use_language(self, language):
+        """
+        当前线程临时使用指定的语言，退出时恢复
+        """
+        previous = getattr(self._local, "language", None)
+        self._local.language = language
+        try:
+            yield
+        finally:
+            self._local.language = previous
 
     @property
     def wait_on_rate_limit(self):
-        if os.environ.get(self.TMDB_WAIT_ON_RATE_LIMIT) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get("wait_on_rate_limit")
 
     @wait_on_rate_limit.setter
     def wait_on_rate_limit(self, wait_on_rate_limit):
-        os.environ[self.TMDB_WAIT_ON_RATE_LIMIT] = str(wait_on_rate_limit)
+        self._settings["wait_on_rate_limit"] = bool(wait_on_rate_limit)
 
     @property
     def debug(self):
-        if os.environ.get(self.TMDB_DEBUG_ENABLED) == "True":
-            return True
-        else:
-            return False
+        return self._settings.get("debug")
 
     @debug.setter
     def debug(self, debug):
-        os.environ[self.TMDB_DEBUG_ENABLED] = str(debug)
+        self._settings["debug"] = bool(debug)
 
     @property
     def cache(self):
-        if os.environ.get(self.TMDB_CACHE_ENABLED) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get("cache")
 
     @cache.setter
     def cache(self, cache):
-        os.environ[self.TMDB_CACHE_ENABLED] = str(cache)
+        self._settings["cache"] = bool(cache)
 
     @staticmethod
     def _get_obj(result, key="results", all_details=False):
@@ -136,13 +164,37 @@ class TMDb(object):
         else:
             return [AsObj(**res) for res in result[key]]
 
-    @staticmethod
-    @lru_cache(maxsize=REQUEST_CACHE_MAXSIZE)
-    def cached_request(method, url, data, proxies):
-        return requests.request(method, url, data=data, proxies=eval(proxies), verify=False, timeout=10)
+    @classmethod
+    def _count(cls, name):
+        with cls._stats_lock:
+            cls._stats[name] += 1
+
+    @classmethod
+    def cache_info(cls):
+        """
+        返回响应缓存命中、未命中及限流等待次数
+        """
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        stats["size"] = cls._request_cache.size()
+        stats["maxsize"] = cls._request_cache.maxsize
+        return stats
 
     def cache_clear(self):
-        return self.cached_request.cache_clear()
+        return self._request_cache.clear()
+
+    def _request(self, method, url, data):
+        req = self.session.request(method, url, data=data, proxies=self.proxies, timeout=10, verify=False)
+
+        headers = req.headers
+
+        if "X-RateLimit-Remaining" in headers:
+            TMDb._remaining = int(headers["X-RateLimit-Remaining"])
+
+        if "X-RateLimit-Reset" in headers:
+            TMDb._reset = int(headers["X-RateLimit-Reset"])
+
+        return req
 
     def _call(
             self, action, append_to_response, call_cached=True, method="GET", data=None
@@ -150,56 +202,57 @@ class TMDb(object):
         if self.api_key is None or self.api_key == "":
             raise TMDbException("No API key found.")
 
-        url = "%s%s?api_key=%s&%s&language=%s" % (
-            self.domain,
-            action,
-            self.api_key,
-            append_to_response,
-            self.language,
-        )
+        language = self.language
+        path = "%s?%s&language=%s" % (action, append_to_response, language)
+        url = "%s%s&api_key=%s" % (self.domain, path, self.api_key)
 
-        if self.cache and self.obj_cached and call_cached and method != "POST":
-            req = self.cached_request(method, url, data, self.proxies)
-        else:
-            req = self._session.request(method, url, data=data, proxies=eval(self.proxies), timeout=10, verify=False)
+        use_cache = self.cache and self.obj_cached and call_cached and method != "POST"
+        cache_key = (method, self.domain, path, data)
+        text = self._request_cache.get(cache_key) if use_cache else None
 
-        headers = req.headers
+        if text is not None:
+            self._count("hits")
+        else:
+            if use_cache:
+                self._count("misses")
 
-        if "X-RateLimit-Remaining" in headers:
-            self._remaining = int(headers["X-RateLimit-Remaining"])
+            req = self._request(method, url, data)
 
-        if "X-RateLimit-Reset" in headers:
-            self._reset = int(headers["X-RateLimit-Reset"])
+            if TMDb._remaining < 1:
+                current_time = int(time.time())
+                sleep_time = (TMDb._reset or current_time) - current_time
 
-        if self._remaining < 1:
-            current_time = int(time.time())
-            sleep_time = self._reset - current_time
+                if self.wait_on_rate_limit:
+                    logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
+                    self._count("rate_limit_sleeps")
+                    time.sleep(abs(sleep_time))
+                    TMDb._remaining = 40
+                    return self._call(action, append_to_response, call_cached, method, data)
+                else:
+                    raise TMDbException(
+                        "Rate limit reached. Try again in %d seconds." % sleep_time
+                    )
 
-            if self.wait_on_rate_limit:
-                logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
-                time.sleep(abs(sleep_time))
-                self._call(action, append_to_response, call_cached, method, data)
-            else:
-                raise TMDbException(
-                    "Rate limit reached. Try again in %d seconds." % sleep_time
-                )
+            text = req.text
+            if use_cache and req.status_code == 200:
+                self._request_cache.set(cache_key, text)
 
-        json = req.json()
+        json_data = json.loads(text)
 
-        if "page" in json:
-            os.environ["page"] = str(json["page"])
+        if "page" in json_data:
+            self._local.page = json_data["page"]
 
-        if "total_results" in json:
-            os.environ["total_results"] = str(json["total_results"])
+        if "total_results" in json_data:
+            self._local.total_results = json_data["total_results"]
 
-        if "total_pages" in json:
-            os.environ["total_pages"] = str(json["total_pages"])
+        if "total_pages" in json_data:
+            self._local.total_pages = json_data["total_pages"]
 
         if self.debug:
-            logger.info(json)
-            logger.info(self.cached_request.cache_info())
+            logger.info(json_data)
+            logger.info(self.cache_info())
 
-        if "errors" in json:
-            raise TMDbException(json["errors"])
+        if "errors" in json_data:
+            raise TMDbException(json_data["errors"])
 
-        return json
+        return json_data
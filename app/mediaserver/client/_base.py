@@ -93,10 +93,11 @@ class _IMediaClient(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_items(self, parent):
+    def get_items(self, parent, since=None):
         """
         获取媒体库中的所有媒体
         :param parent: 上一级的ID
+        :param since: 时间戳，只查询该时间之后新增或修改的项目
         """
         pass
 
@@ -1,7 +1,11 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
 import log
-from config import Config
+from config import Config, MEDIASYNC_PAGE_SIZE, MEDIASYNC_PAGE_THREADS
 from app.mediaserver.client._base import _IMediaClient
 from app.utils.types import MediaServerType
 from app.utils import RequestUtils, SystemUtils, ExceptionUtils
@@ -16,6 +20,7 @@ class Jellyfin(_IMediaClient):
     _host = None
     _user = None
     _libraries = []
+    _session = None
 
     def __init__(self, config=None):
         if config:
@@ -33,6 +38,7 @@ class Jellyfin(_IMediaClient):
                 if not self._host.endswith('/'):
                     self._host = self._host + "/"
             self._apikey = self._client_config.get('api_key')
+            self._session = requests.Session()
             if self._host and self._apikey:
                 self._user = self.get_admin_user()
 
@@ -374,48 +380,72 @@ class Jellyfin(_IMediaClient):
         req_url = "%sUsers/%s/Items/%s?api_key=%s" % (
             self._host, self._user, itemid, self._apikey)
         try:
-            res = RequestUtils().get_res(req_url)
+            res = RequestUtils(session=self._session).get_res(req_url)
             if res and res.status_code == 200:
                 return res.json()
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             return {}
 
-    def get_items(self, parent):
+    def get_items(self, parent, since=None):
         """
-        获取媒体服务器所有媒体库列表
+        获取媒体库中的所有电影及电视剧，按页递归查询，第一页之后的分页并发获取
+        :param parent: 媒体库ID
+        :param since: 时间戳，只查询该时间之后新增或修改的项目
         """
         if not parent:
-            yield {}
+            return
         if not self._host or not self._apikey:
-            yield {}
-        req_url = "%sUsers/%s/Items?parentId=%s&api_key=%s" % (self._host, self._user, parent, self._apikey)
+            return
+        results, total = self.__get_items_page(parent, 0, since)
+        starts = list(range(MEDIASYNC_PAGE_SIZE, total, MEDIASYNC_PAGE_SIZE))
+        if starts:
+            executor = ThreadPoolExecutor(max_workers=min(len(starts), MEDIASYNC_PAGE_THREADS))
+            futures = [executor.submit(self.__get_items_page, parent, start, since) for start in starts]
+            executor.shutdown(wait=False)
+        else:
+            futures = []
+        for future in [None] + futures:
+            if future:
+                results, _ = future.result()
+            if results is None:
+                # 数据不完整时中止，避免同步后丢失已有数据
+                raise Exception("媒体库 %s 数据获取失败" % parent)
+            for result in results:
+                if not result:
+                    continue
+                yield {"id": result.get("Id"),
+                       "library": parent,
+                       "type": result.get("Type"),
+                       "title": result.get("Name"),
+                       "originalTitle": result.get("OriginalTitle"),
+                       "year": result.get("ProductionYear"),
+                       "tmdbid": (result.get("ProviderIds") or {}).get("Tmdb"),
+                       "imdbid": (result.get("ProviderIds") or {}).get("Imdb"),
+                       "path": result.get("Path"),
+                       "json": str(result)}
+
+    def __get_items_page(self, parent, start, since=None):
+        """
+        分页查询媒体库中的电影及电视剧，只返回同步需要的字段
+        :return: 项目列表，总数；出错时项目列表为None
+        """
+        req_url = "%sUsers/%s/Items?parentId=%s&Recursive=true&IncludeItemTypes=Movie,Series" \
+                  "&Fields=ProviderIds,Path,OriginalTitle,ProductionYear&EnableImages=false&EnableUserData=false" \
+                  "&StartIndex=%s&Limit=%s&api_key=%s" % (self._host, self._user, parent,
+                                                         start, MEDIASYNC_PAGE_SIZE, self._apikey)
+        if since:
+            req_url += "&minDateLastSaved=%s" % time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(since))
         try:
-            res = RequestUtils().get_res(req_url)
+            res = RequestUtils(session=self._session).get_res(req_url)
             if res and res.status_code == 200:
-                results = res.json().get("Items") or []
-                for result in results:
-                    if not result:
-                        continue
-                    if result.get("Type") in ["Movie", "Series"]:
-                        item_info = self.get_iteminfo(result.get("Id"))
-                        yield {"id": result.get("Id"),
-                               "library": item_info.get("ParentId"),
-                               "type": item_info.get("Type"),
-                               "title": item_info.get("Name"),
-                               "originalTitle": item_info.get("OriginalTitle"),
-                               "year": item_info.get("ProductionYear"),
-                               "tmdbid": item_info.get("ProviderIds", {}).get("Tmdb"),
-                               "imdbid": item_info.get("ProviderIds", {}).get("Imdb"),
-                               "path": item_info.get("Path"),
-                               "json": str(item_info)}
-                    elif "Folder" in result.get("Type"):
-                        for item in self.get_items(result.get("Id")):
-                            yield item
+                result = res.json()
+                return result.get("Items") or [], result.get("TotalRecordCount") or 0
+            log.error(f"【{self.server_type}】Users/Items 未获取到返回数据")
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             log.error(f"【{self.server_type}】连接Users/Items出错：" + str(e))
-        yield {}
+        return None, 0
 
     def get_playing_sessions(self):
         """
@@ -2,7 +2,8 @@ from app.utils import ExceptionUtils
 from app.utils.types import MediaServerType
 
 import log, os
-from config import Config
+from datetime import datetime
+from config import Config, MEDIASYNC_PAGE_SIZE
 from app.mediaserver.client._base import _IMediaClient
 from plexapi.myplex import MyPlexAccount
 from plexapi.server import PlexServer
@@ -186,9 +187,11 @@ class Plex(_IMediaClient):
             libraries.append({"id": library.key, "name": library.title})
         return libraries
 
-    def get_items(self, parent):
+    def get_items(self, parent, since=None):
         """
-        获取媒体服务器所有媒体库列表
+        获取媒体库中的所有媒体
+        :param parent: 媒体库ID
+        :param since: 时间戳，只查询该时间之后新增或修改的项目
         """
         if not parent:
             yield {}
@@ -197,7 +200,9 @@ class Plex(_IMediaClient):
         try:
             section = self._plex.library.sectionByID(parent)
             if section:
-                for item in section.all():
+                # 加大每页数量，减少分页请求次数
+                filters = {"updatedAt>>": datetime.fromtimestamp(since)} if since else {}
+                for item in section.all(container_size=MEDIASYNC_PAGE_SIZE, **filters):
                     if not item:
                         continue
                     yield {"id": item.key,
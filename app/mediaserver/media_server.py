@@ -1,4 +1,5 @@
 import threading
+import time
 
 import log
 from app.conf import ModuleConf
@@ -7,10 +8,11 @@ from app.helper import ProgressHelper, SubmoduleHelper
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaServerType
-from config import Config
+from config import Config, MEDIASYNC_BATCH_SIZE, MEDIASYNC_WATERMARK_OVERLAP
 
 lock = threading.Lock()
 server_lock = threading.Lock()
+index_lock = threading.Lock()
 
 
 @singleton
@@ -20,6 +22,8 @@ class MediaServer:
     _server = None
     mediadb = None
     progress = None
+    # 登记薄的内存索引：(TMDBID集合, {标题: {年份: TMDBID集合}})，为空时下次查询重建
+    _item_index = None
 
     def __init__(self):
         self._mediaserver_schemas = SubmoduleHelper.import_submodules(
@@ -36,6 +40,7 @@ class MediaServer:
         _type = Config().get_config('media').get('media_server') or 'emby'
         self._server_type = ModuleConf.MEDIASERVER_DICT.get(_type)
         self._server = None
+        self.__clear_index()
 
     def __build_class(self, ctype, conf):
         for mediaserver_schema in self._mediaserver_schemas:
@@ -169,71 +174,269 @@ class MediaServer:
         if self.server and self._server_type == MediaServerType.PLEX:
             self.server.update_section_by_items(items)
 
-    def get_items(self, parent):
+    def get_items(self, parent, since=None):
         """
         获取媒体库中的所有媒体
         :param parent: 上一级的ID
+        :param since: 时间戳，只查询该时间之后新增或修改的项目
         """
         if not self.server:
             return []
-        return self.server.get_items(parent)
+        return self.server.get_items(parent, since=since)
 
     def sync_mediaserver(self):
         """
-        同步媒体库所有数据到本地数据库
+        同步媒体库所有数据到本地数据库，全量重建，同时作为增量同步的一致性校验
         """
         if not self.server:
             return
         with lock:
-            # 开始进度条
-            log.info("【MediaServer】开始同步媒体库数据...")
-            self.progress.start("mediasync")
-            self.progress.update(ptype="mediasync", text="请稍候...")
-            # 汇总统计
-            medias_count = self.get_medias_count()
-            total_media_count = medias_count.get("MovieCount") + medias_count.get("SeriesCount")
-            total_count = 0
-            movie_count = 0
-            tv_count = 0
-            # 清空登记薄
-            self.mediadb.empty()
-            for library in self.get_libraries():
+            self.__sync_full()
+
+    def sync_mediaserver_incremental(self):
+        """
+        增量同步媒体库数据，只查询各媒体库上次同步之后新增或修改的项目，
+        删除的项目由Webhook事件及定期的全量同步处理，有媒体库未同步过时执行全量同步
+        """
+        if not self.server:
+            return
+        with lock:
+            server_type = self._server_type.value
+            watermarks = self.mediadb.get_watermarks(server_type)
+            libraries = self.get_libraries()
+            if not watermarks or any(str(library.get("id")) not in watermarks for library in libraries):
+                self.__sync_full()
+                return
+            log.info("【MediaServer】开始增量同步媒体库数据...")
+            start_time = time.time()
+            sync_count = 0
+            new_watermarks = {}
+            for library in libraries:
+                library_id = str(library.get("id"))
+                # 往前多查询一段时间，避免两端时钟误差漏掉项目
+                since = watermarks.get(library_id) - MEDIASYNC_WATERMARK_OVERLAP
+                items = []
+                try:
+                    for item in self.get_items(library.get("id"), since=since):
+                        if not item:
+                            continue
+                        items.append(item)
+                        if len(items) >= MEDIASYNC_BATCH_SIZE:
+                            sync_count += self.__upsert_library_items(library.get("name"), items)
+                            items.clear()
+                    if items:
+                        sync_count += self.__upsert_library_items(library.get("name"), items)
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    log.error("【MediaServer】媒体库 %s 增量同步失败：%s" % (library.get("name"), str(e)))
+                    continue
+                # 该媒体库全部写入成功才推进同步时间，失败时下次从原同步时间重新查询
+                new_watermarks[library_id] = start_time
+            self.mediadb.update_watermarks(server_type, new_watermarks)
+            self.__clear_index()
+            self.__update_statistics()
+            log.info("【MediaServer】媒体库数据增量同步完成，更新数量：%s，耗时：%s 秒" % (
+                sync_count, round(time.time() - start_time, 1)))
+
+    def __upsert_library_items(self, library_name, items):
+        """
+        增量同步时写入一批项目，写入失败时抛出异常
+        """
+        count = self.mediadb.upsert_items(self._server_type.value, items)
+        if count is None:
+            raise Exception("%s 数据写入登记薄失败" % library_name)
+        return count
+
+    def has_item(self, item_id):
+        """
+        本地登记薄中是否已有该项目
+        """
+        if not self._server_type:
+            return False
+        return self.mediadb.has_item(self._server_type.value, item_id)
+
+    def update_items(self, items, replace=True):
+        """
+        登记媒体服务器新增的项目，用于Webhook事件
+        :param items: 项目列表，格式与get_items返回的一致
+        :param replace: 已存在时是否替换
+        """
+        if not self._server_type or not items:
+            return
+        if self.mediadb.upsert_items(self._server_type.value, items, replace=replace):
+            self.__clear_index()
+            self.__update_statistics()
+
+    def delete_items(self, item_ids):
+        """
+        删除媒体服务器已删除的项目，用于Webhook事件
+        :param item_ids: 项目ID列表
+        """
+        if not self._server_type or not item_ids:
+            return
+        if self.mediadb.delete_items(self._server_type.value, item_ids):
+            self.__clear_index()
+            self.__update_statistics()
+
+    def __update_statistics(self):
+        """
+        按登记薄重新统计同步情况
+        """
+        total_count, movie_count, tv_count = self.mediadb.get_item_counts(self._server_type.value)
+        self.mediadb.statistics(server_type=self._server_type.value,
+                                total_count=total_count,
+                                movie_count=movie_count,
+                                tv_count=tv_count)
+
+    def __sync_full(self):
+        """
+        全量同步，所有项目写入暂存表后替换登记薄，并记录各媒体库的同步时间
+        """
+        # 开始进度条
+        log.info("【MediaServer】开始同步媒体库数据...")
+        self.progress.start("mediasync")
+        self.progress.update(ptype="mediasync", text="请稍候...")
+        # 汇总统计
+        medias_count = self.get_medias_count()
+        total_media_count = medias_count.get("MovieCount") + medias_count.get("SeriesCount")
+        total_count = 0
+        movie_count = 0
+        tv_count = 0
+        # 先写入暂存表，同步期间原数据仍可查询
+        if not self.mediadb.begin_sync():
+            self.progress.end("mediasync")
+            log.error("【MediaServer】媒体库数据同步失败：无法创建暂存表")
+            return
+        start_time = time.time()
+        items = []
+
+        def __flush_items(library_name):
+            nonlocal total_count
+            count = self.mediadb.insert_staging(self._server_type.value, items)
+            if count is None:
+                # 有数据未写入时放弃本次同步，保留原登记薄
+                raise Exception("%s 数据写入暂存表失败" % library_name)
+            total_count += count
+            items.clear()
+            speed = round(total_count / max(time.time() - start_time, 0.001))
+            self.progress.update(ptype="mediasync",
+                                 text="正在同步 %s，已完成：%s / %s，%s 条/秒 ..." % (
+                                     library_name, total_count, total_media_count, speed),
+                                 value=round(100 * total_count / total_media_count, 1)
+                                 if total_media_count else 0)
+
+        libraries = self.get_libraries()
+        try:
+            for library in libraries:
                 # 获取媒体库所有项目
                 self.progress.update(ptype="mediasync",
                                      text="正在获取 %s 数据..." % (library.get("name")))
                 for item in self.get_items(library.get("id")):
                     if not item:
                         continue
-                    if self.mediadb.insert(self._server_type.value, item):
-                        total_count += 1
-                        if item.get("type") in ['Movie', 'movie']:
-                            movie_count += 1
-                        elif item.get("type") in ['Series', 'show']:
-                            tv_count += 1
-                        self.progress.update(ptype="mediasync",
-                                             text="正在同步 %s，已完成：%s / %s ..." % (
-                                                 library.get("name"), total_count, total_media_count),
-                                             value=round(100 * total_count / total_media_count, 1))
-            # 更新总体同步情况
-            self.mediadb.statistics(server_type=self._server_type.value,
-                                    total_count=total_count,
-                                    movie_count=movie_count,
-                                    tv_count=tv_count)
-            # 结束进度条
-            self.progress.update(ptype="mediasync",
-                                 value=100,
-                                 text="媒体库数据同步完成，同步数量：%s" % total_count)
+                    items.append(item)
+                    if item.get("type") in ['Movie', 'movie']:
+                        movie_count += 1
+                    elif item.get("type") in ['Series', 'show']:
+                        tv_count += 1
+                    if len(items) >= MEDIASYNC_BATCH_SIZE:
+                        __flush_items(library.get("name"))
+                if items:
+                    __flush_items(library.get("name"))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.mediadb.abort_sync()
+            self.progress.end("mediasync")
+            log.error("【MediaServer】媒体库数据同步失败：%s" % str(e))
+            return
+        # 替换登记薄
+        if not self.mediadb.finish_sync():
+            self.mediadb.abort_sync()
             self.progress.end("mediasync")
-            log.info("【MediaServer】媒体库数据同步完成，同步数量：%s" % total_count)
+            log.error("【MediaServer】媒体库数据同步失败：无法替换登记薄")
+            return
+        self.__clear_index()
+        # 记录同步时间，之后的增量同步从此开始
+        self.mediadb.update_watermarks(self._server_type.value,
+                                       {str(library.get("id")): start_time for library in libraries},
+                                       clear=True)
+        # 更新总体同步情况
+        self.mediadb.statistics(server_type=self._server_type.value,
+                                total_count=total_count,
+                                movie_count=movie_count,
+                                tv_count=tv_count)
+        # 结束进度条
+        self.progress.update(ptype="mediasync",
+                             value=100,
+                             text="媒体库数据同步完成，同步数量：%s" % total_count)
+        self.progress.end("mediasync")
+        log.info("【MediaServer】媒体库数据同步完成，同步数量：%s，耗时：%s 秒" % (
+            total_count, round(time.time() - start_time, 1)))
 
     def check_item_exists(self, title, year=None, tmdbid=None):
         """
         检查媒体库是否已存在某项目，非实时同步数据，仅用于展示
         """
-        return self.mediadb.exists(server_type=self._server_type.value,
-                                   title=title,
-                                   year=year,
-                                   tmdbid=tmdbid)
+        return self.check_items_exists([(title, year, tmdbid)])[0]
+
+    def check_items_exists(self, items):
+        """
+        批量检查媒体库是否已存在项目，只查询内存索引，用于一页媒体的展示
+        :param items: [(标题, 年份, TMDBID)]
+        :return: 与items一一对应的是否存在
+        """
+        tmdbids, titles = self.__get_index()
+        results = []
+        for title, year, tmdbid in items:
+            if not title:
+                results.append(False)
+                continue
+            if tmdbid and str(tmdbid) in tmdbids:
+                results.append(True)
+                continue
+            # 与登记薄查询一致，标题精确匹配
+            years = titles.get(title)
+            if not years:
+                results.append(False)
+                continue
+            if year:
+                item_tmdbids = years.get(str(year))
+            else:
+                item_tmdbids = set().union(*years.values())
+            if not item_tmdbids:
+                results.append(False)
+            elif tmdbid:
+                # 同名项目中有未刮削TMDBID的也视为存在
+                results.append("" in item_tmdbids)
+            else:
+                results.append(True)
+        return results
+
+    def __get_index(self):
+        """
+        获取登记薄的内存索引，没有时从数据库建立
+        """
+        with index_lock:
+            if self._item_index is None:
+                tmdbids = set()
+                titles = {}
+                if self._server_type:
+                    for title, year, tmdbid in self.mediadb.get_index_items(self._server_type.value):
+                        tmdbid = str(tmdbid) if tmdbid else ""
+                        if tmdbid:
+                            tmdbids.add(tmdbid)
+                        if title:
+                            titles.setdefault(title, {}).setdefault(
+                                str(year) if year else "", set()).add(tmdbid)
+                self._item_index = (tmdbids, titles)
+            return self._item_index
+
+    def __clear_index(self):
+        """
+        登记薄变化后清除内存索引
+        """
+        with index_lock:
+            self._item_index = None
 
     def get_mediasync_status(self):
         """
@@ -1,8 +1,10 @@
 import time
 
+import log
 from app.message import Message
 from app.mediaserver import MediaServer
 from app.media import Media
+from app.utils.types import MediaServerType
 from web.backend.web_utils import WebUtils
 
 
@@ -82,10 +84,79 @@ class WebhookEvent:
 
         return eventItem
 
+    @staticmethod
+    def __get_sync_item(item_info, library=None):
+        """
+        Emby、Jellyfin项目详情转换为媒体库登记薄的格式
+        """
+        if not item_info:
+            return None
+        return {"id": item_info.get("Id"),
+                "library": library,
+                "type": item_info.get("Type"),
+                "title": item_info.get("Name"),
+                "originalTitle": item_info.get("OriginalTitle"),
+                "year": item_info.get("ProductionYear"),
+                "tmdbid": (item_info.get("ProviderIds") or {}).get("Tmdb"),
+                "imdbid": (item_info.get("ProviderIds") or {}).get("Imdb"),
+                "path": item_info.get("Path")}
+
+    def __sync_library_item(self, server_type, event, item_id, item_type, item_info=None):
+        """
+        按媒体库新增、删除事件更新本地登记薄，剧集只在电视剧未登记时登记电视剧
+        :param server_type: 发送事件的媒体服务器类型，与当前使用的媒体服务器不一致时忽略
+        :param event: new 新增、deleted 删除
+        :param item_id: 电影、电视剧ID，剧集为所属电视剧的ID
+        :param item_type: 项目类型
+        :param item_info: 已转换为登记薄格式的项目信息，为空时从媒体服务器查询
+        """
+        if not item_id or self.mediaserver.get_type() != server_type:
+            return
+        if event == "deleted":
+            if item_type in ["Movie", "Series", "movie", "show"]:
+                log.info("【MediaServer】媒体库删除项目：%s" % item_id)
+                self.mediaserver.delete_items([item_id])
+            return
+        replace = item_type in ["Movie", "Series", "movie", "show"]
+        if not replace and self.mediaserver.has_item(item_id):
+            return
+        if not item_info:
+            item_info = self.__get_sync_item(self.mediaserver.get_iteminfo(item_id))
+        if item_info and item_info.get("id"):
+            log.info("【MediaServer】媒体库新增项目：%s" % item_info.get("title"))
+            self.mediaserver.update_items([item_info], replace=replace)
+
     def plex_action(self, message):
         """
         执行Plex webhook动作
         """
+        if message.get("event") == "library.new":
+            metadata = message.get("Metadata") or {}
+            tmdbid = None
+            for guid in metadata.get("Guid") or []:
+                if str(guid.get("id")).startswith("tmdb://"):
+                    tmdbid = str(guid.get("id"))[7:]
+            if metadata.get("type") in ["movie", "show"]:
+                # 与plexapi一致，电视剧的key去掉/children
+                item_key = str(metadata.get("key") or "").replace("/children", "")
+                self.__sync_library_item(MediaServerType.PLEX, "new", item_key, metadata.get("type"),
+                                         {"id": item_key,
+                                          "library": metadata.get("librarySectionID"),
+                                          "type": metadata.get("type"),
+                                          "title": metadata.get("title"),
+                                          "year": metadata.get("year"),
+                                          "tmdbid": tmdbid})
+            elif metadata.get("type") in ["season", "episode"]:
+                series_key = metadata.get("parentKey") if metadata.get("type") == "season" \
+                    else metadata.get("grandparentKey")
+                series_title = metadata.get("parentTitle") if metadata.get("type") == "season" \
+                    else metadata.get("grandparentTitle")
+                self.__sync_library_item(MediaServerType.PLEX, "new", series_key, metadata.get("type"),
+                                         {"id": series_key,
+                                          "library": metadata.get("librarySectionID"),
+                                          "type": "show",
+                                          "title": series_title})
+            return
         event_info = self.__parse_plex_msg(message)
         if event_info.get("event") in ["media.play", "media.stop"]:
             self.send_webhook_message(event_info, 'plex')
@@ -94,6 +165,13 @@ class WebhookEvent:
         """
         执行Jellyfin webhook动作
         """
+        if message.get("NotificationType") in ["ItemAdded", "ItemDeleted"]:
+            item_type = message.get("ItemType")
+            item_id = message.get("SeriesId") if item_type in ["Season", "Episode"] else message.get("ItemId")
+            self.__sync_library_item(MediaServerType.JELLYFIN,
+                                     "new" if message.get("NotificationType") == "ItemAdded" else "deleted",
+                                     item_id, item_type)
+            return
         event_info = self.__parse_jellyfin_msg(message)
         if event_info.get("event") in ["PlaybackStart", "PlaybackStop"]:
             self.send_webhook_message(event_info, 'jellyfin')
@@ -102,6 +180,16 @@ class WebhookEvent:
         """
         执行Emby webhook动作
         """
+        if message.get("Event") in ["library.new", "library.deleted"]:
+            item = message.get("Item") or {}
+            item_type = item.get("Type")
+            if item_type in ["Season", "Episode"]:
+                self.__sync_library_item(MediaServerType.EMBY, message.get("Event")[8:],
+                                         item.get("SeriesId"), item_type)
+            else:
+                self.__sync_library_item(MediaServerType.EMBY, message.get("Event")[8:],
+                                         item.get("Id"), item_type, self.__get_sync_item(item))
+            return
         event_info = self.__parse_emby_msg(message)
         if event_info.get("event") == "system.webhooktest":
             return
@@ -1,20 +1,26 @@
+import queue
 import re
-import xml.dom.minidom
+import time
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 
 import log
 from app.downloader import Downloader
 from app.filter import Filter
-from app.helper import DbHelper
+from app.helper import DbHelper, RssHelper
 from app.media import Media
 from app.media.meta import MetaInfo
 from app.sites import Sites
 from app.subscribe import Subscribe
-from app.utils import DomUtils, RequestUtils, StringUtils, ExceptionUtils, RssTitleUtils, Torrent
+from app.utils import FeedUtils, RequestUtils, StringUtils, ExceptionUtils, RssTitleUtils, Torrent
 from app.utils.types import MediaType, SearchType
-from config import Config
+from config import Config, RSS_FETCH_THREADS, RSS_SITE_TIMEOUT, RSS_UNMATCHED_TTL
 
 lock = Lock()
+feed_lock = Lock()
+
+# RSS条件请求的校验信息及上次解析结果
+_feed_caches = {}
 
 
 class Rss:
@@ -24,6 +30,7 @@ class Rss:
     downloader = None
     searcher = None
     dbhelper = None
+    rsshelper = None
     subscribe = None
 
     def __init__(self):
@@ -32,6 +39,7 @@ class Rss:
         self.sites = Sites()
         self.filter = Filter()
         self.dbhelper = DbHelper()
+        self.rsshelper = RssHelper()
         self.subscribe = Subscribe()
         self.init_config()
 
@@ -90,11 +98,8 @@ class Rss:
             else:
                 check_sites = list(set(check_sites))
 
-            # 匹配到的资源列表
-            rss_download_torrents = []
-            # 缺失的资源详情
-            rss_no_exists = {}
-            # 遍历站点资源
+            # 需要处理的站点
+            rss_sites = []
             for site_info in self._sites:
                 if not site_info:
                     continue
@@ -104,200 +109,324 @@ class Rss:
                 if check_sites and site_name not in check_sites:
                     continue
                 # 站点rss链接
-                rss_url = site_info.get("rssurl")
-                if not rss_url:
+                if not site_info.get("rssurl"):
                     log.info(f"【Rss】{site_name} 未配置rssurl，跳过...")
                     continue
-                site_cookie = site_info.get("cookie")
-                site_ua = site_info.get("ua")
-                # 是否解析种子详情
-                site_parse = site_info.get("parse")
-                # 是否使用代理
-                site_proxy = site_info.get("proxy")
-                # 使用的规则
-                site_fliter_rule = site_info.get("rule")
-                # 开始下载RSS
-                log.info(f"【Rss】正在处理：{site_name}")
-                if site_info.get("pri"):
-                    site_order = 100 - int(site_info.get("pri"))
-                else:
-                    site_order = 0
-                rss_acticles = self.parse_rssxml(rss_url, site_proxy)
-                if not rss_acticles:
-                    log.warn(f"【Rss】{site_name} 未下载到数据")
-                    continue
-                else:
-                    log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}")
-                # 处理RSS结果
-                res_num = 0
-                for article in rss_acticles:
-                    try:
-                        # 种子名
-                        title = article.get('title')
-                        # 种子链接
-                        enclosure = article.get('enclosure')
-                        # 种子页面
-                        page_url = article.get('link')
-                        # 种子大小
-                        size = article.get('size')
-                        # 开始处理
-                        log.info(f"【Rss】开始处理：{title}")
-                        # 检查这个种子是不是下过了
-                        if self.dbhelper.is_torrent_rssd(enclosure):
-                            log.info(f"【Rss】{title} 已成功订阅过")
-                            continue
-                        # 识别种子名称，开始检索TMDB
-                        media_info = MetaInfo(title=title)
-                        cache_info = self.media.get_cache_info(media_info)
-                        if cache_info.get("id"):
-                            # 使用缓存信息
-                            media_info.tmdb_id = cache_info.get("id")
-                            media_info.type = cache_info.get("type")
-                            media_info.title = cache_info.get("title")
-                            media_info.year = cache_info.get("year")
-                        else:
-                            # 重新查询TMDB
-                            media_info = self.media.get_media_info(title=title)
-                            if not media_info:
-                                log.warn(f"【Rss】{title} 无法识别出媒体信息！")
-                                continue
-                            elif not media_info.tmdb_info:
-                                log.info(f"【Rss】{title} 识别为 {media_info.get_name()} 未匹配到TMDB媒体信息")
-                        # 大小及种子页面
-                        media_info.set_torrent_info(size=size,
-                                                    page_url=page_url,
-                                                    site=site_name,
-                                                    site_order=site_order,
-                                                    enclosure=enclosure)
-                        # 检查种子是否匹配订阅，返回匹配到的订阅ID、是否洗版、总集数、上传因子、下载因子
-                        match_flag, match_msg, match_info = self.check_torrent_rss(
-                            media_info=media_info,
-                            rss_movies=rss_movies,
-                            rss_tvs=rss_tvs,
-                            site_filter_rule=site_fliter_rule,
-                            site_cookie=site_cookie,
-                            site_parse=site_parse,
-                            site_ua=site_ua,
-                            site_proxy=site_proxy)
-                        for msg in match_msg:
-                            log.info(f"【Rss】{msg}")
-
-                        # 未匹配
-                        if not match_flag:
-                            continue
+                rss_sites.append(site_info)
+            if not rss_sites:
+                return
 
-                        # 非模糊匹配命中，检查本地情况，检查删除订阅
-                        if not match_info.get("fuzzy_match"):
-                            # 匹配到订阅，如没有TMDB信息则重新查询
-                            if not media_info.tmdb_info and media_info.tmdb_id:
-                                media_info.set_tmdb_info(self.media.get_tmdb_info(mtype=media_info.type,
-                                                                                  tmdbid=media_info.tmdb_id))
-                            if not media_info.tmdb_info:
-                                continue
-                            # 非洗版时检查本地是否存在
-                            if not match_info.get("over_edition"):
-                                if media_info.type == MediaType.MOVIE:
-                                    exist_flag, rss_no_exists, _ = self.downloader.check_exists_medias(
-                                        meta_info=media_info,
-                                        no_exists=rss_no_exists
-                                    )
-                                else:
-                                    # 从登记薄中获取缺失剧集
-                                    season = 1
-                                    if match_info.get("season"):
-                                        season = int(str(match_info.get("season")).replace("S", ""))
-                                    # 设定的总集数
-                                    total_ep = match_info.get("total")
-                                    # 设定的开始集数
-                                    current_ep = match_info.get("current_ep")
-                                    # 表登记的缺失集数
-                                    episodes = self.subscribe.get_subscribe_tv_episodes(match_info.get("id"))
-                                    if episodes is None:
-                                        episodes = []
-                                        if current_ep:
-                                            episodes = list(range(int(current_ep), int(total_ep) + 1))
-                                        rss_no_exists[media_info.tmdb_id] = [
-                                            {
-                                                "season": season,
-                                                "episodes": episodes,
-                                                "total_episodes": total_ep
-                                            }
-                                        ]
-                                    else:
-                                        rss_no_exists[media_info.tmdb_id] = [
-                                            {
-                                                "season": season,
-                                                "episodes": episodes,
-                                                "total_episodes": total_ep
-                                            }
-                                        ]
-                                    # 检查本地媒体库情况
-                                    exist_flag, library_no_exists, _ = self.downloader.check_exists_medias(
-                                        meta_info=media_info,
-                                        total_ep={season: total_ep}
-                                    )
-                                    # 取交集做为缺失集
-                                    rss_no_exists = Torrent.get_intersection_episodes(target=rss_no_exists,
-                                                                                      source=library_no_exists,
-                                                                                      title=media_info.tmdb_id)
-                                    if rss_no_exists.get(media_info.tmdb_id):
-                                        log.info("【Rss】%s 订阅缺失季集：%s" % (
-                                            media_info.get_title_string(),
-                                            rss_no_exists.get(media_info.tmdb_id)
-                                        ))
-                                # 本地已存在
-                                if exist_flag:
-                                    continue
-                            # 洗版模式
-                            else:
-                                # 洗版时季集不完整的资源不要
-                                if media_info.type != MediaType.MOVIE \
-                                        and media_info.get_episode_list():
-                                    log.info(
-                                        f"【Rss】{media_info.get_title_string()}{media_info.get_season_string()} "
-                                        f"正在洗版，过滤掉季集不完整的资源：{title}"
-                                    )
-                                    continue
-                                if not self.subscribe.check_subscribe_over_edition(
-                                        rtype=media_info.type,
-                                        rssid=match_info.get("id"),
-                                        res_order=match_info.get("res_order")):
-                                    log.info(
-                                        f"【Rss】{media_info.get_title_string()}{media_info.get_season_string()} "
-                                        f"正在洗版，跳过低优先级或同优先级资源：{title}"
-                                    )
-                                    continue
-                        # 模糊匹配
-                        else:
-                            # 不做处理，直接下载
-                            pass
-
-                        # 设置种子信息
-                        media_info.set_torrent_info(res_order=match_info.get("res_order"),
-                                                    filter_rule=match_info.get("filter_rule"),
-                                                    over_edition=match_info.get("over_edition"),
-                                                    download_volume_factor=match_info.get("download_volume_factor"),
-                                                    upload_volume_factor=match_info.get("upload_volume_factor"),
-                                                    rssid=match_info.get("id"))
-                        # 设置下载参数
-                        media_info.set_download_info(download_setting=match_info.get("download_setting"),
-                                                     save_path=match_info.get("save_path"))
-                        # 插入数据库历史记录
-                        self.dbhelper.insert_rss_torrents(media_info)
-                        # 加入下载列表
-                        if media_info not in rss_download_torrents:
-                            rss_download_torrents.append(media_info)
-                            res_num = res_num + 1
-                    except Exception as e:
-                        ExceptionUtils.exception_traceback(e)
-                        log.error("【Rss】处理RSS发生错误：%s" % str(e))
-                        continue
-                log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源" % (site_name, res_num))
+            # 订阅或过滤规则变化后站点已处理过的种子需要重新匹配
+            rss_fingerprint = RssHelper.get_fingerprint(rss_movies, rss_tvs, self.filter.get_rule_infos())
+
+            # 匹配到的资源列表
+            rss_download_torrents = []
+            # 缺失的资源详情
+            rss_no_exists = {}
+            # 各站点并发下载解析识别，识别结果经队列交给当前线程串行匹配
+            article_queue = queue.Queue()
+            executor = ThreadPoolExecutor(max_workers=min(len(rss_sites), RSS_FETCH_THREADS))
+            for site_info in rss_sites:
+                executor.submit(self.__rss_site_worker, site_info, rss_fingerprint, article_queue)
+            executor.shutdown(wait=False)
+            # 各站点匹配耗时及匹配数
+            match_times = {}
+            match_nums = {}
+            # 各站点未匹配的种子
+            unmatched_articles = {}
+            pending_sites = len(rss_sites)
+            while pending_sites:
+                site_info, article, media_info, timings = article_queue.get()
+                site_name = site_info.get("name")
+                # 站点处理结束
+                if timings is not None:
+                    pending_sites -= 1
+                    # 未匹配的种子一段时间内不再处理，媒体库及TMDB识别结果会变化，不持久化
+                    # 站点需解析种子详情时促销等属性会变化，不记录
+                    if not site_info.get("parse"):
+                        self.rsshelper.mark_articles_seen(feed=self.__get_rss_feed(site_info),
+                                                          articles=unmatched_articles.get(site_name),
+                                                          fingerprint=self.__get_rss_fingerprint(
+                                                              site_info, rss_fingerprint),
+                                                          ttl=RSS_UNMATCHED_TTL)
+                    log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源，"
+                             "下载 %.2f 秒，解析 %.2f 秒，识别 %.2f 秒，匹配 %.2f 秒" % (
+                                 site_name,
+                                 match_nums.get(site_name, 0),
+                                 timings.get("fetch", 0),
+                                 timings.get("parse", 0),
+                                 timings.get("identify", 0),
+                                 match_times.get(site_name, 0)))
+                    continue
+                match_start = time.time()
+                try:
+                    matched, rss_no_exists = self.__match_rss_article(title=article.get('title'),
+                                                                      media_info=media_info,
+                                                                      site_info=site_info,
+                                                                      rss_movies=rss_movies,
+                                                                      rss_tvs=rss_tvs,
+                                                                      rss_no_exists=rss_no_exists,
+                                                                      rss_download_torrents=rss_download_torrents)
+                    if matched:
+                        match_nums[site_name] = match_nums.get(site_name, 0) + 1
+                    else:
+                        unmatched_articles.setdefault(site_name, []).append(article)
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    log.error("【Rss】处理RSS发生错误：%s" % str(e))
+                match_times[site_name] = match_times.get(site_name, 0) + time.time() - match_start
             log.info("【Rss】所有RSS处理结束，共 %s 个有效资源" % len(rss_download_torrents))
             # 开始择优下载
             self.download_rss_torrent(rss_download_torrents=rss_download_torrents,
                                       rss_no_exists=rss_no_exists)
 
+    @staticmethod
+    def __get_rss_feed(site_info):
+        """
+        站点RSS在已处理记录中的标识
+        """
+        return "rss:%s" % site_info.get("id")
+
+    @staticmethod
+    def __get_rss_fingerprint(site_info, rss_fingerprint):
+        """
+        站点RSS的处理条件指纹，订阅或站点过滤规则变化时变化
+        """
+        return RssHelper.get_fingerprint(rss_fingerprint, site_info.get("rssurl"), site_info.get("rule"))
+
+    def __rss_site_worker(self, site_info, rss_fingerprint, article_queue):
+        """
+        下载、解析单个站点的RSS并识别种子，识别结果逐条放入队列，结束时放入该站点的耗时统计
+        """
+        site_name = site_info.get("name")
+        rss_feed = self.__get_rss_feed(site_info)
+        fingerprint = self.__get_rss_fingerprint(site_info, rss_fingerprint)
+        timings = {}
+        try:
+            log.info(f"【Rss】正在处理：{site_name}")
+            if site_info.get("pri"):
+                site_order = 100 - int(site_info.get("pri"))
+            else:
+                site_order = 0
+            # 下载RSS
+            start_time = time.time()
+            rss_url = site_info.get("rssurl")
+            rss_res = self.__get_rss_res(rss_url, site_info.get("proxy"), timeout=RSS_SITE_TIMEOUT)
+            timings["fetch"] = time.time() - start_time
+            # 解析RSS，边读取边解析
+            start_time = time.time()
+            rss_acticles = self.__parse_rss_res(rss_url, rss_res,
+                                                timeout=max(RSS_SITE_TIMEOUT - timings["fetch"], 0))
+            timings["parse"] = time.time() - start_time
+            if not rss_acticles:
+                log.warn(f"【Rss】{site_name} 未下载到数据")
+                return
+            # 剔除上次已处理过的种子
+            new_acticles = self.rsshelper.filter_new_articles(feed=rss_feed,
+                                                              articles=rss_acticles,
+                                                              fingerprint=fingerprint)
+            log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}，未处理：{len(new_acticles)}")
+            # 批量检查种子是不是下过了
+            rssd_enclosures = self.dbhelper.get_rssd_enclosures(
+                [article.get('enclosure') for article in new_acticles])
+            # 已下载过及无法识别的种子
+            seen_articles = []
+            # 识别种子
+            start_time = time.time()
+            for article in new_acticles:
+                try:
+                    # 种子名
+                    title = article.get('title')
+                    # 种子链接
+                    enclosure = article.get('enclosure')
+                    # 开始处理
+                    log.info(f"【Rss】开始处理：{title}")
+                    # 检查这个种子是不是下过了
+                    if not enclosure or enclosure in rssd_enclosures:
+                        log.info(f"【Rss】{title} 已成功订阅过")
+                        seen_articles.append(article)
+                        continue
+                    # 识别种子名称，开始检索TMDB
+                    media_info = MetaInfo(title=title)
+                    cache_info = self.media.get_cache_info(media_info)
+                    if cache_info.get("id"):
+                        # 使用缓存信息
+                        media_info.tmdb_id = cache_info.get("id")
+                        media_info.type = cache_info.get("type")
+                        media_info.title = cache_info.get("title")
+                        media_info.year = cache_info.get("year")
+                    else:
+                        # 重新查询TMDB
+                        media_info = self.media.get_media_info(title=title)
+                        if not media_info:
+                            log.warn(f"【Rss】{title} 无法识别出媒体信息！")
+                            seen_articles.append(article)
+                            continue
+                        elif not media_info.tmdb_info:
+                            log.info(f"【Rss】{title} 识别为 {media_info.get_name()} 未匹配到TMDB媒体信息")
+                    # 大小及种子页面
+                    media_info.set_torrent_info(size=article.get('size'),
+                                                page_url=article.get('link'),
+                                                site=site_name,
+                                                site_order=site_order,
+                                                enclosure=enclosure)
+                    article_queue.put((site_info, article, media_info, None))
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    log.error("【Rss】处理RSS发生错误：%s" % str(e))
+                    continue
+            timings["identify"] = time.time() - start_time
+            self.rsshelper.mark_articles_seen(feed=rss_feed,
+                                              articles=seen_articles,
+                                              fingerprint=fingerprint)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error("【Rss】%s 处理RSS发生错误：%s" % (site_name, str(e)))
+        finally:
+            article_queue.put((site_info, None, None, timings))
+
+    def __match_rss_article(self, title, media_info, site_info, rss_movies, rss_tvs,
+                            rss_no_exists, rss_download_torrents):
+        """
+        检查已识别的RSS种子是否命中订阅，命中则加入下载列表
+        :param title: 种子名称
+        :param media_info: 已识别的媒体信息
+        :param site_info: 站点信息
+        :param rss_movies: 电影订阅清单
+        :param rss_tvs: 电视剧订阅清单
+        :param rss_no_exists: 缺失的资源详情
+        :param rss_download_torrents: 匹配到的资源列表
+        :return: 是否加入下载列表, 缺失的资源详情
+        """
+        site_cookie = site_info.get("cookie")
+        site_ua = site_info.get("ua")
+        # 是否解析种子详情
+        site_parse = site_info.get("parse")
+        # 是否使用代理
+        site_proxy = site_info.get("proxy")
+        # 使用的规则
+        site_fliter_rule = site_info.get("rule")
+        # 检查种子是否匹配订阅，返回匹配到的订阅ID、是否洗版、总集数、上传因子、下载因子
+        match_flag, match_msg, match_info = self.check_torrent_rss(
+            media_info=media_info,
+            rss_movies=rss_movies,
+            rss_tvs=rss_tvs,
+            site_filter_rule=site_fliter_rule,
+            site_cookie=site_cookie,
+            site_parse=site_parse,
+            site_ua=site_ua,
+            site_proxy=site_proxy)
+        for msg in match_msg:
+            log.info(f"【Rss】{msg}")
+
+        # 未匹配
+        if not match_flag:
+            return False, rss_no_exists
+
+        # 非模糊匹配命中，检查本地情况，检查删除订阅
+        if not match_info.get("fuzzy_match"):
+            # 匹配到订阅，如没有TMDB信息则重新查询
+            if not media_info.tmdb_info and media_info.tmdb_id:
+                media_info.set_tmdb_info(self.media.get_tmdb_info(mtype=media_info.type,
+                                                                  tmdbid=media_info.tmdb_id))
+            if not media_info.tmdb_info:
+                return False, rss_no_exists
+            # 非洗版时检查本地是否存在
+            if not match_info.get("over_edition"):
+                if media_info.type == MediaType.MOVIE:
+                    exist_flag, rss_no_exists, _ = self.downloader.check_exists_medias(
+                        meta_info=media_info,
+                        no_exists=rss_no_exists
+                    )
+                else:
+                    # 从登记薄中获取缺失剧集
+                    season = 1
+                    if match_info.get("season"):
+                        season = int(str(match_info.get("season")).replace("S", ""))
+                    # 设定的总集数
+                    total_ep = match_info.get("total")
+                    # 设定的开始集数
+                    current_ep = match_info.get("current_ep")
+                    # 表登记的缺失集数
+                    episodes = self.subscribe.get_subscribe_tv_episodes(match_info.get("id"))
+                    if episodes is None:
+                        episodes = []
+                        if current_ep:
+                            episodes = list(range(int(current_ep), int(total_ep) + 1))
+                        rss_no_exists[media_info.tmdb_id] = [
+                            {
+                                "season": season,
+                                "episodes": episodes,
+                                "total_episodes": total_ep
+                            }
+                        ]
+                    else:
+                        rss_no_exists[media_info.tmdb_id] = [
+                            {
+                                "season": season,
+                                "episodes": episodes,
+                                "total_episodes": total_ep
+                            }
+                        ]
+                    # 检查本地媒体库情况
+                    exist_flag, library_no_exists, _ = self.downloader.check_exists_medias(
+                        meta_info=media_info,
+                        total_ep={season: total_ep}
+                    )
+                    # 取交集做为缺失集
+                    rss_no_exists = Torrent.get_intersection_episodes(target=rss_no_exists,
+                                                                      source=library_no_exists,
+                                                                      title=media_info.tmdb_id)
+                    if rss_no_exists.get(media_info.tmdb_id):
+                        log.info("【Rss】%s 订阅缺失季集：%s" % (
+                            media_info.get_title_string(),
+                            rss_no_exists.get(media_info.tmdb_id)
+                        ))
+                # 本地已存在
+                if exist_flag:
+                    return False, rss_no_exists
+            # 洗版模式
+            else:
+                # 洗版时季集不完整的资源不要
+                if media_info.type != MediaType.MOVIE \
+                        and media_info.get_episode_list():
+                    log.info(
+                        f"【Rss】{media_info.get_title_string()}{media_info.get_season_string()} "
+                        f"正在洗版，过滤掉季集不完整的资源：{title}"
+                    )
+                    return False, rss_no_exists
+                if not self.subscribe.check_subscribe_over_edition(
+                        rtype=media_info.type,
+                        rssid=match_info.get("id"),
+                        res_order=match_info.get("res_order")):
+                    log.info(
+                        f"【Rss】{media_info.get_title_string()}{media_info.get_season_string()} "
+                        f"正在洗版，跳过低优先级或同优先级资源：{title}"
+                    )
+                    return False, rss_no_exists
+        # 模糊匹配
+        else:
+            # 不做处理，直接下载
+            pass
+
+        # 设置种子信息
+        media_info.set_torrent_info(res_order=match_info.get("res_order"),
+                                    filter_rule=match_info.get("filter_rule"),
+                                    over_edition=match_info.get("over_edition"),
+                                    download_volume_factor=match_info.get("download_volume_factor"),
+                                    upload_volume_factor=match_info.get("upload_volume_factor"),
+                                    rssid=match_info.get("id"))
+        # 设置下载参数
+        media_info.set_download_info(download_setting=match_info.get("download_setting"),
+                                     save_path=match_info.get("save_path"))
+        # 插入数据库历史记录
+        self.dbhelper.insert_rss_torrents(media_info)
+        # 加入下载列表
+        if media_info not in rss_download_torrents:
+            rss_download_torrents.append(media_info)
+            return True, rss_no_exists
+        return False, rss_no_exists
+
     @staticmethod
     def parse_rssxml(url, proxy=False):
         """
@@ -305,77 +434,125 @@ class Rss:
         :param url: RSS地址
         :return: 种子信息列表
         """
+        if not url:
+            return []
+        return Rss.__parse_rss_res(url, Rss.__get_rss_res(url, proxy))
+
+    @staticmethod
+    def __get_rss_res(url, proxy=False, timeout=None):
+        """
+        以条件请求下载RSS，内容未变化时站点返回304
+        :param url: RSS地址
+        :param proxy: 是否使用代理
+        :param timeout: 连接及每次读取的超时时间（秒）
+        :return: 流式读取的响应
+        """
+        if not url:
+            return None
+        headers = {"User-Agent": Config().get_ua()}
+        with feed_lock:
+            feed_cache = _feed_caches.get(url) or {}
+        if feed_cache.get("etag"):
+            headers["If-None-Match"] = feed_cache.get("etag")
+        if feed_cache.get("last_modified"):
+            headers["If-Modified-Since"] = feed_cache.get("last_modified")
+        try:
+            return RequestUtils(headers=headers,
+                                proxies=Config().get_proxies() if proxy else None,
+                                timeout=timeout).get_res(url, stream=True)
+        except Exception as e2:
+            ExceptionUtils.exception_traceback(e2)
+            log.console(str(e2))
+            return None
+
+    @staticmethod
+    def __parse_rss_res(url, ret, timeout=None):
+        """
+        流式解析RSS响应，获取RSS中的种子信息
+        :param url: RSS地址
+        :param ret: RSS响应
+        :param timeout: 读取全部内容的最长时间（秒），超时时返回已解析的部分且不记录校验信息
+        :return: 种子信息列表
+        """
         _special_title_sites = {
             'pt.keepfrds.com': RssTitleUtils.keepfriends_title
         }
 
+        if ret is None:
+            return []
+        # 内容未变化，使用上次的解析结果
+        if ret.status_code == 304:
+            ret.close()
+            with feed_lock:
+                feed_cache = _feed_caches.get(url) or {}
+            return [dict(article) for article in feed_cache.get("articles") or []]
+        if not ret:
+            ret.close()
+            return []
         # 开始处理
         ret_array = []
-        if not url:
-            return []
         site_domain = StringUtils.get_url_domain(url)
         try:
-            ret = RequestUtils(proxies=Config().get_proxies() if proxy else None).get_res(url)
-            if not ret:
-                return []
-            ret.encoding = ret.apparent_encoding
+            for item in FeedUtils.iter_items(ret, timeout=timeout):
+                try:
+                    # 标题
+                    title = FeedUtils.tag_value(item, "title", default="")
+                    if not title:
+                        continue
+                    # 标题特殊处理
+                    if site_domain and site_domain in _special_title_sites:
+                        title = _special_title_sites.get(site_domain)(title)
+                    # 描述
+                    description = FeedUtils.tag_value(item, "description", default="")
+                    # 种子页面
+                    link = FeedUtils.tag_value(item, "link", default="")
+                    # 种子链接
+                    enclosure = FeedUtils.tag_value(item, "enclosure", "url", default="")
+                    if not enclosure and not link:
+                        continue
+                    # 部分RSS只有link没有enclosure
+                    if not enclosure and link:
+                        enclosure = link
+                        link = None
+                    # 大小
+                    size = FeedUtils.tag_value(item, "enclosure", "length", default=0)
+                    if size and str(size).isdigit():
+                        size = int(size)
+                    else:
+                        size = 0
+                    # 发布日期
+                    pubdate = FeedUtils.tag_value(item, "pubDate", default="")
+                    if pubdate:
+                        # 转换为时间
+                        pubdate = StringUtils.get_time_stamp(pubdate)
+                    # 返回对象
+                    tmp_dict = {'title': title,
+                                'enclosure': enclosure,
+                                'size': size,
+                                'description': description,
+                                'link': link,
+                                'pubdate': pubdate}
+                    ret_array.append(tmp_dict)
+                except Exception as e1:
+                    ExceptionUtils.exception_traceback(e1)
+                    continue
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
-            log.console(str(e2))
-            return []
-        if ret:
-            ret_xml = ret.text
-            try:
-                # 解析XML
-                dom_tree = xml.dom.minidom.parseString(ret_xml)
-                rootNode = dom_tree.documentElement
-                items = rootNode.getElementsByTagName("item")
-                for item in items:
-                    try:
-                        # 标题
-                        title = DomUtils.tag_value(item, "title", default="")
-                        if not title:
-                            continue
-                        # 标题特殊处理
-                        if site_domain and site_domain in _special_title_sites:
-                            title = _special_title_sites.get(site_domain)(title)
-                        # 描述
-                        description = DomUtils.tag_value(item, "description", default="")
-                        # 种子页面
-                        link = DomUtils.tag_value(item, "link", default="")
-                        # 种子链接
-                        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
-                        if not enclosure and not link:
-                            continue
-                        # 部分RSS只有link没有enclosure
-                        if not enclosure and link:
-                            enclosure = link
-                            link = None
-                        # 大小
-                        size = DomUtils.tag_value(item, "enclosure", "length", default=0)
-                        if size and str(size).isdigit():
-                            size = int(size)
-                        else:
-                            size = 0
-                        # 发布日期
-                        pubdate = DomUtils.tag_value(item, "pubDate", default="")
-                        if pubdate:
-                            # 转换为时间
-                            pubdate = StringUtils.get_time_stamp(pubdate)
-                        # 返回对象
-                        tmp_dict = {'title': title,
-                                    'enclosure': enclosure,
-                                    'size': size,
-                                    'description': description,
-                                    'link': link,
-                                    'pubdate': pubdate}
-                        ret_array.append(tmp_dict)
-                    except Exception as e1:
-                        ExceptionUtils.exception_traceback(e1)
-                        continue
-            except Exception as e2:
-                ExceptionUtils.exception_traceback(e2)
-                return ret_array
+            return ret_array
+        finally:
+            ret.close()
+        # 记录校验信息，下次使用条件请求
+        etag = ret.headers.get("ETag")
+        last_modified = ret.headers.get("Last-Modified")
+        with feed_lock:
+            if etag or last_modified:
+                _feed_caches[url] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "articles": [dict(article) for article in ret_array]
+                }
+            else:
+                _feed_caches.pop(url, None)
         return ret_array
 
     def check_torrent_rss(self,
@@ -9,7 +9,7 @@ from lxml import etree
 import log
 from app.downloader import Downloader
 from app.filter import Filter
-from app.helper import DbHelper
+from app.helper import DbHelper, RssHelper
 from app.media import Media
 from app.media.meta import MetaInfo
 from app.message import Message
@@ -18,7 +18,7 @@ from app.subscribe import Subscribe
 from app.utils import RequestUtils, StringUtils, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SearchType
-from config import Config
+from config import Config, RSS_UNMATCHED_TTL
 
 
 @singleton
@@ -31,6 +31,7 @@ class RssChecker(object):
     downloader = None
     subscribe = None
     dbhelper = None
+    rsshelper = None
 
     _scheduler = None
     _rss_tasks = []
@@ -46,6 +47,7 @@ class RssChecker(object):
 
     def init_config(self):
         self.dbhelper = DbHelper()
+        self.rsshelper = RssHelper()
         self.message = Message()
         self.searcher = Searcher()
         self.filter = Filter()
@@ -174,12 +176,30 @@ class RssChecker(object):
         if len(rss_result) == 0:
             log.warn("【RssChecker】%s 未下载到数据" % taskinfo.get("name"))
             return
-        else:
-            log.info("【RssChecker】%s 获取数据：%s" % (taskinfo.get("name"), len(rss_result)))
+        # 剔除上次已处理过的报文，任务条件或过滤规则变化后重新处理
+        rss_feed = "userrss:%s" % taskid
+        fingerprint = RssHelper.get_fingerprint(*[taskinfo.get(key) for key in ("address",
+                                                                                 "parser",
+                                                                                 "uses",
+                                                                                 "include",
+                                                                                 "exclude",
+                                                                                 "filter",
+                                                                                 "recognization")],
+                                                self.filter.get_rules(taskinfo.get("filter")))
+        new_result = self.rsshelper.filter_new_articles(feed=rss_feed,
+                                                        articles=rss_result,
+                                                        fingerprint=fingerprint)
+        log.info("【RssChecker】%s 获取数据：%s，未处理：%s" % (taskinfo.get("name"), len(rss_result), len(new_result)))
+        # 批量查询是否处理过
+        finished_names, finished_enclosures = self.__get_userrss_finished(new_result)
+        # 已处理过及不匹配的报文
+        seen_result = []
+        # 未匹配到媒体信息的报文，识别结果会变化，一段时间后重新处理
+        unmatched_result = []
         # 处理RSS结果
         res_num = 0
         no_exists = {}
-        for res in rss_result:
+        for res in new_result:
             try:
                 # 种子名
                 title = res.get('title')
@@ -204,8 +224,9 @@ class RssChecker(object):
 
                 # 检查是不是处理过
                 meta_name = "%s %s" % (title, year) if year else title
-                if self.dbhelper.is_userrss_finished(meta_name, enclosure):
+                if (enclosure in finished_enclosures) if enclosure else (meta_name in finished_names):
                     log.info("【RssChecker】%s 已处理过" % title)
+                    seen_result.append(res)
                     continue
 
                 if taskinfo.get("uses") == "D":
@@ -228,6 +249,7 @@ class RssChecker(object):
                                 continue
                             if not media_info.tmdb_info:
                                 log.info("【RssChecker】%s 识别为 %s 未匹配到媒体信息" % (title, media_info.get_name()))
+                                unmatched_result.append(res)
                                 continue
                         # 检查是否已存在
                         if media_info.type == MediaType.MOVIE:
@@ -266,6 +288,7 @@ class RssChecker(object):
                     # 未匹配
                     if not match_flag:
                         log.info(f"【RssChecker】{match_msg}")
+                        seen_result.append(res)
                         continue
                     else:
                         # 匹配优先级
@@ -305,6 +328,7 @@ class RssChecker(object):
                     # 未匹配
                     if not match_flag:
                         log.info(f"【RssChecker】{match_msg}")
+                        seen_result.append(res)
                         continue
                     # 添加订阅列表
                     self.dbhelper.insert_rss_torrents(media_info)
@@ -317,6 +341,13 @@ class RssChecker(object):
                 ExceptionUtils.exception_traceback(e)
                 log.error("【RssChecker】处理RSS发生错误：%s - %s" % (str(e), traceback.format_exc()))
                 continue
+        self.rsshelper.mark_articles_seen(feed=rss_feed,
+                                          articles=seen_result,
+                                          fingerprint=fingerprint)
+        self.rsshelper.mark_articles_seen(feed=rss_feed,
+                                          articles=unmatched_result,
+                                          fingerprint=fingerprint,
+                                          ttl=RSS_UNMATCHED_TTL)
         log.info("【RssChecker】%s 处理结束，匹配到 %s 个有效资源" % (taskinfo.get("name"), res_num))
         # 添加下载
         if rss_download_torrents:
@@ -369,6 +400,26 @@ class RssChecker(object):
         if counter:
             self.dbhelper.update_userrss_task_info(taskid, counter)
 
+    def __get_userrss_finished(self, rss_result):
+        """
+        批量查询RSS报文是否处理过
+        :return: 已处理过的名称集合，已处理过的下载链接集合
+        """
+        meta_names = []
+        enclosures = []
+        for res in rss_result:
+            title = res.get('title')
+            if not title:
+                continue
+            year = res.get('year')
+            if year and len(year) > 4:
+                year = year[:4]
+            if res.get('enclosure'):
+                enclosures.append(res.get('enclosure'))
+            else:
+                meta_names.append("%s %s" % (title, year) if year else title)
+        return self.dbhelper.get_userrss_finished(meta_names, enclosures)
+
     def __parse_userrss_result(self, taskinfo):
         """
         获取RSS链接数据，根据PARSER进行解析获取返回结果
@@ -486,6 +537,7 @@ class RssChecker(object):
         rss_result = self.__parse_userrss_result(taskinfo)
         if len(rss_result) == 0:
             return []
+        finished_names, finished_enclosures = self.__get_userrss_finished(rss_result)
         for res in rss_result:
             try:
                 # 种子名
@@ -508,7 +560,7 @@ class RssChecker(object):
                     year = year[:4]
                 # 检查是不是处理过
                 meta_name = "%s %s" % (title, year) if year else title
-                finish_flag = self.dbhelper.is_userrss_finished(meta_name, enclosure)
+                finish_flag = (enclosure in finished_enclosures) if enclosure else (meta_name in finished_names)
                 # 信息聚合
                 params = {
                     "title": title,
@@ -607,6 +659,8 @@ class RssChecker(object):
             elif flag == "set_unfinish":
                 for article in articles:
                     self.dbhelper.simple_delete_rss_torrents(article.get("title"), article.get("enclosure"))
+                # 重新处理
+                self.rsshelper.unmark_articles_seen(articles)
             else:
                 return False
             return True
@@ -19,7 +19,7 @@ from app.utils import ExceptionUtils, SystemUtils
 from app.utils.commons import singleton
 from config import PT_TRANSFER_INTERVAL, METAINFO_SAVE_INTERVAL, \
     SYNC_TRANSFER_INTERVAL, RSS_CHECK_INTERVAL, REFRESH_PT_DATA_INTERVAL, \
-    RSS_REFRESH_TMDB_INTERVAL, META_DELETE_UNKNOWN_INTERVAL, REFRESH_WALLPAPER_INTERVAL, Config
+    RSS_REFRESH_TMDB_INTERVAL, META_DELETE_UNKNOWN_INTERVAL, REFRESH_WALLPAPER_INTERVAL, MEDIASYNC_FULL_INTERVAL, Config
 from web.backend.wallpaper import get_login_wallpaper
 
 from app.filetransfer import FileTransfer
@@ -172,7 +172,11 @@ class Scheduler:
                             log.info("豆瓣同步服务启动失败：%s" % str(e))
                             mediasync_interval = 0
                 if mediasync_interval:
-                    self.SCHEDULER.add_job(MediaServer().sync_mediaserver, 'interval', hours=mediasync_interval)
+                    # 定时增量同步，低频全量同步校验一致性
+                    self.SCHEDULER.add_job(MediaServer().sync_mediaserver_incremental, 'interval',
+                                           hours=mediasync_interval)
+                    self.SCHEDULER.add_job(MediaServer().sync_mediaserver, 'interval',
+                                           hours=max(mediasync_interval, MEDIASYNC_FULL_INTERVAL))
                     log.info("媒体库同步服务启动")
 
         # 运行rclone来更新token防止使用时过期
@@ -1,7 +1,13 @@
+import hashlib
 import os
+import pickle
 import threading
+import time
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+
+from cacheout import Cache
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
@@ -9,10 +15,11 @@ from watchdog.observers.polling import PollingObserver
 import log
 from app.conf import ModuleConf
 from app.helper import DbHelper
-from config import RMT_MEDIAEXT, Config
+from config import RMT_MEDIAEXT, SYNC_FILES_MAXSIZE, SYNC_FILES_TTL, SYNC_SETTLE_TIME, SYNC_GROUP_QUIET_TIME, \
+    SYNC_SETTLE_CHECK_INTERVAL, Config
 from app.filetransfer import FileTransfer
 from app.utils.commons import singleton
-from app.utils import PathUtils, ExceptionUtils
+from app.utils import PathUtils, PathTrie, ExceptionUtils
 from app.utils.types import SyncType, OsType
 from app.torrentremover import TorrentRemover
 
@@ -35,12 +42,122 @@ class FileMonitorHandler(FileSystemEventHandler):
     def on_moved(self, event):
         self.sync.file_change_handler(event, "移动", event.dest_path)
 
+    def on_closed(self, event):
+        self.sync.file_closed_handler(event, event.src_path)
+
     """
     def on_modified(self, event):
         self.sync.file_change_handler(event, "修改", event.src_path)
     """
 
 
+class FileEventCoalescer:
+    """
+    监控文件事件合并：按上级目录分组，文件大小及修改时间稳定（或写入后关闭）视为写入完成，
+    一组文件全部完成且一段时间无新文件后交给回调处理
+    """
+
+    def __init__(self, callback):
+        """
+        :param callback: 一组文件就绪后的回调，参数为分组目录、{文件: 附加信息}
+        """
+        self._callback = callback
+        self._lock = threading.Lock()
+        # 分组目录 -> {"files": {文件: [大小, 修改时间, 稳定开始时间, 是否已关闭, 附加信息]}, "time": 最后事件时间}
+        self._groups = {}
+        # 文件 -> 分组目录
+        self._file_groups = {}
+        self._stop_event = None
+
+    def start(self):
+        self.stop()
+        self._stop_event = threading.Event()
+        threading.Thread(target=self.__run, args=(self._stop_event,), name="sync-coalescer", daemon=True).start()
+
+    def stop(self):
+        if self._stop_event:
+            self._stop_event.set()
+
+    def add(self, group, file_path, info=None):
+        """
+        登记文件事件，已登记的文件重新计时
+        :return: 是否新登记的文件
+        """
+        now = time.time()
+        with self._lock:
+            group_info = self._groups.setdefault(group, {"files": {}, "time": now})
+            group_info["time"] = now
+            is_new = file_path not in group_info["files"]
+            group_info["files"][file_path] = [None, None, now, False, info]
+            self._file_groups[file_path] = group
+        return is_new
+
+    def close(self, file_path):
+        """
+        文件写入后关闭，视为写入完成
+        """
+        with self._lock:
+            group = self._file_groups.get(file_path)
+            if not group:
+                return
+            file_info = self._groups.get(group, {}).get("files", {}).get(file_path)
+            if file_info:
+                file_info[3] = True
+
+    def __is_settled(self, file_path, file_info, now):
+        """
+        检查文件是否写入完成，文件不存在时返回None
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime) != (file_info[0], file_info[1]):
+            # 大小或修改时间变化，重新计时
+            if file_info[0] is not None:
+                file_info[2] = now
+                file_info[3] = False
+            file_info[0], file_info[1] = stat.st_size, stat.st_mtime
+        return file_info[3] or now - file_info[2] >= SYNC_SETTLE_TIME
+
+    def check(self):
+        """
+        检查各分组的文件状态，取出已就绪的分组交给回调，回调执行时不持有锁
+        """
+        now = time.time()
+        ready_groups = []
+        with self._lock:
+            for group, group_info in list(self._groups.items()):
+                settled = True
+                for file_path, file_info in list(group_info["files"].items()):
+                    file_settled = self.__is_settled(file_path, file_info, now)
+                    if file_settled is None:
+                        # 文件已删除或移走
+                        group_info["files"].pop(file_path)
+                        self._file_groups.pop(file_path, None)
+                    elif not file_settled:
+                        settled = False
+                if not group_info["files"]:
+                    self._groups.pop(group)
+                    continue
+                if settled and now - group_info["time"] >= SYNC_GROUP_QUIET_TIME:
+                    self._groups.pop(group)
+                    for file_path in group_info["files"]:
+                        self._file_groups.pop(file_path, None)
+                    ready_groups.append((group, {file_path: file_info[4]
+                                                 for file_path, file_info in group_info["files"].items()}))
+        for group, files in ready_groups:
+            self._callback(group, files)
+
+    def __run(self, stop_event):
+        while not stop_event.wait(SYNC_SETTLE_CHECK_INTERVAL):
+            try:
+                self.check()
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                log.error("【Sync】检查文件写入状态出错：%s" % str(err))
+
+
 @singleton
 class Sync(object):
     filetransfer = None
@@ -50,10 +167,25 @@ class Sync(object):
     _observer = []
     _sync_paths = []
     _sync_sys = OsType.LINUX
-    _synced_files = []
-    _need_sync_paths = {}
+    # 已处理过的文件，数量及时间有上限
+    _synced_files = None
+    # 文件事件合并
+    _coalescer = None
+    # 转移执行器，按顺序转移就绪的目录
+    _executor = None
+    # 监控目录快照：监控目录 -> {文件: (inode, 大小, 修改时间)}
+    _snapshots = {}
+    # 有变化未保存的快照
+    _dirty_snapshots = set()
+    # 监控目录前缀树
+    _monitor_trie = None
+    # 目的目录及未识别目录前缀树
+    _target_trie = None
 
     def __init__(self):
+        self._synced_files = Cache(maxsize=SYNC_FILES_MAXSIZE, ttl=SYNC_FILES_TTL, timer=time.time)
+        self._coalescer = FileEventCoalescer(self.__submit_transfer)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sync-transfer")
         self.init_config()
 
     def init_config(self):
@@ -118,6 +250,9 @@ class Sync(object):
                     }
                 else:
                     log.error("【Sync】%s 目录不存在！" % monpath)
+        self._monitor_trie = PathTrie(self.sync_dir_config)
+        self._target_trie = PathTrie([path for conf in self.sync_dir_config.values()
+                                      for path in (conf.get('target'), conf.get('unknown')) if path])
 
     def get_sync_dirs(self):
         """
@@ -135,174 +270,304 @@ class Sync(object):
         :param event_path: 事件文件路径
         """
         if not event.is_directory:
-            syncSuccess = False
-            # 文件发生变化
+            self.__handle_file(text, event_path)
+
+    def __handle_file(self, text, event_path):
+        """
+        处理新增或变化的文件
+        :param text: 事件描述
+        :param event_path: 文件路径
+        """
+        syncSuccess = False
+        # 文件发生变化
+        try:
+            if not os.path.exists(event_path):
+                return
+            log.debug("【Sync】文件%s：%s" % (text, event_path))
+            # 判断是否处理过了
+            need_handler_flag = False
             try:
-                if not os.path.exists(event_path):
-                    return
-                log.debug("【Sync】文件%s：%s" % (text, event_path))
-                # 判断是否处理过了
-                need_handler_flag = False
-                try:
-                    lock.acquire()
-                    if event_path not in self._synced_files:
-                        self._synced_files.append(event_path)
-                        need_handler_flag = True
-                finally:
-                    lock.release()
-                if not need_handler_flag:
-                    log.debug("【Sync】文件已处理过：%s" % event_path)
-                    return
-                # 不是监控目录下的文件不处理
-                is_monitor_file = False
-                for tpath in self.sync_dir_config.keys():
-                    if PathUtils.is_path_in_path(tpath, event_path):
-                        is_monitor_file = True
-                        break
-                if not is_monitor_file:
-                    return
-                # 目的目录的子文件不处理
-                for tpath in self.sync_dir_config.values():
-                    if not tpath:
-                        continue
-                    if PathUtils.is_path_in_path(tpath.get('target'), event_path):
-                        return
-                    if PathUtils.is_path_in_path(tpath.get('unknown'), event_path):
-                        return
-                # 媒体库目录及子目录不处理
-                if self.filetransfer.is_target_dir_path(event_path):
+                lock.acquire()
+                if not self._synced_files.has(event_path):
+                    self._synced_files.set(event_path, True)
+                    need_handler_flag = True
+            finally:
+                lock.release()
+            if not need_handler_flag:
+                log.debug("【Sync】文件已处理过：%s" % event_path)
+                return
+            # 不是监控目录下的文件不处理，找到是哪个监控目录下的
+            monitor_dir, target_dirs = self._monitor_trie.match(event_path)
+            if not monitor_dir:
+                return
+            # 目的目录的子文件不处理
+            if self._target_trie.contains(event_path):
+                return
+            # 媒体库目录及子目录不处理
+            if self.filetransfer.is_target_dir_path(event_path):
+                return
+            # 回收站及隐藏的文件不处理
+            if PathUtils.is_invalid_path(event_path):
+                return
+            # 上级目录
+            from_dir = os.path.dirname(event_path)
+            # 是否监控根目录下的文件
+            is_root_path = self.__is_monitor_root(from_dir)
+
+            # 查找目的目录
+            target_path = target_dirs.get('target')
+            unknown_path = target_dirs.get('unknown')
+            onlylink = target_dirs.get('onlylink')
+            sync_mode = target_dirs.get('syncmod')
+
+            # 只做硬链接，不做识别重命名
+            if onlylink:
+                if self.dbhelper.is_sync_in_history(event_path, target_path):
                     return
-                # 回收站及隐藏的文件不处理
-                if PathUtils.is_invalid_path(event_path):
+                log.info("【Sync】开始同步 %s" % event_path)
+                ret, msg = self.filetransfer.link_sync_file(src_path=monitor_dir,
+                                                            in_file=event_path,
+                                                            target_dir=target_path,
+                                                            sync_transfer_mode=sync_mode)
+                if ret != 0:
+                    log.warn("【Sync】%s 同步失败，错误码：%s" % (event_path, ret))
+                elif not msg:
+                    self.dbhelper.insert_sync_history(event_path, monitor_dir, target_path)
+                    # 同步完成后登记到快照
+                    self.__snapshot_file(monitor_dir, event_path)
+                    syncSuccess = True
+                    log.info("【Sync】%s 同步完成" % event_path)
+            # 识别转移
+            else:
+                # 不是媒体文件不处理
+                name = os.path.basename(event_path)
+                if not name:
                     return
-                # 上级目录
-                from_dir = os.path.dirname(event_path)
-                # 找到是哪个监控目录下的
-                monitor_dir = event_path
-                is_root_path = False
-                for m_path in self.sync_dir_config.keys():
-                    if PathUtils.is_path_in_path(m_path, event_path):
-                        monitor_dir = m_path
-                    if os.path.normpath(m_path) == os.path.normpath(from_dir):
-                        is_root_path = True
-
-                # 查找目的目录
-                target_dirs = self.sync_dir_config.get(monitor_dir)
-                target_path = target_dirs.get('target')
-                unknown_path = target_dirs.get('unknown')
-                onlylink = target_dirs.get('onlylink')
-                sync_mode = target_dirs.get('syncmod')
-
-                # 只做硬链接，不做识别重命名
-                if onlylink:
-                    if self.dbhelper.is_sync_in_history(event_path, target_path):
+                if name.lower() != "index.bdmv":
+                    ext = os.path.splitext(name)[-1]
+                    if ext.lower() not in RMT_MEDIAEXT:
                         return
-                    log.info("【Sync】开始同步 %s" % event_path)
-                    ret, msg = self.filetransfer.link_sync_file(src_path=monitor_dir,
-                                                                in_file=event_path,
-                                                                target_dir=target_path,
-                                                                sync_transfer_mode=sync_mode)
-                    if ret != 0:
-                        log.warn("【Sync】%s 同步失败，错误码：%s" % (event_path, ret))
-                    elif not msg:
-                        self.dbhelper.insert_sync_history(event_path, monitor_dir, target_path)
-                        syncSuccess = True
-                        log.info("【Sync】%s 同步完成" % event_path)
-                # 识别转移
-                else:
-                    # 不是媒体文件不处理
-                    name = os.path.basename(event_path)
-                    if not name:
-                        return
-                    if name.lower() != "index.bdmv":
-                        ext = os.path.splitext(name)[-1]
-                        if ext.lower() not in RMT_MEDIAEXT:
-                            return
-                    # 监控根目录下的文件发生变化时直接发走
-                    if is_root_path:
-                        ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
-                                                                        in_path=event_path,
-                                                                        target_dir=target_path,
-                                                                        unknown_dir=unknown_path,
-                                                                        rmt_mode=sync_mode)
-                        if not ret:
-                            log.warn("【Sync】%s 转移失败：%s" % (event_path, ret_msg))
-                        else:
-                            syncSuccess = True
-                    else:
-                        try:
-                            lock.acquire()
-                            if self._need_sync_paths.get(from_dir):
-                                files = self._need_sync_paths[from_dir].get('files')
-                                if not files:
-                                    files = [event_path]
-                                else:
-                                    if event_path not in files:
-                                        files.append(event_path)
-                                    else:
-                                        return
-                                self._need_sync_paths[from_dir].update({'files': files})
-                            else:
-                                self._need_sync_paths[from_dir] = {'target': target_path,
-                                                                   'unknown': unknown_path,
-                                                                   'syncmod': sync_mode,
-                                                                   'files': [event_path]}
-                        finally:
-                            lock.release()
-                if syncSuccess:
-                    self.syncdone()
-            except Exception as e:
-                ExceptionUtils.exception_traceback(e)
-                log.error("【Sync】发生错误：%s - %s" % (str(e), traceback.format_exc()))
+                # 等待写入完成后按上级目录合并转移，监控根目录下的文件单独转移
+                self._coalescer.add(group=event_path if is_root_path else self.__get_transfer_group(from_dir),
+                                    file_path=event_path,
+                                    info={'monitor': monitor_dir,
+                                          'target': target_path,
+                                          'unknown': unknown_path,
+                                          'syncmod': sync_mode,
+                                          'root': is_root_path})
+            if syncSuccess:
+                self.syncdone()
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error("【Sync】发生错误：%s - %s" % (str(e), traceback.format_exc()))
+
+    @staticmethod
+    def __get_transfer_group(path):
+        """
+        文件事件的合并分组目录，蓝光原盘BDMV及BDMV/STREAM下的文件按原盘根目录合并，避免同一原盘重复转移
+        """
+        dir_name = os.path.basename(os.path.normpath(path)).upper()
+        if dir_name == "BDMV":
+            return os.path.dirname(os.path.normpath(path))
+        if dir_name == "STREAM" \
+                and os.path.basename(os.path.dirname(os.path.normpath(path))).upper() == "BDMV":
+            return PathUtils.get_parent_paths(os.path.normpath(path), 2)
+        return path
+
+    def __is_monitor_root(self, path):
+        """
+        判断是否为监控根目录
+        """
+        monitor_dir, _ = self._monitor_trie.match(path)
+        return True if monitor_dir and os.path.normpath(monitor_dir) == os.path.normpath(path) else False
+
+    def file_closed_handler(self, event, event_path):
+        """
+        文件写入后关闭，不用再等待大小稳定
+        :param event: 事件
+        :param event_path: 事件文件路径
+        """
+        if not event.is_directory:
+            self._coalescer.close(event_path)
 
     def transfer_mon_files(self):
         """
-        批量转移文件，由定时服务定期调用执行
+        检查监控文件写入状态，转移已就绪的目录，由定时服务定期调用作为兜底，同时保存目录快照
+        """
+        self._coalescer.check()
+        self.__save_snapshots()
+
+    @staticmethod
+    def __get_snapshot_file(monpath):
+        return os.path.join(Config().get_config_path(),
+                            "sync_snapshot",
+                            "%s.dat" % hashlib.md5(os.path.normpath(monpath).encode("utf-8")).hexdigest())
+
+    def __load_snapshot(self, monpath):
+        """
+        读取监控目录快照，没有时返回None
+        """
+        with lock:
+            if monpath in self._snapshots:
+                return self._snapshots[monpath]
+        snapshot_file = self.__get_snapshot_file(monpath)
+        if not os.path.exists(snapshot_file):
+            return None
+        try:
+            with open(snapshot_file, "rb") as f:
+                data = pickle.load(f) or {}
+            if data.get("root") != os.path.normpath(monpath):
+                return None
+            return data.get("files") or {}
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return None
+
+    def __save_snapshots(self):
+        """
+        保存有变化的监控目录快照
         """
-        if self._need_sync_paths:
-            syncSuccess = False
+        with lock:
+            dirty_snapshots = [(monpath, dict(self._snapshots.get(monpath) or {}))
+                               for monpath in self._dirty_snapshots]
+            self._dirty_snapshots.clear()
+        for monpath, files in dirty_snapshots:
+            snapshot_file = self.__get_snapshot_file(monpath)
             try:
-                lock.acquire()
-                finished_paths = []
-                for path in list(self._need_sync_paths):
-                    if not PathUtils.is_invalid_path(path) and os.path.exists(path):
-                        log.info("【Sync】开始转移监控目录文件...")
-                        target_info = self._need_sync_paths.get(path)
-                        bluray_dir = PathUtils.get_bluray_dir(path)
-                        if not bluray_dir:
-                            src_path = path
-                            files = target_info.get('files')
-                        else:
-                            src_path = bluray_dir
-                            files = []
-                        if src_path not in finished_paths:
-                            finished_paths.append(src_path)
-                        else:
-                            continue
-                        target_path = target_info.get('target')
-                        unknown_path = target_info.get('unknown')
-                        sync_mode = target_info.get('syncmod')
-                        # 判断是否根目录
-                        is_root_path = False
-                        for m_path in self.sync_dir_config.keys():
-                            if os.path.normpath(m_path) == os.path.normpath(src_path):
-                                is_root_path = True
-                        ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
-                                                                        in_path=src_path,
-                                                                        files=files,
-                                                                        target_dir=target_path,
-                                                                        unknown_dir=unknown_path,
-                                                                        rmt_mode=sync_mode,
-                                                                        root_path=is_root_path)
-                        if not ret:
-                            log.warn("【Sync】%s转移失败：%s" % (path, ret_msg))
-                        else:
-                            syncSuccess = True
-                    self._need_sync_paths.pop(path)
-            finally:
-                lock.release()
-                if syncSuccess:
-                    self.syncdone()
+                os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+                with open("%s.tmp" % snapshot_file, "wb") as f:
+                    pickle.dump({"root": os.path.normpath(monpath), "files": files}, f, pickle.HIGHEST_PROTOCOL)
+                os.replace("%s.tmp" % snapshot_file, snapshot_file)
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                log.error("【Sync】保存监控目录快照失败：%s" % str(err))
+
+    def __snapshot_file(self, monpath, file_path):
+        """
+        登记文件到监控目录快照
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        with lock:
+            files = self._snapshots.get(monpath)
+            if files is None:
+                return
+            files[file_path] = (stat.st_ino, stat.st_size, stat.st_mtime)
+            self._dirty_snapshots.add(monpath)
+
+    def __scan_dir(self, monpath):
+        """
+        遍历监控目录，跳过回收站、隐藏目录及目的目录
+        :return: {文件: (inode, 大小, 修改时间)}
+        """
+        files = {}
+        for entry in PathUtils.scan_dir(monpath,
+                                        dir_filter=lambda path: not self._target_trie.contains(path)
+                                        and not self.filetransfer.is_target_dir_path(path)):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            files[entry.path] = (stat.st_ino, stat.st_size, stat.st_mtime)
+        return files
+
+    def reconcile_sync_dirs(self, sid=None):
+        """
+        对比监控目录与上次的快照，只处理停止监控期间新增或变化的文件，启动时自动执行
+        :param sid: 同步目录ID，为空时处理全部
+        """
+        for monpath, target_dirs in list(self.sync_dir_config.items()):
+            if sid and sid != target_dirs.get('id'):
+                continue
+            if not os.path.exists(monpath):
+                continue
+            start_time = time.time()
+            snapshot = self.__load_snapshot(monpath)
+            files = self.__scan_dir(monpath)
+            if snapshot is None:
+                # 首次建立快照，不处理已有文件
+                with lock:
+                    self._snapshots[monpath] = files
+                    self._dirty_snapshots.add(monpath)
+                log.info("【Sync】%s 已建立目录快照，共 %s 个文件" % (monpath, len(files)))
+                continue
+            changed_files = [file_path for file_path, file_stat in files.items()
+                             if snapshot.get(file_path) != file_stat]
+            # 新增或变化的文件保留原快照，写入完成后再登记，转移前重启时仍会重新处理
+            new_snapshot = dict(files)
+            for file_path in changed_files:
+                if file_path in snapshot:
+                    new_snapshot[file_path] = snapshot[file_path]
+                else:
+                    new_snapshot.pop(file_path)
+            with lock:
+                self._snapshots[monpath] = new_snapshot
+                self._dirty_snapshots.add(monpath)
+            log.info("【Sync】%s 目录快照比对完成，共 %s 个文件，新增或变化 %s 个，耗时 %.1f 秒" % (
+                monpath, len(files), len(changed_files), time.time() - start_time))
+            for file_path in changed_files:
+                self.__handle_file("新增", file_path)
+        self.__save_snapshots()
+
+    def __submit_transfer(self, path, files):
+        """
+        已就绪的目录交给转移执行器，文件已写入完成，此时登记到快照
+        """
+        for file_path, target_info in files.items():
+            self.__snapshot_file(target_info.get('monitor'), file_path)
+        self._executor.submit(self.__transfer_files, path, files)
+
+    def __transfer_files(self, path, files):
+        """
+        转移一个目录下写入完成的文件
+        :param path: 上级目录，监控根目录下的文件为文件本身
+        :param files: {文件: 转移配置}
+        """
+        try:
+            if PathUtils.is_invalid_path(path) or not os.path.exists(path):
+                return
+            log.info("【Sync】开始转移监控目录文件...")
+            target_info = list(files.values())[0]
+            target_path = target_info.get('target')
+            unknown_path = target_info.get('unknown')
+            sync_mode = target_info.get('syncmod')
+            if target_info.get('root'):
+                # 监控根目录下的文件
+                ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
+                                                                in_path=path,
+                                                                target_dir=target_path,
+                                                                unknown_dir=unknown_path,
+                                                                rmt_mode=sync_mode)
+            else:
+                bluray_dir = PathUtils.get_bluray_dir(path)
+                if not bluray_dir:
+                    src_path = path
+                    file_list = [file for file in files.keys() if os.path.exists(file)]
+                    if not file_list:
+                        return
+                else:
+                    src_path = bluray_dir
+                    file_list = []
+                # 判断是否根目录
+                is_root_path = self.__is_monitor_root(src_path)
+                ret, ret_msg = self.filetransfer.transfer_media(in_from=SyncType.MON,
+                                                                in_path=src_path,
+                                                                files=file_list,
+                                                                target_dir=target_path,
+                                                                unknown_dir=unknown_path,
+                                                                rmt_mode=sync_mode,
+                                                                root_path=is_root_path)
+            if not ret:
+                log.warn("【Sync】%s转移失败：%s" % (path, ret_msg))
+            else:
+                self.syncdone()
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            log.error("【Sync】发生错误：%s - %s" % (str(e), traceback.format_exc()))
 
     @staticmethod
     def syncdone():
@@ -317,6 +582,9 @@ class Sync(object):
         启动监控服务
         """
         self._observer = []
+        self._coalescer.start()
+        # 补处理停止监控期间的文件
+        threading.Thread(target=self.reconcile_sync_dirs, name="sync-reconcile", daemon=True).start()
         for monpath in self.sync_dir_config.keys():
             if monpath and os.path.exists(monpath):
                 try:
@@ -343,6 +611,8 @@ class Sync(object):
             for observer in self._observer:
                 observer.stop()
         self._observer = []
+        self._coalescer.stop()
+        self.__save_snapshots()
 
     def transfer_all_sync(self, sid=None):
         """
@@ -3,7 +3,7 @@ from .episode_format import EpisodeFormat
 from .http_utils import RequestUtils
 from .json_utils import JsonUtils
 from .number_utils import NumberUtils
-from .path_utils import PathUtils
+from .path_utils import PathUtils, PathTrie
 from .string_utils import StringUtils
 from .system_utils import SystemUtils
 from .tokens import Tokens
@@ -11,3 +11,4 @@ from .torrent import Torrent
 from .cache_manager import cacheman, TokenCache, ConfigLoadCache
 from .exception_utils import ExceptionUtils
 from .rsstitle_utils import RssTitleUtils
+from .feed_utils import FeedUtils
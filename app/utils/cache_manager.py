@@ -4,7 +4,9 @@ import time
 from cacheout import CacheManager, LRUCache, Cache
 
 CACHES = {
-    "tmdb_supply": {'maxsize': 200}
+    "tmdb_supply": {'maxsize': 200},
+    # 名称识别结果，制作组等配置变化后最多1小时生效
+    "meta_info": {'maxsize': 4096, 'ttl': 3600, 'timer': time.time}
 }
 
 cacheman = CacheManager(CACHES, cache_class=LRUCache)
@@ -24,3 +24,58 @@ def singleton(cls):
         return INSTANCES[cls]
 
     return _singleton
+
+
+class SingleFlight(object):
+    """
+    相同key的并发调用只执行一次，其余调用等待并共享结果
+    """
+
+    class _Call(object):
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行func，同一时刻相同key只有一个调用真正执行
+        :return: 结果, 是否为共享其它调用的结果
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call:
+                self._stats["shared"] += 1
+                leader = False
+            else:
+                call = self._Call()
+                self._calls[key] = call
+                leader = True
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def stats(self):
+        """
+        返回调用总数、被合并的调用数及当前进行中的数量
+        """
+        with self._lock:
+            return dict(self._stats, inflight=len(self._calls))
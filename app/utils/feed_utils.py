@@ -0,0 +1,142 @@
+import codecs
+import re
+import time
+
+from lxml import etree
+from requests.compat import chardet
+
+# 读取XML声明时至少需要的字节数
+_DECLARATION_SIZE = 1024
+# 流式读取的块大小
+_CHUNK_SIZE = 64 * 1024
+_DECLARATION_RE = re.compile(rb'^(?:\xef\xbb\xbf)?\s*<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._\-]+)["\']')
+
+
+class FeedUtils:
+
+    @staticmethod
+    def iter_items(res, tag="{*}item", timeout=None):
+        """
+        流式解析RSS/Torznab响应，逐个返回item节点，返回的节点在迭代下一个时会被清空
+        XML声明了编码或响应头带有charset时不再进行编码探测
+        :param res: requests的响应，建议以stream方式请求
+        :param tag: 节点名称
+        :param timeout: 读取全部内容的最长时间（秒），超过时抛出TimeoutError
+        """
+        if res is None:
+            return
+        chunks = FeedUtils.__iter_chunks(res, timeout)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= _DECLARATION_SIZE:
+                break
+        if not head:
+            return
+        encoding = None
+        if not _DECLARATION_RE.match(head):
+            content_type = res.headers.get("Content-Type") or ""
+            if "charset=" in content_type.lower():
+                encoding = res.encoding
+            else:
+                # 没有任何编码声明，读取全部内容后探测
+                head += b"".join(chunks)
+                encoding = chardet.detect(head).get("encoding") or "utf-8"
+        # libxml2不支持的编码由Python解码后以UTF-8交给解析器，Python也不支持时按UTF-8解析
+        decoder = None
+        try:
+            parser = FeedUtils.__new_parser(tag, encoding)
+        except LookupError:
+            try:
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            except LookupError:
+                pass
+            parser = FeedUtils.__new_parser(tag, "utf-8")
+
+        def __feed(data, final=False):
+            if decoder:
+                data = decoder.decode(data, final).encode("utf-8")
+            if data:
+                parser.feed(data)
+
+        def __read_events():
+            for _, elem in parser.read_events():
+                yield elem
+                # 释放已处理的节点
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+
+        __feed(head)
+        yield from __read_events()
+        for chunk in chunks:
+            __feed(chunk)
+            yield from __read_events()
+        try:
+            __feed(b"", final=True)
+            parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        yield from __read_events()
+
+    @staticmethod
+    def __new_parser(tag, encoding=None):
+        """
+        创建流式解析器，libxml2不支持该编码时抛出LookupError
+        """
+        return etree.XMLPullParser(events=("end",),
+                                   tag=tag,
+                                   encoding=encoding,
+                                   recover=True,
+                                   resolve_entities=False,
+                                   no_network=True,
+                                   huge_tree=True)
+
+    @staticmethod
+    def __iter_chunks(res, timeout=None):
+        """
+        分块读取响应内容，超过截止时间时抛出TimeoutError
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        for chunk in res.iter_content(chunk_size=_CHUNK_SIZE):
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError("读取响应内容超过 %s 秒" % timeout)
+            yield chunk
+
+    @staticmethod
+    def __find(tag_item, tag_name):
+        """
+        查找标签，带前缀的标签及无命名空间未找到时不区分命名空间
+        """
+        if ":" in tag_name:
+            return tag_item.find(".//{*}%s" % tag_name.split(":")[-1])
+        node = tag_item.find(".//%s" % tag_name)
+        if node is None:
+            node = tag_item.find(".//{*}%s" % tag_name)
+        return node
+
+    @staticmethod
+    def tag_value(tag_item, tag_name, attname="", default=None):
+        """
+        解析lxml节点下的标签值
+        """
+        node = FeedUtils.__find(tag_item, tag_name)
+        if node is not None:
+            if attname:
+                attvalue = node.get(attname)
+                if attvalue:
+                    return attvalue
+            elif node.text:
+                return node.text
+        return default
+
+    @staticmethod
+    def tag_nodes(tag_item, tag_name):
+        """
+        获取lxml节点下的所有同名标签
+        """
+        if ":" in tag_name:
+            tag_name = tag_name.split(":")[-1]
+        return tag_item.findall(".//{*}%s" % tag_name)
@@ -95,7 +95,7 @@ class RequestUtils:
         except requests.exceptions.RequestException:
             return None
 
-    def get_res(self, url, params=None, allow_redirects=True):
+    def get_res(self, url, params=None, allow_redirects=True, stream=False):
         try:
             if self._session:
                 return self._session.get(url,
@@ -105,7 +105,8 @@ class RequestUtils:
                                          proxies=self._proxies,
                                          cookies=self._cookies,
                                          timeout=self._timeout,
-                                         allow_redirects=allow_redirects)
+                                         allow_redirects=allow_redirects,
+                                         stream=stream)
             else:
                 return requests.get(url,
                                     params=params,
@@ -114,7 +115,8 @@ class RequestUtils:
                                     proxies=self._proxies,
                                     cookies=self._cookies,
                                     timeout=self._timeout,
-                                    allow_redirects=allow_redirects)
+                                    allow_redirects=allow_redirects,
+                                    stream=stream)
         except requests.exceptions.RequestException:
             return None
 
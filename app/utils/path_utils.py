@@ -1,4 +1,5 @@
 import os
+import stat
 
 
 class PathUtils:
@@ -10,28 +11,28 @@ class PathUtils:
         """
         if not in_path:
             return []
-        if not os.path.exists(in_path):
+        try:
+            is_dir = stat.S_ISDIR(os.stat(in_path).st_mode)
+        except (OSError, ValueError):
             return []
         ret_list = []
-        if os.path.isdir(in_path):
-            for root, dirs, files in os.walk(in_path):
-                for file in files:
-                    cur_path = os.path.join(root, file)
-                    # 检查路径是否合法
-                    if PathUtils.is_invalid_path(cur_path):
-                        continue
-                    # 检查格式匹配
-                    if episode_format and not episode_format.match(file):
+        if is_dir:
+            for entry in PathUtils.scan_dir(in_path):
+                # 检查格式匹配
+                if episode_format and not episode_format.match(entry.name):
+                    continue
+                # 检查后缀
+                if exts and os.path.splitext(entry.name)[-1].lower() not in exts:
+                    continue
+                # 检查文件大小
+                if filesize:
+                    try:
+                        if entry.stat().st_size < filesize:
+                            continue
+                    except OSError:
                         continue
-                    # 检查后缀
-                    if exts and os.path.splitext(file)[-1].lower() not in exts:
-                        continue
-                    # 检查文件大小
-                    if filesize and os.path.getsize(cur_path) < filesize:
-                        continue
-                    # 命中
-                    if cur_path not in ret_list:
-                        ret_list.append(cur_path)
+                # 命中
+                ret_list.append(entry.path)
         else:
             # 检查路径是否合法
             if PathUtils.is_invalid_path(in_path):
@@ -48,6 +49,57 @@ class PathUtils:
             ret_list.append(in_path)
         return ret_list
 
+    @staticmethod
+    def scan_dir(in_path, dir_filter=None):
+        """
+        递归遍历目录下的文件，返回自带缓存stat信息的os.DirEntry；
+        回收站、隐藏目录等不合法的目录整体跳过，不再逐个文件检查
+        :param in_path: 目录
+        :param dir_filter: 子目录过滤函数，参数为目录路径，返回False时跳过该目录
+        """
+        # 目录本身不合法时其下的文件均不合法
+        if not in_path or PathUtils.is_invalid_path(os.path.join(in_path, "")):
+            return
+        dirs = [in_path]
+        while dirs:
+            try:
+                with os.scandir(dirs.pop()) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            sub_dirs = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if PathUtils.__is_invalid_name(entry.name, is_dir=True):
+                        continue
+                    # 与os.walk一致，不进入链接的目录
+                    if entry.is_symlink():
+                        continue
+                    if dir_filter and not dir_filter(entry.path):
+                        continue
+                    sub_dirs.append(entry.path)
+                else:
+                    if PathUtils.__is_invalid_name(entry.name):
+                        continue
+                    yield entry
+            # 保持与os.walk相同的自上而下顺序
+            dirs.extend(reversed(sub_dirs))
+
+    @staticmethod
+    def __is_invalid_name(name, is_dir=False):
+        """
+        按名称判断是否不能处理的目录或文件，与is_invalid_path规则一致
+        """
+        if name.startswith(".") or name.startswith("@eaDir"):
+            return True
+        if is_dir and name in ["@Recycle", "#recycle"]:
+            return True
+        return False
+
     @staticmethod
     def get_dir_level1_files(in_path, exts=""):
         """
@@ -56,11 +108,11 @@ class PathUtils:
         ret_list = []
         if not os.path.exists(in_path):
             return []
-        for file in os.listdir(in_path):
-            path = os.path.join(in_path, file)
-            if os.path.isfile(path):
-                if not exts or os.path.splitext(file)[-1].lower() in exts:
-                    ret_list.append(path)
+        with os.scandir(in_path) as it:
+            for entry in it:
+                if entry.is_file():
+                    if not exts or os.path.splitext(entry.name)[-1].lower() in exts:
+                        ret_list.append(entry.path)
         return ret_list
 
     @staticmethod
@@ -72,13 +124,13 @@ class PathUtils:
         if not os.path.exists(in_path):
             return []
         if os.path.isdir(in_path):
-            for file in os.listdir(in_path):
-                path = os.path.join(in_path, file)
-                if os.path.isfile(path):
-                    if not exts or os.path.splitext(file)[-1].lower() in exts:
-                        ret_list.append(path)
-                else:
-                    ret_list.append(path)
+            with os.scandir(in_path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        if not exts or os.path.splitext(entry.name)[-1].lower() in exts:
+                            ret_list.append(entry.path)
+                    else:
+                        ret_list.append(entry.path)
         else:
             ret_list.append(in_path)
         return ret_list
@@ -133,9 +185,10 @@ class PathUtils:
                 return PathUtils.get_parent_paths(path, 2)
             else:
                 # 电视剧原盘下会存在多个目录形如：Spider Man 2021/DIsc1, Spider Man 2021/Disc2
-                for level1 in PathUtils.get_dir_level1_medias(path):
-                    if os.path.exists(os.path.join(level1, "BDMV", "index.bdmv")):
-                        return path
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir() and os.path.exists(os.path.join(entry.path, "BDMV", "index.bdmv")):
+                            return path
                 return None
         else:
             if str(os.path.splitext(path)[-1]).lower() in [".m2ts", ".ts"] \
@@ -153,3 +206,64 @@ class PathUtils:
         for lv in range(0, level):
             path = os.path.dirname(path)
         return path
+
+
+class PathTrie:
+    """
+    路径前缀树，按目录层级查找路径所在的根目录，耗时只与路径深度有关，与根目录数量无关
+    """
+
+    def __init__(self, roots=None):
+        """
+        :param roots: 根目录列表，或 {根目录: 关联数据} 字典
+        """
+        self._root = {}
+        self._size = 0
+        if isinstance(roots, dict):
+            for path, value in roots.items():
+                self.add(path, value)
+        elif roots:
+            for path in roots:
+                self.add(path)
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def __split(path):
+        return [part for part in os.path.normpath(path).split(os.sep) if part]
+
+    def add(self, path, value=None):
+        """
+        登记根目录及关联数据
+        """
+        if not path:
+            return
+        node = self._root
+        for part in self.__split(path):
+            node = node.setdefault(part, {})
+        if None not in node:
+            self._size += 1
+        node[None] = (path, value)
+
+    def match(self, path):
+        """
+        查找包含该路径的最深的根目录，路径本身也算在内
+        :return: (根目录, 关联数据)，没有时返回 (None, None)
+        """
+        if not path or not self._size:
+            return None, None
+        node = self._root
+        matched = node.get(None, (None, None))
+        for part in self.__split(path):
+            node = node.get(part)
+            if node is None:
+                break
+            matched = node.get(None, matched)
+        return matched
+
+    def contains(self, path):
+        """
+        判断路径是否在任一根目录下
+        """
+        return self.match(path)[0] is not None
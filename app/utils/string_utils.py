@@ -436,3 +436,32 @@ class StringUtils:
         if not amount:
             return "0"
         return curr + format(amount, ",")
+
+    @staticmethod
+    def words_regex(words):
+        """
+        将多个普通文本合并为一个按前缀树组织的正则，用于一次性判断是否包含其中任意一个
+        :param words: 普通文本列表，不能包含空字符串
+        :return: 编译后的正则，没有文本时返回None
+        """
+        if not words:
+            return None
+        trie = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = None
+
+        def __build(_node):
+            if "" in _node and len(_node) == 1:
+                return ""
+            alternatives = []
+            for char in sorted(key for key in _node if key):
+                alternatives.append(re.escape(char) + __build(_node[char]))
+            pattern = alternatives[0] if len(alternatives) == 1 else "(?:%s)" % "|".join(alternatives)
+            if "" in _node:
+                pattern = "(?:%s)?" % pattern
+            return pattern
+
+        return re.compile(__build(trie))
@@ -1,13 +1,24 @@
 import datetime
+import json
 import os
 import platform
 import shutil
 import subprocess
+import tempfile
+import time
 
 from app.utils.path_utils import PathUtils
 from app.utils.exception_utils import ExceptionUtils
 from app.utils.types import OsType
-from config import WEBDRIVER_PATH
+from config import Config, WEBDRIVER_PATH, COPY_CHUNK_SIZE, COPY_CHECKPOINT_SIZE
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux写时复制ioctl
+FICLONE = 0x40049409
 
 
 class SystemUtils:
@@ -129,17 +140,106 @@ class SystemUtils:
             return WEBDRIVER_PATH.get(SystemUtils.get_system().value)
 
     @staticmethod
-    def copy(src, dest):
+    def copy(src, dest, callback=None):
         """
-        复制
+        复制，优先写时复制，其次内核态复制，最后分块读写；
+        先写入临时文件再重命名，中断后按检查点续传
+        :param callback: 进度回调，参数为已复制大小、总大小、速度（字节/秒）
         """
         try:
-            shutil.copy2(os.path.normpath(src), os.path.normpath(dest))
+            SystemUtils.__fast_copy(os.path.normpath(src), os.path.normpath(dest), callback)
             return 0, ""
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return -1, str(err)
 
+    @staticmethod
+    def __fast_copy(src, dest, callback=None):
+        part_file = "%s.nastool.part" % dest
+        checkpoint_file = "%s.json" % part_file
+        src_stat = os.stat(src)
+        total = src_stat.st_size
+        # 源文件未变化时从检查点继续
+        offset = 0
+        if os.path.exists(part_file) and os.path.exists(checkpoint_file):
+            try:
+                with open(checkpoint_file, "r", encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+                if checkpoint.get("src") == src \
+                        and checkpoint.get("size") == total \
+                        and checkpoint.get("mtime") == src_stat.st_mtime \
+                        and 0 < checkpoint.get("offset", 0) <= min(total, os.path.getsize(part_file)):
+                    offset = checkpoint.get("offset")
+            except (OSError, ValueError, AttributeError):
+                offset = 0
+
+        def __save_checkpoint(copied):
+            with open(checkpoint_file, "w", encoding="utf-8") as cf:
+                json.dump({"src": src, "size": total, "mtime": src_stat.st_mtime, "offset": copied}, cf)
+
+        with open(src, "rb") as fsrc, open(part_file, "r+b" if offset else "wb") as fdst:
+            fdst.truncate(offset)
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            copied = offset
+            if not offset and SystemUtils.__reflink(src_fd, dst_fd):
+                copied = total
+            start_time = time.time()
+            checkpoint_offset = copied
+            method = "copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"
+            while copied < total:
+                count = min(COPY_CHUNK_SIZE, total - copied)
+                if method == "copy_file_range":
+                    try:
+                        sent = os.copy_file_range(src_fd, dst_fd, count, copied, copied)
+                    except OSError:
+                        # 跨文件系统或不支持时改用sendfile
+                        method = "sendfile"
+                        continue
+                elif method == "sendfile":
+                    try:
+                        os.lseek(dst_fd, copied, os.SEEK_SET)
+                        sent = os.sendfile(dst_fd, src_fd, copied, count)
+                    except (OSError, AttributeError):
+                        method = "buffer"
+                        continue
+                else:
+                    fsrc.seek(copied)
+                    fdst.seek(copied)
+                    buf = fsrc.read(count)
+                    fdst.write(buf)
+                    fdst.flush()
+                    sent = len(buf)
+                if not sent:
+                    raise IOError("源文件在复制过程中发生变化：%s" % src)
+                copied += sent
+                if copied - checkpoint_offset >= COPY_CHECKPOINT_SIZE and copied < total:
+                    os.fsync(dst_fd)
+                    __save_checkpoint(copied)
+                    checkpoint_offset = copied
+                if callback:
+                    used_time = time.time() - start_time
+                    callback(copied, total, (copied - offset) / used_time if used_time > 0 else 0)
+            os.fsync(dst_fd)
+        shutil.copystat(src, part_file)
+        os.replace(part_file, dest)
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        if callback:
+            callback(total, total, 0)
+
+    @staticmethod
+    def __reflink(src_fd, dst_fd):
+        """
+        写时复制，Btrfs、XFS等文件系统上只复制元数据
+        """
+        if not fcntl:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return True
+        except OSError:
+            return False
+
     @staticmethod
     def move(src, dest):
         """
@@ -272,6 +372,146 @@ class SystemUtils:
             ExceptionUtils.exception_traceback(err)
             return -1, str(err)
 
+    @staticmethod
+    def __stage_files(files, dest_root):
+        """
+        按目标相对路径在临时目录中建立暂存目录，源文件以硬链接放入，跨文件系统时使用软链接，
+        源文件目录只需读权限
+        :param files: [(源文件, 目标文件)]
+        :param dest_root: 目的根目录
+        :return: 暂存目录，{相对路径: 源文件}
+        """
+        temp_path = Config().get_temp_path()
+        os.makedirs(temp_path, exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix="nastool-batch-", dir=temp_path)
+        staged = {}
+        for src, dest in files:
+            rel_path = os.path.relpath(dest, dest_root).replace("\\", "/")
+            if rel_path in staged or rel_path.startswith("../"):
+                continue
+            stage_file = os.path.join(stage_dir, rel_path)
+            os.makedirs(os.path.dirname(stage_file), exist_ok=True)
+            try:
+                os.link(src, stage_file)
+            except OSError:
+                os.symlink(os.path.abspath(src), stage_file)
+            staged[rel_path] = src
+        return stage_dir, staged
+
+    @staticmethod
+    def __finish_batch(files, dest_root, staged, done, retcode, retmsg, move):
+        """
+        汇总批量转移每个文件的结果，移动模式删除已成功的源文件
+        :param done: 已成功的相对路径，命令返回0时全部成功
+        :return: [(错误码, 错误信息)]，与files一一对应
+        """
+        results = []
+        for src, dest in files:
+            rel_path = os.path.relpath(dest, dest_root).replace("\\", "/")
+            if staged.get(rel_path) != src:
+                results.append((-1, "%s 不在目的根目录下或与其它文件重名" % dest))
+            elif retcode == 0 or rel_path in done:
+                results.append((0, ""))
+            else:
+                results.append((retcode or -1, retmsg))
+        if move:
+            for (src, _), (ret, _) in zip(files, results):
+                if ret == 0 and os.path.exists(src):
+                    os.remove(src)
+        return results
+
+    @staticmethod
+    def rclone_batch(files, dest_root, move=False):
+        """
+        Rclone批量转移，同一目的根目录下的文件通过文件清单一次上传
+        :param files: [(源文件, 目标文件)]
+        :param dest_root: 目的根目录
+        :param move: 是否移动
+        :return: [(错误码, 错误信息)]，与files一一对应
+        """
+        stage_dir = None
+        try:
+            stage_dir, staged = SystemUtils.__stage_files(files, dest_root)
+            list_file = os.path.join(stage_dir, ".files-from")
+            with open(list_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(staged.keys()))
+            dest = os.path.normpath(dest_root).replace("\\", "/")
+            ret = subprocess.run(['rclone', 'copy',
+                                  '--copy-links',
+                                  '--files-from-raw', list_file,
+                                  '--use-json-log',
+                                  '--log-level', 'INFO',
+                                  '--stats', '0',
+                                  stage_dir,
+                                  f'NASTOOL:{dest}'],
+                                 stderr=subprocess.PIPE,
+                                 startupinfo=SystemUtils.__get_hidden_shell())
+            # 按日志解析每个文件的结果
+            done = set()
+            retmsg = ""
+            for line in ret.stderr.decode("utf-8", "ignore").splitlines():
+                try:
+                    log_info = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(log_info, dict):
+                    continue
+                if log_info.get("level") == "error":
+                    retmsg = log_info.get("msg") or retmsg
+                elif str(log_info.get("msg")).startswith("Copied") and log_info.get("object"):
+                    done.add(log_info.get("object"))
+            return SystemUtils.__finish_batch(files, dest_root, staged, done, ret.returncode, retmsg, move)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return [(-1, str(err))] * len(files)
+        finally:
+            if stage_dir:
+                shutil.rmtree(stage_dir, ignore_errors=True)
+
+    @staticmethod
+    def minio_batch(files, dest_root, move=False):
+        """
+        Minio批量转移，同一目的根目录下的文件一次上传
+        :param files: [(源文件, 目标文件)]
+        :param dest_root: 目的根目录
+        :param move: 是否移动
+        :return: [(错误码, 错误信息)]，与files一一对应
+        """
+        stage_dir = None
+        try:
+            stage_dir, staged = SystemUtils.__stage_files(files, dest_root)
+            dest = os.path.normpath(dest_root).replace("\\", "/")
+            if dest.startswith("/"):
+                dest = dest[1:]
+            ret = subprocess.run(['mc', 'cp',
+                                  '--recursive',
+                                  '--json',
+                                  stage_dir + os.sep,
+                                  f'NASTOOL/{dest}/'],
+                                 stdout=subprocess.PIPE,
+                                 startupinfo=SystemUtils.__get_hidden_shell())
+            # 按输出解析每个文件的结果
+            done = set()
+            retmsg = ""
+            for line in ret.stdout.decode("utf-8", "ignore").splitlines():
+                try:
+                    out_info = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(out_info, dict):
+                    continue
+                if out_info.get("status") == "success" and out_info.get("source"):
+                    done.add(os.path.relpath(out_info.get("source"), stage_dir).replace("\\", "/"))
+                elif out_info.get("status") == "error":
+                    retmsg = str((out_info.get("error") or {}).get("message") or retmsg)
+            return SystemUtils.__finish_batch(files, dest_root, staged, done, ret.returncode, retmsg, move)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return [(-1, str(err))] * len(files)
+        finally:
+            if stage_dir:
+                shutil.rmtree(stage_dir, ignore_errors=True)
+
     @staticmethod
     def get_windows_drives():
         """
@@ -27,10 +27,45 @@ AUTO_REMOVE_TORRENTS_INTERVAL = 1800
 PT_TRANSFER_INTERVAL = 300
 # TMDB信息缓存定时保存时间
 METAINFO_SAVE_INTERVAL = 600
-# SYNC目录同步聚合转移时间
+# SYNC目录同步兜底检查待转移文件的时间间隔
 SYNC_TRANSFER_INTERVAL = 60
+# SYNC目录同步已处理文件记录的数量上限及保留时间（秒）
+SYNC_FILES_MAXSIZE = 100000
+SYNC_FILES_TTL = 24 * 3600
+# SYNC目录同步文件大小及修改时间保持不变多久（秒）视为写入完成
+SYNC_SETTLE_TIME = 10
+# SYNC目录同步同一目录无新文件多久（秒）后开始转移
+SYNC_GROUP_QUIET_TIME = 3
+# SYNC目录同步检查文件写入状态的时间间隔（秒）
+SYNC_SETTLE_CHECK_INTERVAL = 2
 # RSS队列中处理时间间隔
 RSS_CHECK_INTERVAL = 300
+# RSS订阅并发下载站点数
+RSS_FETCH_THREADS = 8
+# RSS订阅单个站点下载超时时间（秒），包括建立连接及读取全部内容
+RSS_SITE_TIMEOUT = 30
+# RSS中未命中订阅或过滤规则的条目在此时间内（秒）不再重复处理，过期后重新识别匹配
+RSS_UNMATCHED_TTL = 3600
+# 批量识别文件时同时查询TMDB的名称数
+MEDIA_IDENTIFY_THREADS = 4
+# 每个转移目的地同时执行的复制/移动数
+TRANSFER_LANE_THREADS = 2
+# 复制文件时每次内核态复制的块大小
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+# 复制文件时保存续传检查点的间隔大小
+COPY_CHECKPOINT_SIZE = 256 * 1024 * 1024
+# 媒体库目录索引有效时间（秒），超时后重新读取目录
+LIBRARY_INDEX_TTL = 3600
+# 同步媒体库数据时每批写入数据库的数量
+MEDIASYNC_BATCH_SIZE = 2000
+# 增量同步媒体库数据时往前多查询的时间（秒），避免时钟误差漏掉项目
+MEDIASYNC_WATERMARK_OVERLAP = 600
+# 增量同步媒体库数据时全量同步校验的时间间隔（小时）
+MEDIASYNC_FULL_INTERVAL = 24 * 7
+# 同步媒体库数据时每页查询的数量
+MEDIASYNC_PAGE_SIZE = 500
+# 同步媒体库数据时并发查询的页数
+MEDIASYNC_PAGE_THREADS = 4
 # 站点流量数据刷新时间间隔（小时）
 REFRESH_PT_DATA_INTERVAL = 6
 # 刷新订阅TMDB数据的时间间隔（小时）
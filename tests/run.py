@@ -1,11 +1,14 @@
 import unittest
 
+from tests.test_filter import FilterTest
 from tests.test_metainfo import MetaInfoTest
 
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     # 测试名称识别
     suite.addTest(MetaInfoTest('test_metainfo'))
+    # 测试过滤规则
+    suite.addTest(FilterTest('test_filter_rules'))
 
     # 运行测试
     runner = unittest.TextTestRunner()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+from unittest import TestCase
+
+from app.db.models import CONFIGFILTERGROUP, CONFIGFILTERRULES
+from app.filter import RuleGroupMatcher
+from app.media.meta import MetaInfo
+from config import Config
+from tests.cases.meta_cases import meta_cases
+
+
+class FilterTest(TestCase):
+    def setUp(self) -> None:
+        # 使用内置的过滤规则
+        conn = sqlite3.connect(":memory:")
+        conn.execute('CREATE TABLE "CONFIG_FILTER_GROUP" '
+                     '("ID" INTEGER PRIMARY KEY, "GROUP_NAME", "IS_DEFAULT", "NOTE")')
+        conn.execute('CREATE TABLE "CONFIG_FILTER_RULES" '
+                     '("ID" INTEGER PRIMARY KEY, "GROUP_ID", "ROLE_NAME", "PRIORITY", '
+                     '"INCLUDE", "EXCLUDE", "SIZE_LIMIT", "NOTE")')
+        with open(os.path.join(Config().get_root_path(), "config", "init_filter.sql"), "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        self.groups = []
+        for group in conn.execute('SELECT * FROM "CONFIG_FILTER_GROUP"').fetchall():
+            rules = [CONFIGFILTERRULES(ID=rule[0], GROUP_ID=rule[1], ROLE_NAME=rule[2], PRIORITY=rule[3],
+                                       INCLUDE=rule[4], EXCLUDE=rule[5], SIZE_LIMIT=rule[6], NOTE=rule[7])
+                     for rule in conn.execute('SELECT * FROM "CONFIG_FILTER_RULES" WHERE "GROUP_ID" = ? '
+                                              'ORDER BY CAST("PRIORITY" AS INTEGER)', (str(group[0]),))]
+            self.groups.append((CONFIGFILTERGROUP(ID=group[0], GROUP_NAME=group[1],
+                                                  IS_DEFAULT=group[2], NOTE=group[3]), rules))
+        conn.close()
+        self.meta_infos = []
+        for info in meta_cases:
+            if not info.get("title"):
+                continue
+            self.meta_infos.append(MetaInfo(title=info.get("title"), subtitle=info.get("subtitle")))
+
+    def tearDown(self) -> None:
+        pass
+
+    @staticmethod
+    def __check_rules(rules, meta_info):
+        """
+        不预编译规则的匹配，作为基准，用例没有大小及促销信息，不检查大小及促销
+        """
+        if meta_info.subtitle:
+            title = "%s %s" % (meta_info.org_string, meta_info.subtitle)
+        else:
+            title = meta_info.org_string
+        for rule in rules:
+            includes = rule.INCLUDE.split("\n") if rule.INCLUDE else []
+            if not all(re.search(r'%s' % include.strip(), title, re.IGNORECASE) for include in includes if include):
+                continue
+            excludes = [exclude for exclude in (rule.EXCLUDE.split("\n") if rule.EXCLUDE else []) if exclude]
+            if excludes and all(re.search(r'%s' % exclude.strip(), title, re.IGNORECASE) for exclude in excludes):
+                continue
+            return True, 100 - int(rule.PRIORITY or 0)
+        return (False, 0) if rules else (True, 0)
+
+    def test_filter_rules(self):
+        matchers = [(RuleGroupMatcher(group, rules), rules) for group, rules in self.groups]
+        for matcher, rules in matchers:
+            for meta_info in self.meta_infos:
+                self.assertEqual(self.__check_rules(rules, meta_info), matcher.match(meta_info))
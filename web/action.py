@@ -22,7 +22,7 @@ from app.downloader.client import Qbittorrent, Transmission
 from app.filetransfer import FileTransfer
 from app.filter import Filter
 from app.helper import DbHelper, ProgressHelper, ThreadHelper, \
-    MetaHelper, DisplayHelper, WordsHelper, CookieCloudHelper
+    MetaHelper, DisplayHelper, WordsHelper, CookieCloudHelper, LibraryHelper, TransferHelper
 from app.indexer import Indexer
 from app.media import Category, Media, Bangumi, DouBan
 from app.media.meta import MetaInfo, MetaBase
@@ -918,12 +918,14 @@ class WebAction:
                                 # 电影，删除整个目录
                                 try:
                                     shutil.rmtree(dest_path)
+                                    LibraryHelper().remove(dest_path)
                                 except Exception as e:
                                     ExceptionUtils.exception_traceback(e)
                             elif not meta_info.get_episode_string():
                                 # 电视剧但没有集数，删除季目录
                                 try:
                                     shutil.rmtree(dest_path)
+                                    LibraryHelper().remove(dest_path)
                                 except Exception as e:
                                     ExceptionUtils.exception_traceback(e)
                                 rm_parent_dir = True
@@ -937,6 +939,7 @@ class WebAction:
                                     ).issubset(set(meta_info.get_episode_list())):
                                         try:
                                             os.remove(dest_file)
+                                            LibraryHelper().remove(dest_file)
                                         except Exception as e:
                                             ExceptionUtils.exception_traceback(
                                                 e)
@@ -946,6 +949,7 @@ class WebAction:
                                 # 没有媒体文件时，删除整个目录
                                 try:
                                     shutil.rmtree(os.path.dirname(dest_path))
+                                    LibraryHelper().remove(os.path.dirname(dest_path))
                                 except Exception as e:
                                     ExceptionUtils.exception_traceback(e)
         return {"retcode": 0}
@@ -961,16 +965,19 @@ class WebAction:
             if not os.path.exists(file):
                 return False, f"{file} 不存在"
             os.remove(file)
+            LibraryHelper().remove(file)
             nfoname = f"{os.path.splitext(filename)[0]}.nfo"
             nfofile = os.path.join(filedir, nfoname)
             if os.path.exists(nfofile):
                 os.remove(nfofile)
+                LibraryHelper().remove(nfofile)
             # 检查空目录并删除
             if re.findall(r"^S\d{2}|^Season", os.path.basename(filedir), re.I):
                 # 当前是季文件夹，判断并删除
                 seaon_dir = filedir
                 if seaon_dir.count('/') > 1 and not PathUtils.get_dir_files(seaon_dir, exts=RMT_MEDIAEXT):
                     shutil.rmtree(seaon_dir)
+                    LibraryHelper().remove(seaon_dir)
                 # 媒体文件夹
                 media_dir = os.path.dirname(seaon_dir)
             else:
@@ -981,6 +988,7 @@ class WebAction:
                     and not re.search(r'[a-zA-Z]:/$', media_dir) \
                     and not PathUtils.get_dir_files(media_dir, exts=RMT_MEDIAEXT):
                 shutil.rmtree(media_dir)
+                LibraryHelper().remove(media_dir)
             return True, f"{file} 删除成功"
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
@@ -1895,6 +1903,7 @@ class WebAction:
         清空文件转移黑名单记录
         """
         self.dbhelper.truncate_transfer_blacklist()
+        LibraryHelper().refresh()
         return {"code": 0}
 
     def truncate_rsshistory(self, data):
@@ -2435,15 +2444,12 @@ class WebAction:
                                                    tags=tags,
                                                    page=CurrentPage)
 
-        # 补充存在与订阅状态
-        filetransfer = FileTransfer()
-        for res in res_list:
-            fav, rssid = filetransfer.get_media_exists_flag(mtype=Type,
-                                                            title=res.get(
-                                                                "title"),
-                                                            year=res.get(
-                                                                "year"),
-                                                            mediaid=res.get("id"))
+        # 补充存在与订阅状态，整页一次查询
+        flags = FileTransfer().get_media_exists_flags([(Type,
+                                                        res.get("title"),
+                                                        res.get("year"),
+                                                        res.get("id")) for res in res_list])
+        for res, (fav, rssid) in zip(res_list, flags):
             res.update({
                 'fav': fav,
                 'rssid': rssid
@@ -2578,7 +2584,7 @@ class WebAction:
         """
         try:
             MetaHelper().clear_meta_data()
-            os.remove(MetaHelper().get_meta_data_path())
+            MetaHelper().save_meta_data(force=True)
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             return {"code": 0, "msg": str(e)}
@@ -2602,13 +2608,17 @@ class WebAction:
     @staticmethod
     def __refresh_process(data):
         """
-        刷新进度条
+        刷新进度条，文件转移时同时返回排队及执行中的转移任务
         """
-        detail = ProgressHelper().get_process(data.get("type"))
+        ptype = data.get("type")
+        detail = ProgressHelper().get_process(ptype)
         if detail:
-            return {"code": 0, "value": detail.get("value"), "text": detail.get("text")}
+            ret = {"code": 0, "value": detail.get("value"), "text": detail.get("text")}
         else:
-            return {"code": 1, "value": 0, "text": "正在处理..."}
+            ret = {"code": 1, "value": 0, "text": "正在处理..."}
+        if ptype == "filetransfer":
+            ret["jobs"] = TransferHelper().get_jobs()
+        return ret
 
     @staticmethod
     def __restory_backup(data):
@@ -3596,12 +3606,6 @@ class WebAction:
                         and filter_season not in torrent_filter.get("season"):
                     torrent_filter["season"].append(filter_season)
             else:
-                # 是否已存在
-                if item.TMDBID:
-                    exist_flag = MediaServer().check_item_exists(
-                        title=item.TITLE, year=item.YEAR, tmdbid=item.TMDBID)
-                else:
-                    exist_flag = False
                 SearchResults[title_string] = {
                     "key": item.ID,
                     "title": item.TITLE,
@@ -3614,7 +3618,7 @@ class WebAction:
                     "backdrop": item.IMAGE,
                     "poster": item.POSTER,
                     "overview": item.OVERVIEW,
-                    "exist": exist_flag,
+                    "exist": False,
                     "torrent_dict": {
                         SE_key: {
                             group_key: {
@@ -3637,6 +3641,15 @@ class WebAction:
                     }
                 }
 
+        # 是否已存在，所有结果一次查询
+        exist_titles = [title for title, item in SearchResults.items() if item.get("tmdbid")]
+        exist_flags = MediaServer().check_items_exists([(SearchResults[title].get("title"),
+                                                         SearchResults[title].get("year"),
+                                                         SearchResults[title].get("tmdbid"))
+                                                        for title in exist_titles])
+        for title, exist_flag in zip(exist_titles, exist_flags):
+            SearchResults[title]["exist"] = exist_flag
+
         # 提升整季的顺序到顶层
         def se_sort(k):
             k = re.sub(r" +|(?<=s\d)\D*?(?=e)|(?<=s\d\d)\D*?(?=e)",
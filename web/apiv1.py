@@ -926,12 +926,12 @@ class SystemMessage(ClientResource):
 @system.route('/progress')
 class SystemProgress(ClientResource):
     parser = reqparse.RequestParser()
-    parser.add_argument('type', type=str, help='类型（search/mediasync）', location='form', required=True)
+    parser.add_argument('type', type=str, help='类型（search/mediasync/filetransfer）', location='form', required=True)
 
     @system.doc(parser=parser)
     def post(self):
         """
-        查询搜索/媒体同步等进度
+        查询搜索/媒体同步/文件转移等进度，文件转移时返回排队及执行中的转移任务
         """
         return WebAction().api_action(cmd='refresh_process', data=self.parser.parse_args())
 
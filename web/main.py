@@ -26,7 +26,7 @@ from app.downloader import Downloader
 from app.filter import Filter
 from app.helper import SecurityHelper, MetaHelper, ChromeHelper, ThreadHelper
 from app.indexer import Indexer
-from app.media.meta import MetaInfo
+from app.media.meta import MetaInfo, get_meta_cache_stats
 from app.mediaserver import WebhookEvent
 from app.message import Message
 from app.rsschecker import RssChecker
@@ -810,8 +810,17 @@ def service():
        <path d="M14 20v-11a2 2 0 0 1 2 -2h1a2 2 0 0 1 2 2v1a2 2 0 0 1 -2 2a2 2 0 0 1 2 2v1a2 2 0 0 1 -2 2"></path>
     </svg>
     '''
+    # 识别缓存命中率
+    meta_cache_stats = get_meta_cache_stats()
+    meta_cache_total = meta_cache_stats.get("hits") + meta_cache_stats.get("misses")
+    if meta_cache_total:
+        tim_nametest = "识别缓存命中 %.1f%%（%s/%s）" % (meta_cache_stats.get("hits") * 100 / meta_cache_total,
+                                                    meta_cache_stats.get("hits"),
+                                                    meta_cache_total)
+    else:
+        tim_nametest = ""
     scheduler_cfg_list.append(
-        {'name': '名称识别测试', 'time': '', 'state': 'OFF', 'id': 'nametest', 'svg': svg, 'color': 'lime'})
+        {'name': '名称识别测试', 'time': tim_nametest, 'state': 'OFF', 'id': 'nametest', 'svg': svg, 'color': 'lime'})
 
     # 过滤规则测试
     svg = '''